@@ -0,0 +1,66 @@
+"""
+Cost of a churning workload: a book holding half of a pool of transactions has a random one deleted and a
+random missing one stored, again and again.
+
+Transactions come in pairs that share their first SHARED_PREFIX characters, so deleting one of a pair
+collapses a chain of nested books and storing it again rebuilds the chain.
+
+Run from the repository root:
+    python -m benchmarks.bench_book_churn [number_of_transactions] [number_of_rounds]
+"""
+import random
+import sys
+import time
+
+from benchmarks.bench_flat_book import SHARED_PREFIX, shared_prefix_transactions
+from flat_processing_book import FlatProcessingBook
+from processing_book import ProcessingBook
+from radix_processing_book import RadixProcessingBook
+
+
+def churn(book_class, transactions, rounds, seed=1008):
+    """
+    Returns the seconds per delete and the seconds per store over rounds rounds.
+    """
+    rng = random.Random(seed)
+    count = len(transactions)
+    # order[:live] are in the book, order[live:] are not
+    order = rng.sample(range(count), count)
+    live = count // 2
+    book = book_class()
+    for i in range(live):
+        book[transactions[order[i]]] = order[i]
+
+    delete_seconds = 0.0
+    store_seconds = 0.0
+    for _ in range(rounds):
+        out = rng.randrange(live)
+        into = rng.randrange(live, count)
+        start = time.perf_counter()
+        del book[transactions[order[out]]]
+        middle = time.perf_counter()
+        book[transactions[order[into]]] = order[into]
+        end = time.perf_counter()
+        delete_seconds += middle - start
+        store_seconds += end - middle
+        order[out], order[into] = order[into], order[out]
+
+    assert len(book) == live
+    return delete_seconds / rounds, store_seconds / rounds
+
+
+def main(count, rounds):
+    transactions = shared_prefix_transactions(count)
+    print(f"{count} transactions, {count // 2} in the book, pairs sharing {SHARED_PREFIX} characters")
+    for book_class in (ProcessingBook, FlatProcessingBook, RadixProcessingBook):
+        delete_seconds, store_seconds = churn(book_class, transactions, rounds)
+        print(
+            f"  {book_class.__name__:<20} delete {delete_seconds * 1e6:7.1f} us  store {store_seconds * 1e6:7.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20_000,
+    )
@@ -0,0 +1,64 @@
+"""
+Insert and lookup latency of ProcessingBook on deep books.
+
+Signatures are generated in groups of 36 that share their first depth - 1 characters, so every get and
+set walks at least depth levels.
+
+Run from the repository root:
+    python -m benchmarks.bench_book_lookup [number_of_transactions]
+"""
+import random
+import sys
+import time
+
+from data_structures import ArrayDeque
+from processing_book import ProcessingBook
+from processing_line import SIGNATURE_LENGTH, Transaction
+
+DEPTHS = (1, 8, 16, 32)
+
+
+def deep_transactions(count, depth, seed=1008):
+    """
+    count transactions in groups of 36 whose signatures share their first depth - 1 characters.
+    """
+    rng = random.Random(seed)
+    legal = ProcessingBook.LEGAL_CHARACTERS
+    transactions = ArrayDeque(count)
+    prefix = ""
+    for i in range(count):
+        if i % len(legal) == 0:
+            prefix = "".join(rng.choice(legal) for _ in range(depth - 1))
+        suffix = "".join(rng.choice(legal) for _ in range(SIGNATURE_LENGTH - depth))
+        transaction = Transaction(i, "sender", "receiver")
+        transaction.signature = prefix + legal[i % len(legal)] + suffix
+        transactions.append(transaction)
+    return transactions
+
+
+def time_per_operation(operation, transactions):
+    start = time.perf_counter()
+    for i in range(len(transactions)):
+        operation(transactions[i], i)
+    return (time.perf_counter() - start) / len(transactions)
+
+
+def main(count):
+    print(f"{'depth':>5} {'set':>10} {'get':>10}")
+    for depth in DEPTHS:
+        transactions = deep_transactions(count, depth)
+        book = ProcessingBook()
+
+        def insert(transaction, amount):
+            book[transaction] = amount
+
+        def lookup(transaction, amount):
+            book[transaction]
+
+        set_seconds = time_per_operation(insert, transactions)
+        get_seconds = time_per_operation(lookup, transactions)
+        print(f"{depth:>5} {set_seconds * 1e9:>7.0f} ns {get_seconds * 1e9:>7.0f} ns")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
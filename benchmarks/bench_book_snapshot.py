@@ -0,0 +1,52 @@
+"""
+Cold start of a ProcessingBook: rebuilding it from its transactions against opening a saved snapshot.
+
+Run from the repository root:
+    python -m benchmarks.bench_book_snapshot [number_of_transactions]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_flat_book import signed_transactions
+from book_snapshot import MappedProcessingBook, save_book
+from processing_book import ProcessingBook
+
+
+def main(count):
+    transactions = signed_transactions(count)
+
+    start = time.perf_counter()
+    book = ProcessingBook()
+    for i in range(len(transactions)):
+        book[transactions[i]] = i
+    rebuild_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "book.snapshot")
+        start = time.perf_counter()
+        save_book(book, path)
+        save_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with MappedProcessingBook(path) as mapped:
+            amount = mapped[transactions[count // 2]]
+            first_lookup_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(len(transactions)):
+                mapped[transactions[i]]
+            lookup_seconds = (time.perf_counter() - start) / count
+        assert amount == count // 2
+
+        print(f"transactions:             {count}")
+        print(f"snapshot size:            {os.path.getsize(path) / 2**20:.2f} MiB")
+        print(f"rebuild with inserts:     {rebuild_seconds * 1000:10.1f} ms")
+        print(f"save snapshot:            {save_seconds * 1000:10.1f} ms")
+        print(f"open + first lookup:      {first_lookup_seconds * 1000:10.3f} ms")
+        print(f"mapped lookup:            {lookup_seconds * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
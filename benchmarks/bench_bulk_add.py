@@ -0,0 +1,45 @@
+"""
+Per-item cost of filling a ProcessingLine one transaction at a time against add_transactions.
+
+Run from the repository root:
+    python -m benchmarks.bench_bulk_add [number_of_transactions]
+"""
+import sys
+import time
+
+from data_structures import ArrayR
+from processing_line import ProcessingLine, Transaction
+
+
+def make_transactions(count):
+    transactions = ArrayR(count)
+    for i in range(count):
+        transactions[i] = Transaction((i * 7919) % count, "alice", "bob")
+    return transactions
+
+
+def one_at_a_time(line, transactions):
+    for i in range(len(transactions)):
+        line.add_transaction(transactions[i])
+
+
+def bulk(line, transactions):
+    line.add_transactions(transactions)
+
+
+def main(count):
+    transactions = make_transactions(count)
+    critical = Transaction(count // 2, "carol", "dave")
+
+    print(f"transactions: {count}")
+    for storage in (ProcessingLine.LINKED_STORAGE, ProcessingLine.BUFFER_STORAGE):
+        for name, add in (("add_transaction", one_at_a_time), ("add_transactions", bulk)):
+            line = ProcessingLine(critical, storage=storage)
+            start = time.perf_counter()
+            add(line, transactions)
+            seconds = time.perf_counter() - start
+            print(f"{storage:>7} {name:<17} {seconds:7.3f}s  {seconds / count * 1e9:7.1f} ns/item")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
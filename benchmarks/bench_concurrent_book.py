@@ -0,0 +1,93 @@
+"""
+Write throughput of ConcurrentProcessingBook against a ProcessingBook behind a single lock, for 1 to 8 writer threads.
+
+Every writer stores its own slice of the transactions, then the book's len() and get_error_count() are
+checked against a book filled by a single thread. Signed transactions agree on their first characters, so
+the striped book stripes on STRIPE_LEVEL, the first position where they spread over every page.
+
+On an interpreter with the GIL only one thread runs Python code at a time, so throughput cannot grow with
+the number of threads for either book; what the striped book saves there is contention on one lock. With a
+free-threaded build (python3.13t or later) writers on different stripes run in parallel.
+
+Run from the repository root:
+    python -m benchmarks.bench_concurrent_book [number_of_transactions]
+"""
+import sys
+import threading
+import time
+
+from benchmarks.bench_flat_book import signed_transactions
+from concurrent_processing_book import ConcurrentProcessingBook
+from processing_book import ProcessingBook
+
+THREAD_COUNTS = (1, 2, 4, 8)
+STRIPE_LEVEL = 18
+
+
+class LockedProcessingBook:
+    """
+    The simplest thread-safe book: a ProcessingBook with one lock around every operation.
+    """
+
+    def __init__(self):
+        self.book = ProcessingBook()
+        self.lock = threading.Lock()
+
+    def __setitem__(self, transaction, amount):
+        with self.lock:
+            self.book[transaction] = amount
+
+    def __len__(self):
+        with self.lock:
+            return len(self.book)
+
+    def get_error_count(self):
+        with self.lock:
+            return self.book.get_error_count()
+
+
+def fill(book, transactions, thread_count):
+    """
+    Stores transactions into book from thread_count threads, thread t taking every thread_count-th one from t.
+    Every transaction is stored twice with different amounts, so each one also counts an error.
+    Returns the seconds taken.
+    """
+    barrier = threading.Barrier(thread_count + 1)
+
+    def write(first):
+        barrier.wait()
+        for i in range(first, len(transactions), thread_count):
+            book[transactions[i]] = i
+        for i in range(first, len(transactions), thread_count):
+            book[transactions[i]] = -i
+
+    threads = tuple(threading.Thread(target=write, args=(t,)) for t in range(thread_count))
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main(count):
+    transactions = signed_transactions(count)
+    expected = ProcessingBook()
+    fill(expected, transactions, 1)
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"transactions: {count}, GIL {'enabled' if gil else 'disabled'}")
+    print(f"{'threads':>7} {'single lock':>16} {'striped':>16}")
+    for thread_count in THREAD_COUNTS:
+        rates = ()
+        for book in (LockedProcessingBook(), ConcurrentProcessingBook(STRIPE_LEVEL)):
+            seconds = fill(book, transactions, thread_count)
+            assert len(book) == len(expected)
+            assert book.get_error_count() == expected.get_error_count()
+            rates += (2 * count / seconds,)
+        print(f"{thread_count:>7} {rates[0]:>10.0f} ops/s {rates[1]:>10.0f} ops/s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,81 @@
+"""
+Memory and lookup latency of ProcessingBook against FlatProcessingBook and RadixProcessingBook.
+
+Two sets of signatures are stored: the signatures of freshly signed transactions, and signatures that share a
+long prefix in pairs, which makes ProcessingBook nest one book per shared character.
+
+Run from the repository root:
+    python -m benchmarks.bench_flat_book [number_of_transactions]
+"""
+import sys
+import time
+import tracemalloc
+
+from data_structures import ArrayDeque
+from flat_processing_book import FlatProcessingBook
+from processing_book import ProcessingBook
+from radix_processing_book import RadixProcessingBook
+from processing_line import SIGNATURE_LENGTH, Transaction, sign_many
+
+SHARED_PREFIX = 30
+
+
+def signed_transactions(count):
+    transactions = ArrayDeque(count)
+    for i in range(count):
+        transactions.append(Transaction(1_700_000_000 + i, "user" + str(i % 5000), "user" + str((i * 7) % 5000)))
+    sign_many(transactions)
+    return transactions
+
+
+def shared_prefix_transactions(count):
+    """
+    Pairs of signatures that only differ after SHARED_PREFIX characters.
+    """
+    source = signed_transactions((count + 1) // 2)
+    transactions = ArrayDeque(count)
+    for i in range(count):
+        transaction = Transaction(i, "sender", "receiver")
+        signature = source[i // 2].signature
+        last = "a" if i % 2 == 0 else "b"
+        transaction.signature = signature[:SHARED_PREFIX] + last + signature[SHARED_PREFIX + 1:SIGNATURE_LENGTH]
+        transactions.append(transaction)
+    return transactions
+
+
+def build(book_class, transactions):
+    tracemalloc.start()
+    book = book_class()
+    for i in range(len(transactions)):
+        book[transactions[i]] = i
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return book, current
+
+
+def lookup_seconds(book, transactions):
+    start = time.perf_counter()
+    for i in range(len(transactions)):
+        book[transactions[i]]
+    return time.perf_counter() - start
+
+
+def report(name, transactions):
+    count = len(transactions)
+    print(f"{name} ({count} transactions)")
+    for book_class in (ProcessingBook, FlatProcessingBook, RadixProcessingBook):
+        book, used = build(book_class, transactions)
+        seconds = lookup_seconds(book, transactions)
+        print(
+            f"  {book_class.__name__:<20} {used / 2**20:8.2f} MiB ({used / count:7.1f} bytes each)"
+            f"  lookup {seconds / count * 1e9:7.0f} ns"
+        )
+
+
+def main(count):
+    report("signed transactions", signed_transactions(count))
+    report(f"pairs sharing {SHARED_PREFIX} characters", shared_prefix_transactions(count))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
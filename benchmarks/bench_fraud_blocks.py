@@ -0,0 +1,59 @@
+"""
+Time of FraudDetection.detect_by_blocks with the canonical forms of all transactions worked out together by
+CanonicalForms, scored by 1 to 4 processes, against transforming every signature on its own with
+transform_signature.
+
+The transform_signature path is only timed up to ORIGINAL_LIMIT transactions, as it takes seconds for a
+few thousand. Both paths must give the same answer.
+
+Run from the repository root:
+    python -m benchmarks.bench_fraud_blocks [number_of_transactions]
+"""
+import os
+import sys
+import time
+
+from benchmarks.bench_flat_book import signed_transactions
+from fraud_detection import FraudDetection
+
+ORIGINAL_LIMIT = 2_000
+PROCESS_COUNTS = (1, 2, 4)
+
+
+class TransformingFraudDetection(FraudDetection):
+    """
+    FraudDetection that never batches, so every signature goes through transform_signature.
+    """
+
+    def canonical_forms(self):
+        return None
+
+
+def timed_detection(detection, process_count=1):
+    start = time.perf_counter()
+    result = detection.detect_by_blocks(process_count)
+    return result, time.perf_counter() - start
+
+
+def main(count):
+    transactions = signed_transactions(count)
+    print(f"transactions: {count}, cpus: {os.cpu_count()}")
+
+    batched, batched_seconds = timed_detection(FraudDetection(transactions))
+    print(f"{'batched':>12} {batched_seconds:>8.2f} s {batched}")
+    for process_count in PROCESS_COUNTS[1:]:
+        parallel, parallel_seconds = timed_detection(FraudDetection(transactions), process_count)
+        assert parallel == batched
+        label = f"{process_count} processes"
+        print(f"{label:>12} {parallel_seconds:>8.2f} s {parallel}")
+
+    if count <= ORIGINAL_LIMIT:
+        original, original_seconds = timed_detection(TransformingFraudDetection(transactions))
+        assert original == batched
+        print(f"{'transformed':>12} {original_seconds:>8.2f} s {original}")
+    else:
+        print(f"{'transformed':>12} skipped above {ORIGINAL_LIMIT} transactions")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000)
@@ -0,0 +1,57 @@
+"""
+Cost of keeping IncrementalFraudDetection up to date with a stream of transactions, against running
+FraudDetection.detect_by_blocks again over every transaction so far.
+
+Transactions are added one at a time, and the oldest is removed once WINDOW transactions are held, so the
+detector follows a sliding window. The best block size is queried after every QUERY_EVERY transactions.
+
+Run from the repository root:
+    python -m benchmarks.bench_incremental_fraud [number_of_transactions]
+"""
+import sys
+import time
+
+from benchmarks.bench_flat_book import signed_transactions
+from data_structures import ArrayDeque
+from fraud_detection import FraudDetection
+from incremental_fraud_detection import IncrementalFraudDetection
+
+WINDOW = 5_000
+QUERY_EVERY = 1_000
+
+
+def main(count):
+    transactions = signed_transactions(count)
+    detection = IncrementalFraudDetection()
+    window = ArrayDeque(WINDOW + 1)
+    update_seconds = 0.0
+    query_seconds = 0.0
+    queries = 0
+
+    for i in range(count):
+        start = time.perf_counter()
+        detection.add(transactions[i])
+        window.append(transactions[i])
+        if len(window) > WINDOW:
+            detection.remove(window.serve())
+        update_seconds += time.perf_counter() - start
+
+        if (i + 1) % QUERY_EVERY == 0:
+            start = time.perf_counter()
+            answer = detection.detect_by_blocks()
+            query_seconds += time.perf_counter() - start
+            queries += 1
+
+    start = time.perf_counter()
+    recomputed = FraudDetection(window).detect_by_blocks()
+    recompute_seconds = time.perf_counter() - start
+    assert recomputed == answer
+
+    print(f"transactions: {count}, window: {WINDOW}")
+    print(f"{'update':>10} {update_seconds / count * 1e6:>10.1f} us per transaction")
+    print(f"{'query':>10} {query_seconds / queries * 1e6:>10.1f} us")
+    print(f"{'recompute':>10} {recompute_seconds * 1e6:>10.1f} us for the last window")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
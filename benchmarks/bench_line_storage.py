@@ -0,0 +1,60 @@
+"""
+Memory peak and time to the first transaction when draining a ProcessingLine,
+for linked storage against buffer storage.
+
+Run from the repository root:
+    python -m benchmarks.bench_line_storage [number_of_transactions]
+"""
+import sys
+import time
+import tracemalloc
+
+from data_structures import ArrayR
+from processing_line import ProcessingLine, Transaction
+
+
+def make_transactions(count):
+    transactions = ArrayR(count)
+    for i in range(count):
+        transactions[i] = Transaction(i, "alice", "bob")
+    return transactions
+
+
+def drain(storage, transactions):
+    line = ProcessingLine(Transaction(len(transactions) // 2, "carol", "dave"), storage=storage)
+
+    tracemalloc.start()
+    for i in range(len(transactions)):
+        line.add_transaction(transactions[i])
+    filled, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+
+    iterator = iter(line)
+    start = time.perf_counter()
+    iterator.next_unsigned()
+    first_seconds = time.perf_counter() - start
+
+    while iterator.next_unsigned() is not None:
+        pass
+    total_seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return filled, peak, first_seconds, total_seconds
+
+
+def main(count):
+    transactions = make_transactions(count)
+    print(f"transactions: {count}")
+    for storage in (ProcessingLine.LINKED_STORAGE, ProcessingLine.BUFFER_STORAGE):
+        filled, peak, first_seconds, total_seconds = drain(storage, transactions)
+        print(
+            f"{storage:>7}: stored {filled / 2**20:7.2f} MiB, "
+            f"peak while draining {peak / 2**20:7.2f} MiB, "
+            f"first transaction after {first_seconds * 1000:8.3f} ms, "
+            f"drained in {total_seconds:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
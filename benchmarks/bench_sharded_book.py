@@ -0,0 +1,58 @@
+"""
+Store and lookup throughput of ShardedProcessingBook for 1 to 8 worker processes, against a ProcessingBook
+in this process.
+
+Stores are timed up to a len() that waits for every shard to have made them; lookups go through get_many.
+Signed transactions agree on their first characters, so the book is sharded on SHARD_LEVEL, the first
+position where they spread over every page.
+
+Run from the repository root:
+    python -m benchmarks.bench_sharded_book [number_of_transactions]
+"""
+import os
+import sys
+import time
+
+from benchmarks.bench_flat_book import signed_transactions
+from processing_book import ProcessingBook
+from sharded_processing_book import ShardedProcessingBook
+
+SHARD_COUNTS = (1, 2, 4, 8)
+SHARD_LEVEL = 18
+
+
+def main(count):
+    transactions = signed_transactions(count)
+    print(f"transactions: {count}, cpus: {os.cpu_count()}")
+    print(f"{'book':>12} {'store':>14} {'lookup':>14}")
+
+    start = time.perf_counter()
+    book = ProcessingBook()
+    for i in range(count):
+        book[transactions[i]] = i
+    store_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(count):
+        book[transactions[i]]
+    lookup_seconds = time.perf_counter() - start
+    print(f"{'in process':>12} {count / store_seconds:>8.0f} ops/s {count / lookup_seconds:>8.0f} ops/s")
+
+    for shard_count in SHARD_COUNTS:
+        with ShardedProcessingBook(shard_count, SHARD_LEVEL) as sharded:
+            start = time.perf_counter()
+            for i in range(count):
+                sharded[transactions[i]] = i
+            assert len(sharded) == len(book)
+            store_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            amounts = sharded.get_many(transactions)
+            lookup_seconds = time.perf_counter() - start
+            assert amounts[count - 1] == count - 1
+
+        label = f"{shard_count} shards"
+        print(f"{label:>12} {count / store_seconds:>8.0f} ops/s {count / lookup_seconds:>8.0f} ops/s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
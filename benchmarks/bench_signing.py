@@ -0,0 +1,64 @@
+"""
+Throughput of the scalar Transaction.sign path against the batch sign_many path.
+
+Run from the repository root:
+    python -m benchmarks.bench_signing [number_of_transactions]
+"""
+import random
+import sys
+import time
+
+from data_structures import ArrayR
+from processing_line import Transaction, sign_many
+
+
+def make_transactions(count, seed=1008):
+    rng = random.Random(seed)
+    users = ["alice", "bob", "dave", "frank", "grace", "mallory", "trent", "victor"]
+    transactions = ArrayR(count)
+    for i in range(count):
+        transactions[i] = Transaction(
+            rng.randint(1_000_000_000, 2_000_000_000),
+            rng.choice(users) + str(rng.randint(0, 999)),
+            rng.choice(users) + str(rng.randint(0, 999)),
+        )
+    return transactions
+
+
+def time_scalar(transactions):
+    start = time.perf_counter()
+    for i in range(len(transactions)):
+        transactions[i].sign()
+    return time.perf_counter() - start
+
+
+def time_batch(transactions):
+    start = time.perf_counter()
+    sign_many(transactions)
+    return time.perf_counter() - start
+
+
+def main(count):
+    # Warm up the lookup tables so they are not part of the measurement.
+    sign_many(make_transactions(1))
+
+    # Each path gets its own copies, as a transaction that is already signed is skipped.
+    transactions = make_transactions(count)
+    scalar_seconds = time_scalar(transactions)
+    scalar_signatures = [transactions[i].signature for i in range(count)]
+
+    transactions = make_transactions(count)
+    batch_seconds = time_batch(transactions)
+    batch_signatures = [transactions[i].signature for i in range(count)]
+
+    if scalar_signatures != batch_signatures:
+        raise AssertionError("sign_many produced different signatures to Transaction.sign")
+
+    print(f"transactions:   {count}")
+    print(f"scalar sign():  {count / scalar_seconds:>12,.0f} signatures/s ({scalar_seconds:.3f}s)")
+    print(f"sign_many():    {count / batch_seconds:>12,.0f} signatures/s ({batch_seconds:.3f}s)")
+    print(f"speed-up:       {scalar_seconds / batch_seconds:.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,56 @@
+"""
+Memory used by signed transactions stored as Transaction objects against a TransactionBatch.
+
+Run from the repository root:
+    python -m benchmarks.bench_transaction_memory [number_of_transactions]
+"""
+import sys
+import tracemalloc
+
+from data_structures import ArrayDeque
+from processing_line import Transaction, sign_many
+from transaction_batch import TransactionBatch
+
+USERS = 5000
+
+
+def measure(build):
+    tracemalloc.start()
+    kept = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return kept, current
+
+
+def build_objects(count):
+    def build():
+        transactions = ArrayDeque(count)
+        for i in range(count):
+            transactions.append(Transaction(1_700_000_000 + i, "user" + str(i % USERS), "user" + str((i * 7) % USERS)))
+        sign_many(transactions)
+        return transactions
+    return build
+
+
+def build_batch(count):
+    def build():
+        batch = TransactionBatch()
+        for i in range(count):
+            batch.append(1_700_000_000 + i, "user" + str(i % USERS), "user" + str((i * 7) % USERS))
+        batch.sign_all()
+        return batch
+    return build
+
+
+def main(count):
+    _, object_bytes = measure(build_objects(count))
+    _, batch_bytes = measure(build_batch(count))
+
+    print(f"transactions:      {count}")
+    print(f"Transaction:       {object_bytes / 2**20:8.2f} MiB ({object_bytes / count:6.1f} bytes each)")
+    print(f"TransactionBatch:  {batch_bytes / 2**20:8.2f} MiB ({batch_bytes / count:6.1f} bytes each)")
+    print(f"ratio:             {object_bytes / batch_bytes:.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
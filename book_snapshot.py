@@ -0,0 +1,289 @@
+import mmap
+import struct
+import sys
+from array import array
+
+from data_structures import ArrayDeque
+from processing_book import ProcessingBook
+from processing_line import Transaction
+
+MAGIC = b"BNBK"
+VERSION = 1
+PAGE_COUNT = len(ProcessingBook.LEGAL_CHARACTERS)
+
+# magic, version, page count, signature width, node count, leaf count, size of the name blob, error count
+HEADER = struct.Struct("<4sHHIIIQQ")
+# level, transaction count, then one entry per page: 0 empty, n > 0 node n, ~leaf < 0 leaf
+NODE = struct.Struct(f"<iI{PAGE_COUNT}i")
+NODE_HEAD = struct.Struct("<iI")
+NODE_ENTRIES_OFFSET = NODE_HEAD.size
+EMPTY_ENTRIES = array('i', bytes(4 * PAGE_COUNT))
+ENTRY = struct.Struct("<i")
+LEVEL = struct.Struct("<i")
+
+INT_AMOUNT = 0
+FLOAT_AMOUNT = 1
+
+
+def leaf_struct(signature_width):
+    """
+    Leaf record: timestamp, offset and length of the from and to user names in the name blob, amount kind,
+    amount as 8 bytes, signature padded with zeros.
+    """
+    return struct.Struct(f"<qQIQIB8s{signature_width}s")
+
+
+def pack_amount(amount):
+    """
+    :raises ValueError: if the amount is not an int that fits in 64 bits or a float.
+    """
+    if type(amount) is int:
+        if not -2**63 <= amount < 2**63:
+            raise ValueError(f"Amount {amount} does not fit in a snapshot")
+        return INT_AMOUNT, struct.pack("<q", amount)
+    if type(amount) is float:
+        return FLOAT_AMOUNT, struct.pack("<d", amount)
+    raise ValueError(f"Only int and float amounts can be saved, not {type(amount).__name__}")
+
+
+def unpack_amount(kind, data):
+    if kind == INT_AMOUNT:
+        return struct.unpack("<q", data)[0]
+    return struct.unpack("<d", data)[0]
+
+
+def save_book(book, path):
+    """
+    Writes a ProcessingBook (or RadixProcessingBook) to path in the snapshot format read by MappedProcessingBook.
+
+    The file holds a header, one fixed-width record per book (its level, transaction count and one entry per
+    page), one fixed-width record per stored transaction (its fields, amount and signature), and a blob with
+    the UTF-8 user names the transaction records point into. Books are numbered breadth first, so every
+    record can be written as soon as its book is reached; only the leaves are kept until the books are written.
+    Names are not de-duplicated, which keeps saving at O(1) per transaction.
+
+    :raises ValueError: if an amount is not an int or a float.
+    :complexity: O(B x P + N x n), where B is the number of books, P the number of pages, N the number of
+    transactions and n the length of their signatures.
+    """
+    books = ArrayDeque()
+    books.append(book)
+    leaves = ArrayDeque()
+    names = bytearray()
+    signature_width = 0
+
+    with open(path, "wb") as handle:
+        handle.write(bytes(HEADER.size))
+
+        position = 0
+        while position < len(books):
+            current_book = books[position]
+            books[position] = None
+            position += 1
+
+            entries = array('i', EMPTY_ENTRIES)
+            for page in range(PAGE_COUNT):
+                current_page = current_book.pages[page]
+                if current_page is None:
+                    continue
+                if isinstance(current_page, tuple):
+                    entries[page] = ~len(leaves)
+                    leaves.append(current_page)
+                    signature_width = max(signature_width, len(current_page[0].signature))
+                else:
+                    entries[page] = len(books)
+                    books.append(current_page)
+
+            if sys.byteorder == "big":
+                entries.byteswap()
+            handle.write(NODE_HEAD.pack(current_book.level, current_book.transaction_count))
+            handle.write(entries.tobytes())
+
+        leaf = leaf_struct(signature_width)
+        for index in range(len(leaves)):
+            transaction, amount = leaves[index]
+            leaves[index] = None
+            kind, amount_data = pack_amount(amount)
+            from_user = transaction.from_user.encode("utf-8")
+            to_user = transaction.to_user.encode("utf-8")
+            handle.write(leaf.pack(
+                transaction.timestamp,
+                len(names), len(from_user),
+                len(names) + len(from_user), len(to_user),
+                kind,
+                amount_data,
+                transaction.signature.encode("ascii"),
+            ))
+            names += from_user
+            names += to_user
+
+        handle.write(names)
+        handle.seek(0)
+        handle.write(HEADER.pack(
+            MAGIC, VERSION, PAGE_COUNT, signature_width, len(books), len(leaves), len(names), book.error_count
+        ))
+
+
+class MappedProcessingBook:
+    """
+    Read-only ProcessingBook over a snapshot written by save_book.
+    The file is memory-mapped and nothing is read up front but the header: lookups read the book records on
+    their path and iteration reads records as it goes, so opening a large snapshot takes the same time as
+    opening a small one. Transactions handed out are new Transaction objects with their signature set.
+
+        with MappedProcessingBook(path) as book:
+            amount = book[transaction]
+    """
+
+    def __init__(self, path):
+        """
+        :raises ValueError: if the file is not a snapshot this version can read.
+        :complexity: O(1), only the header is read.
+        """
+        self.handle = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.handle.close()
+            raise ValueError(f"{path} is not a ProcessingBook snapshot")
+
+        if len(self.map) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a ProcessingBook snapshot")
+        magic, version, page_count, signature_width, node_count, leaf_count, names_size, error_count = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION or page_count != PAGE_COUNT:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} ProcessingBook snapshot")
+
+        self.signature_width = signature_width
+        self.node_count = node_count
+        self.leaf_count = leaf_count
+        self.names_size = names_size
+        self.error_count = error_count
+
+        self.leaf = leaf_struct(signature_width)
+        self.nodes_offset = HEADER.size
+        self.leaves_offset = self.nodes_offset + node_count * NODE.size
+        self.names_offset = self.leaves_offset + leaf_count * self.leaf.size
+        if len(self.map) < self.names_offset + names_size:
+            self.close()
+            raise ValueError(f"{path} is a truncated ProcessingBook snapshot")
+
+    def node_offset(self, node):
+        return self.nodes_offset + node * NODE.size
+
+    def entry(self, node, page):
+        return ENTRY.unpack_from(self.map, self.node_offset(node) + NODE_ENTRIES_OFFSET + 4 * page)[0]
+
+    def leaf_signature(self, leaf):
+        offset = self.leaves_offset + leaf * self.leaf.size + self.leaf.size - self.signature_width
+        return self.map[offset:offset + self.signature_width].rstrip(b"\0")
+
+    def leaf_amount(self, leaf):
+        _, _, _, _, _, kind, amount_data, _ = self.leaf.unpack_from(self.map, self.leaves_offset + leaf * self.leaf.size)
+        return unpack_amount(kind, amount_data)
+
+    def leaf_pair(self, leaf):
+        """
+        The (transaction, amount) pair of a leaf record, as new objects.
+        """
+        timestamp, from_offset, from_length, to_offset, to_length, kind, amount_data, signature = \
+            self.leaf.unpack_from(self.map, self.leaves_offset + leaf * self.leaf.size)
+        transaction = Transaction(
+            timestamp, self.user_name(from_offset, from_length), self.user_name(to_offset, to_length)
+        )
+        transaction.signature = signature.rstrip(b"\0").decode("ascii")
+        return (transaction, unpack_amount(kind, amount_data))
+
+    def user_name(self, offset, length):
+        start = self.names_offset + offset
+        return self.map[start:start + length].decode("utf-8")
+
+    def __getitem__(self, transaction):
+        """
+        :raises KeyError: if the transaction is not in the book.
+        :raises ValueError: if its signature has characters that are not legal.
+        :complexity: Best case is O(n), where n is len(transaction.signature), when the transaction is on the
+        first level. Worst case is O(n) too, one book record is read per level.
+        """
+        signature = transaction.signature
+        codes = ProcessingBook.checked_page_key(signature)
+        node = 0
+        while True:
+            level = LEVEL.unpack_from(self.map, self.node_offset(node))[0]
+            if level >= len(codes):
+                break
+            entry = self.entry(node, codes[level])
+            if entry == 0:
+                break
+            if entry < 0:
+                if self.leaf_signature(~entry) == signature.encode("ascii"):
+                    return self.leaf_amount(~entry)
+                break
+            node = entry
+
+        raise KeyError("Transaction not found")
+
+    def __contains__(self, transaction):
+        try:
+            self[transaction]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        """
+        Generator over the (transaction, amount) pairs in signature order, reading records as it goes.
+        :complexity: O(B x P + N) over the whole iteration, where B is the number of books, P the number of
+        pages and N the number of transactions.
+        """
+        parent_nodes = ArrayDeque()
+        parent_pages = ArrayDeque()
+        node = 0
+        page = 0
+        while True:
+            while page < PAGE_COUNT:
+                entry = self.entry(node, page)
+                page += 1
+                if entry < 0:
+                    yield self.leaf_pair(~entry)
+                elif entry > 0:
+                    parent_nodes.append(node)
+                    parent_pages.append(page)
+                    node = entry
+                    page = 0
+
+            if len(parent_nodes) == 0:
+                return
+            node = parent_nodes.pop()
+            page = parent_pages.pop()
+
+    def items(self):
+        return iter(self)
+
+    def to_book(self):
+        """
+        Loads the whole snapshot into a new ProcessingBook.
+        :complexity: O(N log N + N x n), as ProcessingBook.bulk_load.
+        """
+        book = ProcessingBook()
+        book.bulk_load(self)
+        book.error_count = self.error_count
+        return book
+
+    def get_error_count(self):
+        return self.error_count
+
+    def __len__(self):
+        return NODE.unpack_from(self.map, self.nodes_offset)[1]
+
+    def close(self):
+        self.map.close()
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
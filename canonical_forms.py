@@ -0,0 +1,265 @@
+import multiprocessing
+from array import array
+
+from data_structures import ArrayMinHeap, LinearProbeTable
+from processing_line import SignatureKeyTable
+
+
+def first_primes(count):
+    """
+    The first count primes, in an array.
+    :complexity: O(P log log P) where P is the count-th prime, with the sieve's inner loop done by slice assignment.
+    """
+    limit = 16
+    while True:
+        sieve = bytearray(b"\x01") * limit
+        sieve[0:2] = b"\x00\x00"
+        factor = 2
+        while factor * factor < limit:
+            if sieve[factor]:
+                sieve[factor * factor::factor] = bytes(len(range(factor * factor, limit, factor)))
+            factor += 1
+        primes = array('q', (number for number in range(limit) if sieve[number]))
+        if len(primes) >= count:
+            return primes
+        limit *= 2
+
+
+def canonical_key(row, block_size):
+    """
+    The canonical form key of one signature, given as bytes: its complete blocks in order, sorted with a heap,
+    followed by its remaining bytes. Two signatures of the same length have the same key exactly when
+    FraudDetection.transform_signature gives them the same canonical form.
+    :complexity: O(k log k + L) where k = L // block_size is the number of blocks and L is len(row).
+    """
+    blocks_length = len(row) // block_size * block_size
+    shift = 8 * block_size
+    heap = ArrayMinHeap.heapify(
+        int.from_bytes(row[start:start + block_size], "big") for start in range(0, blocks_length, block_size)
+    )
+    key = 0
+    while not heap.is_empty():
+        key = (key << shift) | heap.get_min()
+    if blocks_length == len(row):
+        return key
+    return (key << (8 * (len(row) - blocks_length))) | int.from_bytes(row[blocks_length:], "big")
+
+
+class KeyCountTable(LinearProbeTable):
+    """
+    LinearProbeTable from int keys to the number of times they were counted, with the product of those numbers
+    kept in count_product. Uses the built-in int hash and SignatureKeyTable's list of table sizes, starting from
+    the first size that holds expected_length keys, so counting that many never has to grow the table.
+    """
+
+    def __init__(self, expected_length=0):
+        LinearProbeTable.__init__(self, tuple(
+            size for size in SignatureKeyTable.TABLE_SIZES
+            if size > 2 * expected_length or size == SignatureKeyTable.TABLE_SIZES[-1]
+        ))
+        self.count_product = 1
+
+    def hash(self, key):
+        """
+        :complexity: O(1) for keys of a fixed size.
+        """
+        return hash(key) % self.table_size
+
+    def count_all(self, keys):
+        """
+        Counts every key of an iterable, probing the table once per key. A key seen for the (c + 1)-th time
+        multiplies count_product by (c + 1) / c, which is exact as c divides it.
+        :complexity: O(n) expected, where n is the number of keys, assuming the table has few collisions.
+        """
+        array = self.__array
+        size = len(array)
+        length = len(self)
+        count_product = self.count_product
+        for key in keys:
+            position = hash(key) % size
+            while True:
+                item = array[position]
+                if item is None:
+                    array[position] = (key, 1)
+                    length += 1
+                    break
+                if item[0] == key:
+                    array[position] = (key, item[1] + 1)
+                    count_product = count_product // item[1] * (item[1] + 1)
+                    break
+                position = (position + 1) % size
+            if length > size / 2:
+                self.__length = length
+                self.__rehash()
+                array = self.__array
+                size = len(array)
+        self.__length = length
+        self.count_product = count_product
+
+
+# The CanonicalForms of a pool worker process, set once when the worker starts.
+worker_forms = None
+
+
+def start_worker(forms):
+    global worker_forms
+    worker_forms = forms
+
+
+def worker_suspicion(block_size):
+    return worker_forms.suspicion(block_size)
+
+
+class CanonicalForms:
+    """
+    The canonical forms FraudDetection.transform_signature gives a batch of signatures, worked out for the
+    whole batch one block size at a time.
+
+    The signatures are kept as fixed-width rows of one bytes object, and every canonical form is an int key
+    instead of a string, equal for two signatures exactly when their canonical forms are equal. Two canonical
+    forms are equal when the signatures have the same multiset of blocks and the same remaining characters,
+    so the key is a code for the multiset, followed by the remaining characters:
+        one block per signature: the signature itself, the same for every such block size
+        blocks of at most TABLE_BLOCK_SIZE characters: the product of a prime per distinct block, which by
+            unique factorisation depends on which blocks there are and how many of each, but not on their order,
+            so nothing is sorted
+        two blocks: the two in order, after one comparison
+        more blocks: the blocks in order, sorted with a heap; there are at most 12 of them once the blocks are
+            longer than TABLE_BLOCK_SIZE
+
+    :raises ValueError: if the signatures do not all have the same length, or have characters beyond latin-1.
+    """
+
+    TABLE_BLOCK_SIZE = 2
+    primes = array('q')
+
+    def __init__(self, signatures):
+        """
+        :complexity: O(N x L) where N is the number of signatures and L their length.
+        """
+        self.count = len(signatures)
+        self.width = len(signatures[0]) if self.count > 0 else 0
+        for i in range(self.count):
+            if len(signatures[i]) != self.width:
+                raise ValueError("Signatures must all have the same length")
+        self.rows = b"".join(signatures[i].encode("latin-1") for i in range(self.count))
+        self.whole_row_score = None
+
+    def suspicion(self, block_size):
+        """
+        Product of the sizes of the groups of signatures with the same canonical form, as
+        FraudDetection.calculate_suspicion. The keys are counted in a KeyCountTable sized for all of them.
+        :complexity: O(N) expected plus the cost of keys, where N is the number of signatures.
+        """
+        whole_row = self.width // block_size == 1
+        if whole_row and self.whole_row_score is not None:
+            return self.whole_row_score
+
+        counts = KeyCountTable(self.count)
+        counts.count_all(self.keys(block_size))
+        score = counts.count_product
+
+        if whole_row:
+            self.whole_row_score = score
+        return score
+
+    def distinct_block_sizes(self):
+        """
+        The block sizes worth scoring, from 1: every block size past L // 2 + 1 leaves one block per signature,
+        so it groups the signatures as L // 2 + 1 does and can never have a larger score.
+        """
+        return range(1, min(self.width, self.width // 2 + 1) + 1)
+
+    def suspicions(self, block_sizes, process_count=1):
+        """
+        The suspicion of every block size of block_sizes, in a tuple in the same order.
+        With more than one process, the block sizes are spread over a pool of process_count worker processes,
+        each given a copy of the rows when it starts, and are handed out one at a time, so a worker that is
+        done with a cheap block size takes the next one. The pool is shut down before this returns.
+        :raises ValueError: if process_count is below 1.
+        :complexity: As suspicion for every block size, divided between the processes.
+        """
+        if process_count < 1:
+            raise ValueError("process_count must be at least 1")
+        if process_count == 1:
+            return tuple(self.suspicion(block_size) for block_size in block_sizes)
+
+        with multiprocessing.Pool(process_count, initializer=start_worker, initargs=(self,)) as pool:
+            return tuple(pool.map(worker_suspicion, block_sizes, chunksize=1))
+
+    def keys(self, block_size):
+        """
+        Generator over the canonical form keys of the signatures, in order.
+        :raises ValueError: if block_size is not between 1 and the length of the signatures.
+        :complexity: O(N x k) where N is the number of signatures and k = L // block_size the number of blocks
+        in each, O(N x k log k) when the blocks are sorted with a heap.
+        """
+        if not 1 <= block_size <= self.width:
+            raise ValueError(f"Block size must be between 1 and {self.width}")
+        block_count = self.width // block_size
+        if block_count == 1:
+            return self.whole_row_keys()
+        if block_size <= CanonicalForms.TABLE_BLOCK_SIZE:
+            return self.prime_product_keys(block_size)
+        if block_count == 2:
+            return self.pair_keys(block_size)
+        return self.sorted_block_keys(block_size)
+
+    def remainder(self, key, row_start, blocks_end):
+        """
+        key followed by the characters of the row after its last complete block.
+        """
+        row_end = row_start + self.width
+        if blocks_end == row_end:
+            return key
+        return (key << (8 * (row_end - blocks_end))) | int.from_bytes(self.rows[blocks_end:row_end], "big")
+
+    def whole_row_keys(self):
+        rows = self.rows
+        width = self.width
+        for row_start in range(0, self.count * width, width):
+            yield int.from_bytes(rows[row_start:row_start + width], "big")
+
+    def prime_product_keys(self, block_size):
+        """
+        Every distinct block gets the next unused prime the first time it is seen, from a table indexed by
+        the block's bytes, and a signature's key is the product of the primes of its blocks.
+        """
+        rows = self.rows
+        width = self.width
+        blocks_length = width // block_size * block_size
+        block_primes = array('q', bytes(8 * 256 ** block_size))
+        if len(CanonicalForms.primes) < min(256 ** block_size, self.count * width):
+            CanonicalForms.primes = first_primes(min(256 ** block_size, self.count * width))
+        primes = CanonicalForms.primes
+        used_primes = 0
+
+        for row_start in range(0, self.count * width, width):
+            product = 1
+            for start in range(row_start, row_start + blocks_length, block_size):
+                block = rows[start] if block_size == 1 else (rows[start] << 8) | rows[start + 1]
+                prime = block_primes[block]
+                if prime == 0:
+                    prime = primes[used_primes]
+                    block_primes[block] = prime
+                    used_primes += 1
+                product *= prime
+            yield self.remainder(product, row_start, row_start + blocks_length)
+
+    def pair_keys(self, block_size):
+        rows = self.rows
+        width = self.width
+        shift = 8 * block_size
+        for row_start in range(0, self.count * width, width):
+            middle = row_start + block_size
+            first = int.from_bytes(rows[row_start:middle], "big")
+            second = int.from_bytes(rows[middle:middle + block_size], "big")
+            if second < first:
+                first, second = second, first
+            yield self.remainder((first << shift) | second, row_start, middle + block_size)
+
+    def sorted_block_keys(self, block_size):
+        rows = self.rows
+        width = self.width
+        for row_start in range(0, self.count * width, width):
+            yield canonical_key(rows[row_start:row_start + width], block_size)
@@ -0,0 +1,151 @@
+import threading
+
+from data_structures import ArrayMinHeap, ArrayR
+from processing_book import ProcessingBook
+
+
+class ConcurrentProcessingBook:
+    """
+    ProcessingBook that several threads can store into, read and remove from at the same time.
+
+    Transactions are split into stripes by the page of one signature character, the one at stripe_level.
+    Every stripe is a ProcessingBook of its own behind its own lock, so writers on different stripes never
+    touch the same books or counters, and only writers on the same stripe wait for each other.
+
+    Stripe on the first level where signatures actually differ: stripe_level 0 gives one stripe per
+    top-level page, but signed transactions all start with the same characters and would share a single
+    stripe, so they should be striped on a lower level (see benchmarks/bench_concurrent_book.py).
+
+    Each stripe keeps its own transaction and error counts under its lock. len() and get_error_count() take
+    every lock in stripe order, so they add up a consistent state rather than counts from different moments.
+    """
+
+    PAGE_COUNT = len(ProcessingBook.LEGAL_CHARACTERS)
+
+    def __init__(self, stripe_level=0):
+        """
+        :complexity: Best and worst case is O(P), where P is the number of pages, one stripe per page.
+        """
+        if stripe_level < 0:
+            raise ValueError("stripe_level cannot be negative")
+        self.stripe_level = stripe_level
+        self.stripes = ArrayR(ConcurrentProcessingBook.PAGE_COUNT)
+        self.locks = ArrayR(ConcurrentProcessingBook.PAGE_COUNT)
+        for stripe in range(ConcurrentProcessingBook.PAGE_COUNT):
+            self.stripes[stripe] = ProcessingBook()
+            self.locks[stripe] = threading.Lock()
+
+    page_index = ProcessingBook.page_index
+
+    def stripe_index(self, signature):
+        """
+        The stripe of a signature, the page of its character at stripe_level (its last character if it is shorter).
+        :raises ValueError: if that character is not legal.
+        :complexity: O(1)
+        """
+        return self.page_index(signature[min(self.stripe_level, len(signature) - 1)])
+
+    def __setitem__(self, transaction, amount):
+        """
+        :complexity: As ProcessingBook.__setitem__, plus waiting for writers on the same stripe.
+        """
+        stripe = self.stripe_index(transaction.signature)
+        with self.locks[stripe]:
+            self.stripes[stripe][transaction] = amount
+
+    def __getitem__(self, transaction):
+        """
+        Readers take the stripe lock too, as a writer can leave a stripe half way through nesting a collision.
+        :raises KeyError: if the transaction is not in the book.
+        :complexity: As ProcessingBook.__getitem__.
+        """
+        stripe = self.stripe_index(transaction.signature)
+        with self.locks[stripe]:
+            return self.stripes[stripe][transaction]
+
+    def __delitem__(self, transaction):
+        """
+        :raises KeyError: if the transaction is not in the book.
+        :complexity: As ProcessingBook.__delitem__.
+        """
+        stripe = self.stripe_index(transaction.signature)
+        with self.locks[stripe]:
+            del self.stripes[stripe][transaction]
+
+    def acquire_all(self):
+        for stripe in range(ConcurrentProcessingBook.PAGE_COUNT):
+            self.locks[stripe].acquire()
+
+    def release_all(self):
+        for stripe in range(ConcurrentProcessingBook.PAGE_COUNT - 1, -1, -1):
+            self.locks[stripe].release()
+
+    def __len__(self):
+        """
+        :complexity: O(P), where P is the number of stripes, plus waiting for every stripe's writers.
+        """
+        self.acquire_all()
+        try:
+            count = 0
+            for stripe in range(ConcurrentProcessingBook.PAGE_COUNT):
+                count += self.stripes[stripe].transaction_count
+            return count
+        finally:
+            self.release_all()
+
+    def get_error_count(self):
+        """
+        Returns the number of errors encountered while storing transactions.
+        :complexity: O(P), where P is the number of stripes, plus waiting for every stripe's writers.
+        """
+        self.acquire_all()
+        try:
+            errors = 0
+            for stripe in range(ConcurrentProcessingBook.PAGE_COUNT):
+                errors += self.stripes[stripe].error_count
+            return errors
+        finally:
+            self.release_all()
+
+    def snapshot(self):
+        """
+        Copies of every stripe's (transaction, amount) pairs, in an ArrayR per stripe, all taken under every lock.
+        :complexity: O(B x P), where B is the number of books and P the number of pages.
+        """
+        copies = ArrayR(ConcurrentProcessingBook.PAGE_COUNT)
+        self.acquire_all()
+        try:
+            for stripe in range(ConcurrentProcessingBook.PAGE_COUNT):
+                book = self.stripes[stripe]
+                copies[stripe] = ArrayR(book.transaction_count)
+                book.items_into(copies[stripe])
+        finally:
+            self.release_all()
+        return copies
+
+    def __iter__(self):
+        return self.items()
+
+    def items(self):
+        """
+        Generator over the (transaction, amount) pairs in signature order, as they were when iteration started.
+        Every stripe is in signature order already, so they are merged with a heap holding one entry per stripe.
+        :complexity: O(B x P + N log P), where B is the number of books, P the number of pages and N the number
+        of transactions.
+        """
+        copies = self.snapshot()
+        heap = ArrayMinHeap()
+        for stripe in range(ConcurrentProcessingBook.PAGE_COUNT):
+            if len(copies[stripe]) > 0:
+                first = copies[stripe][0]
+                heap.add((ProcessingBook.page_key(first[0].signature), stripe, 0))
+
+        while not heap.is_empty():
+            _, stripe, position = heap.peek()
+            stripe_copy = copies[stripe]
+            yield stripe_copy[position]
+            position += 1
+            if position < len(stripe_copy):
+                heap.replace_min((ProcessingBook.page_key(stripe_copy[position][0].signature), stripe, position))
+            else:
+                heap.get_min()
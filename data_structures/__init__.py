@@ -9,3 +9,5 @@ from .hash_table_separate_chaining import HashTableSeparateChaining
 from .hash_table_linear_probing import LinearProbeTable
 from .hash_table_double_hashing import DoubleHashingTable
 from .hash_table_quadratic_probing import QuadraticProbeTable
+from .array_deque import ArrayDeque
+from .array_min_heap import ArrayMinHeap
@@ -0,0 +1,144 @@
+from data_structures.abstract_queue import Queue, T
+from data_structures.referential_array import ArrayR
+
+
+class ArrayDeque(Queue[T]):
+    """ Double-ended queue implemented with a circular array.
+    Items are appended at the rear and can be removed from either end, so the
+    same buffer can be read in insertion order (serve) or in reverse (pop)
+    without copying it. The array doubles in size when it fills up.
+    """
+
+    MIN_CAPACITY = 16
+
+    def __init__(self, initial_capacity: int = MIN_CAPACITY) -> None:
+        """
+        :complexity: O(initial_capacity) to create the array.
+        """
+        if initial_capacity < 0:
+            raise ValueError("Capacity cannot be negative.")
+
+        self.__array = ArrayR(max(initial_capacity, 1))
+        self.__front = 0
+        self.__length = 0
+
+    def append(self, item: T) -> None:
+        """ Adds an element to the rear of the deque.
+        :complexity: O(1) amortised, O(N) when the array has to grow.
+        """
+        array = self.__array
+        length = self.__length
+        if length == len(array):
+            self.reserve(2 * len(array))
+            array = self.__array
+
+        index = self.__front + length
+        if index >= len(array):
+            index -= len(array)
+        array[index] = item
+        self.__length = length + 1
+
+    def serve(self) -> T:
+        """ Deletes and returns the element at the front of the deque.
+        :raises Exception: if the deque is empty.
+        :complexity: O(1)
+        """
+        if self.is_empty():
+            raise Exception("Deque is empty")
+
+        item = self.__array[self.__front]
+        self.__array[self.__front] = None
+        self.__front = (self.__front + 1) % len(self.__array)
+        self.__length -= 1
+        return item
+
+    def pop(self) -> T:
+        """ Deletes and returns the element at the rear of the deque.
+        :raises Exception: if the deque is empty.
+        :complexity: O(1)
+        """
+        if self.is_empty():
+            raise Exception("Deque is empty")
+
+        rear = (self.__front + self.__length - 1) % len(self.__array)
+        item = self.__array[rear]
+        self.__array[rear] = None
+        self.__length -= 1
+        return item
+
+    def peek(self) -> T:
+        """ Returns the element at the front of the deque without deleting it.
+        :raises Exception: if the deque is empty.
+        :complexity: O(1)
+        """
+        if self.is_empty():
+            raise Exception("Deque is empty")
+        return self.__array[self.__front]
+
+    def peek_rear(self) -> T:
+        """ Returns the element at the rear of the deque without deleting it.
+        :raises Exception: if the deque is empty.
+        :complexity: O(1)
+        """
+        if self.is_empty():
+            raise Exception("Deque is empty")
+        return self.__array[(self.__front + self.__length - 1) % len(self.__array)]
+
+    def reserve(self, capacity: int) -> None:
+        """ Makes sure the deque can hold capacity items without growing again.
+        The items are moved to the start of the new array.
+        :complexity: O(N + capacity) when the array grows, O(1) otherwise.
+            N is the number of items in the deque.
+        """
+        if capacity <= len(self.__array):
+            return
+
+        new_array = ArrayR(capacity)
+        for i in range(self.__length):
+            new_array[i] = self.__array[(self.__front + i) % len(self.__array)]
+        self.__array = new_array
+        self.__front = 0
+
+    def capacity(self) -> int:
+        """ Returns the number of items the deque can hold before it grows. """
+        return len(self.__array)
+
+    def clear(self) -> None:
+        """ Clears all elements from the deque. The capacity is kept.
+        :complexity: O(C) where C is the capacity, to drop the references.
+        """
+        for i in range(len(self.__array)):
+            self.__array[i] = None
+        self.__front = 0
+        self.__length = 0
+
+    def __getitem__(self, index: int) -> T:
+        """ Returns the element index positions from the front.
+        :raises IndexError: if the index is out of bounds.
+        :complexity: O(1)
+        """
+        if index < -1 * self.__length or index >= self.__length:
+            raise IndexError("Out of bounds access in deque.")
+        if index < 0:
+            index = self.__length + index
+        return self.__array[(self.__front + index) % len(self.__array)]
+
+    def __setitem__(self, index: int, item: T) -> None:
+        """ Replaces the element index positions from the front.
+        :raises IndexError: if the index is out of bounds.
+        :complexity: O(1)
+        """
+        if index < -1 * self.__length or index >= self.__length:
+            raise IndexError("Out of bounds access in deque.")
+        if index < 0:
+            index = self.__length + index
+        self.__array[(self.__front + index) % len(self.__array)] = item
+
+    def __len__(self) -> int:
+        """ Returns the number of elements in the deque. """
+        return self.__length
+
+    def __str__(self) -> str:
+        """ Returns a string representation of the deque. """
+        items = ", ".join(str(self[i]) for i in range(len(self)))
+        return f"<ArrayDeque [{items}]>"
@@ -0,0 +1,145 @@
+from typing import Iterable
+
+from data_structures.abstract_queue import T
+from data_structures.referential_array import ArrayR
+
+
+class ArrayMinHeap:
+    """ Binary min-heap stored in an array.
+    Items are compared with <, so tuples such as (priority, tie_breaker, item)
+    give a stable priority queue.
+
+    The items are kept in the first length slots of an ArrayR, the children of
+    position i being at 2i + 1 and 2i + 2. The array doubles in size when it
+    fills up. Sifting moves a hole rather than swapping, so each level costs
+    one comparison and one write.
+    """
+
+    MIN_CAPACITY = 16
+
+    def __init__(self) -> None:
+        self.__array = ArrayR(ArrayMinHeap.MIN_CAPACITY)
+        self.__length = 0
+
+    @classmethod
+    def heapify(cls, items: Iterable[T]) -> "ArrayMinHeap":
+        """ Creates a heap holding every item in items.
+        The items are copied into the array as they come, then every parent is
+        sifted down, from the last one to the root.
+        :complexity: O(N) where N is the number of items, cheaper than N adds.
+        """
+        heap = cls()
+        for item in items:
+            heap.__append(item)
+        for position in range(heap.__length // 2 - 1, -1, -1):
+            heap.__sift_down(position, heap.__array[position])
+        return heap
+
+    def __append(self, item: T) -> None:
+        """ Puts item in the slot after the last one, growing the array when it is full.
+        :complexity: O(1) amortised, O(N) when the array has to grow.
+        """
+        array = self.__array
+        if self.__length == len(array):
+            new_array = ArrayR(2 * len(array))
+            for i in range(self.__length):
+                new_array[i] = array[i]
+            self.__array = new_array
+        self.__array[self.__length] = item
+        self.__length += 1
+
+    def __sift_up(self, position: int, item: T) -> None:
+        """ Places item in the hole at position, moving it up past every larger parent.
+        :complexity: O(log N) where N is the number of items in the heap.
+        """
+        array = self.__array
+        while position > 0:
+            parent = (position - 1) // 2
+            parent_item = array[parent]
+            if not item < parent_item:
+                break
+            array[position] = parent_item
+            position = parent
+        array[position] = item
+
+    def __sift_down(self, position: int, item: T) -> None:
+        """ Places item in the hole at position, moving it down past every smaller child.
+        :complexity: O(log N) where N is the number of items in the heap.
+        """
+        array = self.__array
+        length = self.__length
+        child = 2 * position + 1
+        while child < length:
+            child_item = array[child]
+            if child + 1 < length:
+                right_item = array[child + 1]
+                if right_item < child_item:
+                    child += 1
+                    child_item = right_item
+            if not child_item < item:
+                break
+            array[position] = child_item
+            position = child
+            child = 2 * position + 1
+        array[position] = item
+
+    def add(self, item: T) -> None:
+        """ Adds an item to the heap.
+        :complexity: O(log N) where N is the number of items in the heap.
+        """
+        self.__append(item)
+        self.__sift_up(self.__length - 1, item)
+
+    def get_min(self) -> T:
+        """ Removes and returns the smallest item.
+        :raises IndexError: if the heap is empty.
+        :complexity: O(log N) where N is the number of items in the heap.
+        """
+        if self.__length == 0:
+            raise IndexError("Heap is empty")
+        array = self.__array
+        smallest = array[0]
+        self.__length -= 1
+        last = array[self.__length]
+        array[self.__length] = None
+        if self.__length > 0:
+            self.__sift_down(0, last)
+        return smallest
+
+    def replace_min(self, item: T) -> T:
+        """ Removes and returns the smallest item, then adds item.
+        Cheaper than get_min followed by add.
+        :raises IndexError: if the heap is empty.
+        :complexity: O(log N) where N is the number of items in the heap.
+        """
+        if self.__length == 0:
+            raise IndexError("Heap is empty")
+        smallest = self.__array[0]
+        self.__sift_down(0, item)
+        return smallest
+
+    def peek(self) -> T:
+        """ Returns the smallest item without removing it.
+        :raises IndexError: if the heap is empty.
+        :complexity: O(1)
+        """
+        if self.__length == 0:
+            raise IndexError("Heap is empty")
+        return self.__array[0]
+
+    def is_empty(self) -> bool:
+        return self.__length == 0
+
+    def clear(self) -> None:
+        self.__array = ArrayR(ArrayMinHeap.MIN_CAPACITY)
+        self.__length = 0
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __str__(self) -> str:
+        items = ", ".join(str(self.__array[i]) for i in range(self.__length))
+        return f"<ArrayMinHeap [{items}]>"
+
+    def __repr__(self) -> str:
+        return str(self)
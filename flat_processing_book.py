@@ -0,0 +1,308 @@
+from array import array
+
+from data_structures import ArrayDeque
+from processing_book import ProcessingBook
+
+
+class FlatProcessingBook:
+    """
+    ProcessingBook that keeps every level in a few flat arrays instead of one nested book per level.
+
+    Node n owns the PAGE_COUNT entries of slots starting at n * PAGE_COUNT, one per legal character.
+    An entry is
+        EMPTY (0): the page is empty
+        n > 0: the page holds nested node n
+        ~leaf < 0: the page holds leaf number leaf
+    Node 0 is the root, so it can never be anyone's child. Leaves live in leaf_transactions and leaf_amounts,
+    and node_counts holds the number of transactions under each node. Bit p of node_bits[n] is set when page p
+    of node n is not empty, which gives the last page of a collapsing node without a scan. Freed nodes and
+    leaves are reused.
+
+    Stores, finds, removes and iterates transactions exactly like ProcessingBook, including error counting
+    and collapsing a nested node back into its parent page once it holds a single transaction.
+    """
+
+    PAGE_COUNT = len(ProcessingBook.LEGAL_CHARACTERS)
+    EMPTY = 0
+    ROOT = 0
+    EMPTY_NODE = array('i', bytes(array('i').itemsize * PAGE_COUNT))
+
+    def __init__(self):
+        """
+        :complexity: Best and worst case is O(1).
+        """
+        self.slots = array('i', FlatProcessingBook.EMPTY_NODE)
+        self.node_counts = array('i', (0,))
+        self.node_bits = array('Q', (0,))
+        self.free_nodes = array('i')
+
+        self.leaf_transactions = ArrayDeque()
+        self.leaf_amounts = ArrayDeque()
+        self.free_leaves = array('i')
+
+        self.error_count = 0
+
+    page_index = ProcessingBook.page_index
+
+    def new_node(self):
+        """
+        Returns an empty node, reusing a freed one when there is one.
+        :complexity: O(1) amortised over the growth of the arrays.
+        """
+        if len(self.free_nodes) > 0:
+            return self.free_nodes.pop()
+        self.slots.extend(FlatProcessingBook.EMPTY_NODE)
+        self.node_counts.append(0)
+        self.node_bits.append(0)
+        return len(self.node_counts) - 1
+
+    def free_node(self, node):
+        start = node * FlatProcessingBook.PAGE_COUNT
+        self.slots[start:start + FlatProcessingBook.PAGE_COUNT] = FlatProcessingBook.EMPTY_NODE
+        self.node_counts[node] = 0
+        self.node_bits[node] = 0
+        self.free_nodes.append(node)
+
+    def new_leaf(self, transaction, amount):
+        """
+        Stores a transaction and its amount and returns the leaf number.
+        :complexity: O(1) amortised over the growth of the arrays.
+        """
+        if len(self.free_leaves) > 0:
+            leaf = self.free_leaves.pop()
+            self.leaf_transactions[leaf] = transaction
+            self.leaf_amounts[leaf] = amount
+            return leaf
+        self.leaf_transactions.append(transaction)
+        self.leaf_amounts.append(amount)
+        return len(self.leaf_transactions) - 1
+
+    def free_leaf(self, leaf):
+        self.leaf_transactions[leaf] = None
+        self.leaf_amounts[leaf] = None
+        self.free_leaves.append(leaf)
+
+    def __setitem__(self, transaction, amount):
+        """
+        :complexity: Best case is O(1), when the transaction's first page is empty. Worst case is O(n), where n is
+        len(transaction.signature), when the transaction shares a long prefix with a stored one and a chain of
+        nodes has to be walked or created. The whole signature is checked first, in O(n) done in C, and the path
+        and the point where a colliding signature branches off are found before anything is changed, so a
+        signature that cannot be stored leaves the book as it was.
+        :raises ValueError: if the signature has characters that are not legal, or it is a prefix of a stored
+        signature or the other way round.
+        """
+        signature = transaction.signature
+        codes = ProcessingBook.checked_page_key(signature)
+        slots = self.slots
+        counts = self.node_counts
+        page_count = FlatProcessingBook.PAGE_COUNT
+
+        node = FlatProcessingBook.ROOT
+        level = 0
+        while True:
+            if level == len(codes):
+                raise ValueError(f"{signature!r} cannot be stored, as it is a prefix of stored signatures")
+            position = node * page_count + codes[level]
+            entry = slots[position]
+            if entry <= 0:
+                break
+            node = entry
+            level += 1
+
+        if entry == FlatProcessingBook.EMPTY:
+            self.count_path(codes, level)
+            slots[position] = ~self.new_leaf(transaction, amount)
+            self.node_bits[node] |= 1 << codes[level]
+            return
+
+        stored_signature = self.leaf_transactions[~entry].signature
+        if stored_signature == signature:
+            if self.leaf_amounts[~entry] != amount:
+                self.error_count += 1
+            return
+
+        # Collision: find where the two signatures differ, then push the stored leaf down to it
+        stored_codes = ProcessingBook.page_key(stored_signature)
+        branch_level = level + 1
+        shared_length = min(len(codes), len(stored_codes))
+        while branch_level < shared_length and stored_codes[branch_level] == codes[branch_level]:
+            branch_level += 1
+        if branch_level == shared_length:
+            raise ValueError(
+                f"{signature!r} cannot be stored with {stored_signature!r}, as one is a prefix of the other"
+            )
+
+        self.count_path(codes, level)
+        level += 1
+        node = self.new_node()
+        slots[position] = node
+        while level < branch_level:
+            counts[node] = 2
+            child = self.new_node()
+            page = codes[level]
+            slots[node * page_count + page] = child
+            self.node_bits[node] = 1 << page
+            node = child
+            level += 1
+
+        counts[node] = 2
+        stored_page = stored_codes[level]
+        page = codes[level]
+        slots[node * page_count + stored_page] = entry
+        slots[node * page_count + page] = ~self.new_leaf(transaction, amount)
+        self.node_bits[node] = (1 << stored_page) | (1 << page)
+
+    def count_path(self, codes, last_level):
+        """
+        Increments the counts of the nodes on the path of a signature's page codes, from the root down to last_level.
+        """
+        node = FlatProcessingBook.ROOT
+        for level in range(last_level + 1):
+            self.node_counts[node] += 1
+            node = self.slots[node * FlatProcessingBook.PAGE_COUNT + codes[level]]
+
+    def __getitem__(self, transaction):
+        """
+        :complexity: Best case is O(1), when the transaction is found on the first level or its first page is
+        empty. Worst case is O(n), where n is len(transaction.signature), when the transaction is deep in the book.
+        """
+        signature = transaction.signature
+        slots = self.slots
+        node = FlatProcessingBook.ROOT
+
+        for level in range(len(signature)):
+            entry = slots[node * FlatProcessingBook.PAGE_COUNT + self.page_index(signature[level])]
+            if entry == FlatProcessingBook.EMPTY:
+                break
+            if entry < 0:
+                if self.leaf_transactions[~entry].signature == signature:
+                    return self.leaf_amounts[~entry]
+                break
+            node = entry
+
+        raise KeyError("Transaction not found")
+
+    def __delitem__(self, transaction):
+        """
+        :complexity: Best case is O(1), when the transaction is found on the first level or its first page is
+        empty. Worst case is O(n), where n is len(transaction.signature), when the transaction is deep in the book
+        and the nodes above it collapse.
+        """
+        signature = transaction.signature
+        slots = self.slots
+        counts = self.node_counts
+        page_count = FlatProcessingBook.PAGE_COUNT
+
+        path_nodes = array('i')
+        path_positions = array('i')
+        node = FlatProcessingBook.ROOT
+        entry = FlatProcessingBook.EMPTY
+        for level in range(len(signature)):
+            position = node * page_count + self.page_index(signature[level])
+            path_nodes.append(node)
+            path_positions.append(position)
+            entry = slots[position]
+            if entry <= 0:
+                break
+            node = entry
+
+        if entry >= 0 or self.leaf_transactions[~entry].signature != signature:
+            raise KeyError("Transaction not found")
+
+        slots[path_positions[-1]] = FlatProcessingBook.EMPTY
+        self.node_bits[path_nodes[-1]] &= ~(1 << (path_positions[-1] - path_nodes[-1] * page_count))
+        self.free_leaf(~entry)
+        for depth in range(len(path_nodes)):
+            counts[path_nodes[depth]] -= 1
+
+        # Collapse nodes left holding a single leaf, from the bottom up
+        for depth in range(len(path_nodes) - 1, 0, -1):
+            node = path_nodes[depth]
+            parent_position = path_positions[depth - 1]
+            if counts[node] == 0:
+                slots[parent_position] = FlatProcessingBook.EMPTY
+                parent = path_nodes[depth - 1]
+                self.node_bits[parent] &= ~(1 << (parent_position - parent * page_count))
+            elif counts[node] == 1:
+                remaining = slots[node * page_count + self.node_bits[node].bit_length() - 1]
+                if remaining > 0:
+                    break
+                slots[parent_position] = remaining
+            else:
+                break
+            self.free_node(node)
+
+    def get_error_count(self):
+        """
+        Returns the number of errors encountered while storing transactions.
+        """
+        return self.error_count
+
+    def __len__(self):
+        return self.node_counts[FlatProcessingBook.ROOT]
+
+    def __iter__(self):
+        """
+        :complexity: Best and Worst case is O(1), as it simply returns the Iterator Class.
+        """
+        return FlatProcessingBookIterator(self)
+
+
+class FlatProcessingBookIterator:
+    """
+    Yields the (transaction, amount) pairs of a FlatProcessingBook in signature order.
+    The path from the root is kept on two array stacks, so there is no recursion however deep the book is.
+    """
+
+    def __init__(self, book):
+        """
+        :complexity: Best and Worst case is O(1).
+        """
+        self.book = book
+        self.nodes = array('i', (FlatProcessingBook.ROOT,))
+        self.pages = array('i', (0,))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        :complexity: Best case is O(1), when the next page of the current node holds a leaf. Worst case is
+        O(n x P), where n is the length of the signatures and P the number of pages per node, when every node
+        on the way to the next leaf has to be scanned to its end.
+        """
+        slots = self.book.slots
+        nodes = self.nodes
+        pages = self.pages
+        page_count = FlatProcessingBook.PAGE_COUNT
+
+        while len(nodes) > 0:
+            page = pages[-1]
+            if page == page_count:
+                nodes.pop()
+                pages.pop()
+                continue
+
+            pages[-1] = page + 1
+            entry = slots[nodes[-1] * page_count + page]
+            if entry > 0:
+                nodes.append(entry)
+                pages.append(0)
+            elif entry < 0:
+                return (self.book.leaf_transactions[~entry], self.book.leaf_amounts[~entry])
+
+        raise StopIteration
+
+
+if __name__ == "__main__":
+    from processing_line import Transaction
+
+    book = FlatProcessingBook()
+    for signature, amount in (("abc123", 10), ("0bbzzz", 20), ("abcxyz", 30)):
+        transaction = Transaction(0, "sender", "receiver")
+        transaction.signature = signature
+        book[transaction] = amount
+
+    for transaction, amount in book:
+        print(transaction.signature, amount)
@@ -2,14 +2,20 @@ from processing_line import Transaction
 from data_structures import ArrayR
 from data_structures import HashTableSeparateChaining
 from algorithms import insertion_sort
+from canonical_forms import CanonicalForms
 
 
 class FraudDetection:
     def __init__(self, transactions):
         self.transactions = transactions
 
-    def detect_by_blocks(self):
+    def detect_by_blocks(self, process_count=1):
         """
+        The block size with the largest suspicion score and its score, the smallest such block size on ties.
+        With process_count above 1, block sizes are scored in parallel by that many worker processes when the
+        signatures can be batched (see canonical_forms), and the scores are reduced in block size order, so the
+        answer is the same as with one process.
+        :raises ValueError: if process_count is below 1.
         :complexity: Best case is O(N X L^2), where N is the number of transactions and L is the length of the signature, Best case
         happens when the block sizes are large, for example, S = 18, where S is the block size, therefore, 
         this would result in having to sort fewer blocks per signature, resulting in the sorting cost being O(1), 
@@ -20,24 +26,46 @@ class FraudDetection:
         when the block size is 1, This is because the signature would have to be broken into L number of blocks, and the sorting
         cost would be in its worst case which is O(L^2), making the signature processing O(L^2) per transaction. Since we try L different
         block sizes for N transactions, with the worst case requiring O(N x L^2) work, the total is O(L X N X L^2) = O(N X L^3).
+
+        That is the cost when the signatures have different lengths. When they all have the same length, the canonical forms
+        of all N transactions are worked out together by CanonicalForms as int keys, and each block size costs O(N X L) for
+        small blocks (no sorting at all) and O(N X k log k) otherwise, where k = L // S is the number of blocks.
         """
+        if process_count < 1:
+            raise ValueError("process_count must be at least 1")
         if len(self.transactions) == 0:
             return (1, 1)
         
         sig_length = len(self.transactions[0].signature)
+        forms = self.canonical_forms()
+        if forms is not None:
+            block_sizes = forms.distinct_block_sizes()
+            scores = forms.suspicions(block_sizes, process_count)
+        else:
+            block_sizes = range(1, sig_length + 1)
+            scores = (self.calculate_suspicion(block_size) for block_size in block_sizes)
         
         max_suspicion = 1
         best_block_size = 1
         
-        for block_size in range(1, sig_length + 1):
-            suspicion_score = self.calculate_suspicion(block_size)
-            
+        for block_size, suspicion_score in zip(block_sizes, scores):
             if suspicion_score > max_suspicion:
                 max_suspicion = suspicion_score
                 best_block_size = block_size
         
         return (best_block_size, max_suspicion)
 
+    def canonical_forms(self):
+        """
+        The CanonicalForms of every transaction's signature, or None when the signatures cannot be batched
+        (different lengths or characters beyond latin-1), in which case each is transformed on its own.
+        :complexity: O(N x L), where N is the number of transactions and L is the length of the signature.
+        """
+        try:
+            return CanonicalForms(tuple(self.transactions[i].signature for i in range(len(self.transactions))))
+        except ValueError:
+            return None
+
     def calculate_suspicion(self, block_size):
         """
         Calculate suspicion score for a given block size using hash table for grouping.
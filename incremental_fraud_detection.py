@@ -0,0 +1,132 @@
+from canonical_forms import canonical_key
+from data_structures import ArrayR, LinearProbeTable
+from processing_line import SIGNATURE_LENGTH, SignatureKeyTable
+
+
+class FormCountTable(LinearProbeTable):
+    """
+    LinearProbeTable from canonical form key to the number of transactions with that canonical form.
+    Uses the built-in int hash, and SignatureKeyTable's longer list of table sizes.
+    """
+
+    def __init__(self):
+        LinearProbeTable.__init__(self, SignatureKeyTable.TABLE_SIZES)
+
+    def hash(self, key):
+        """
+        :complexity: O(1) for keys of a fixed signature length.
+        """
+        return hash(key) % self.table_size
+
+
+class IncrementalFraudDetection:
+    """
+    FraudDetection.detect_by_blocks for a stream of transactions, which are added and removed one at a time.
+
+    For every block size there is a FormCountTable with the size of every group of transactions sharing a
+    canonical form, and the suspicion score of the block size, the product of those sizes, kept up to date:
+    a group growing from c to c + 1 transactions multiplies it by (c + 1) / c, which is exact as c divides it.
+    Block sizes past L // 2 + 1 leave one block per signature and group the transactions as L // 2 + 1 does,
+    so they share its table and score.
+
+        detection = IncrementalFraudDetection()
+        detection.add(transaction)
+        block_size, suspicion = detection.detect_by_blocks()
+
+    All signatures must have signature_length characters (of latin-1).
+    """
+
+    def __init__(self, signature_length=SIGNATURE_LENGTH):
+        """
+        :raises ValueError: if signature_length is below 1.
+        :complexity: O(L) where L is signature_length.
+        """
+        if signature_length < 1:
+            raise ValueError("signature_length must be at least 1")
+        self.signature_length = signature_length
+        self.block_size_count = min(signature_length, signature_length // 2 + 1)
+        self.form_counts = ArrayR(self.block_size_count)
+        self.suspicions = ArrayR(self.block_size_count)
+        for i in range(self.block_size_count):
+            self.form_counts[i] = FormCountTable()
+            self.suspicions[i] = 1
+        self.transaction_count = 0
+
+    def form_keys(self, transaction):
+        """
+        The canonical form keys of transaction's signature, for every block size from 1 to block_size_count.
+        :raises ValueError: if the signature does not have signature_length characters.
+        :complexity: O(L^2 log L / S) summed over the block sizes S, where L is signature_length.
+        """
+        if len(transaction.signature) != self.signature_length:
+            raise ValueError(f"Signature must have {self.signature_length} characters")
+        row = transaction.signature.encode("latin-1")
+        return tuple(canonical_key(row, block_size) for block_size in range(1, self.block_size_count + 1))
+
+    def add(self, transaction):
+        """
+        Counts transaction in the group of its canonical form for every block size.
+        :raises ValueError: if the signature does not have signature_length characters.
+        :complexity: O(L^2 log L) for the keys (see form_keys) plus one table update per block size, where L is
+        signature_length.
+        """
+        keys = self.form_keys(transaction)
+        for i in range(self.block_size_count):
+            form_counts = self.form_counts[i]
+            try:
+                count = form_counts[keys[i]]
+            except KeyError:
+                count = 0
+            form_counts[keys[i]] = count + 1
+            if count > 0:
+                self.suspicions[i] = self.suspicions[i] // count * (count + 1)
+        self.transaction_count += 1
+
+    def remove(self, transaction):
+        """
+        Takes one transaction with transaction's signature out of its groups. Groups are counted by canonical
+        form only, so any transaction with the same signature may be given.
+        :raises KeyError: if no transaction with this signature's canonical forms was added.
+        :raises ValueError: if the signature does not have signature_length characters.
+        :complexity: As add.
+        """
+        keys = self.form_keys(transaction)
+        for i in range(self.block_size_count):
+            # Raises before anything has changed if the transaction was never added.
+            self.form_counts[i][keys[i]]
+        for i in range(self.block_size_count):
+            form_counts = self.form_counts[i]
+            count = form_counts[keys[i]]
+            if count == 1:
+                del form_counts[keys[i]]
+            else:
+                form_counts[keys[i]] = count - 1
+                self.suspicions[i] = self.suspicions[i] // count * (count - 1)
+        self.transaction_count -= 1
+
+    def __len__(self):
+        return self.transaction_count
+
+    def suspicion(self, block_size):
+        """
+        The current suspicion score of block_size, as FraudDetection.calculate_suspicion.
+        :raises ValueError: if block_size is not between 1 and signature_length.
+        :complexity: O(1)
+        """
+        if not 1 <= block_size <= self.signature_length:
+            raise ValueError(f"Block size must be between 1 and {self.signature_length}")
+        return self.suspicions[min(block_size, self.block_size_count) - 1]
+
+    def detect_by_blocks(self):
+        """
+        The block size with the largest suspicion score and its score, the smallest such block size on ties,
+        as FraudDetection.detect_by_blocks on the transactions added and not removed.
+        :complexity: O(L) where L is signature_length.
+        """
+        max_suspicion = 1
+        best_block_size = 1
+        for i in range(self.block_size_count):
+            if self.suspicions[i] > max_suspicion:
+                max_suspicion = self.suspicions[i]
+                best_block_size = i + 1
+        return (best_block_size, max_suspicion)
@@ -1,153 +1,764 @@
-from data_structures import ArrayR
-from processing_line import Transaction
+import ctypes
+import random
+import sys
+from array import array
+
+from data_structures import ArrayDeque, ArrayMinHeap, ArrayR, LinearProbeTable
+from processing_line import SignatureKeyTable, Transaction
+
+
+def _page_index_table(characters):
+    """
+    256 bytes holding the page index of every character code below 256, ILLEGAL_PAGE for codes that are
+    not legal characters.
+    """
+    table = bytearray(b"\xff" * 256)
+    for index in range(len(characters)):
+        table[ord(characters[index])] = index
+    return bytes(table)
+
+
+class BookStats:
+    """
+    Counters describing the shape of a ProcessingBook, shared by every book nested in it and kept up to date by
+    every operation that changes the shape, so reading them never walks the book.
+
+        node_count: books in the whole book, the top one included
+        occupied_pages: pages holding a transaction or a nested book, over every book
+        single_child_count: nested books with a single occupied page, the links of single-child chains
+        collision_count: times a page holding a transaction had to be replaced by a nested book
+        level_counts: level_counts[level] is the number of transactions stored on a book of that level
+        book_bytes: estimated bytes of one book, only set on the copies handed out by ProcessingBook.stats()
+    """
+
+    LEAF_BYTES = sys.getsizeof((None, None))
+
+    def __init__(self, root_level=0):
+        self.root_level = root_level
+        self.node_count = 0
+        self.occupied_pages = 0
+        self.single_child_count = 0
+        self.collision_count = 0
+        self.level_counts = array('q')
+        self.book_bytes = 0
+
+    def copy(self, book_bytes):
+        """
+        A copy of these counts that later changes to the book do not affect, with book_bytes set.
+        """
+        stats = BookStats(self.root_level)
+        stats.add(self)
+        stats.book_bytes = book_bytes
+        return stats
+
+    def count_leaf(self, level, change):
+        """
+        Adds change to the number of transactions stored on level.
+        :complexity: O(1) amortised over the growth of level_counts.
+        """
+        while len(self.level_counts) <= level:
+            self.level_counts.append(0)
+        self.level_counts[level] += change
+
+    def count_pages(self, book, change):
+        """
+        Counts change more occupied pages on book, which still has its old page_bits, and moves it in or out of
+        the single-child books if its number of pages goes to or from one.
+        """
+        if book.level > self.root_level:
+            occupied_pages = book.occupied_pages
+            if occupied_pages == 1:
+                self.single_child_count -= 1
+            if occupied_pages + change == 1:
+                self.single_child_count += 1
+        self.occupied_pages += change
+
+    def add_book(self):
+        self.node_count += 1
+
+    def remove_book(self, book):
+        """
+        Takes a book that is no longer part of the book out of the counts, with its occupied pages.
+        The transactions on those pages are not taken out, they are expected to have moved elsewhere.
+        """
+        self.count_pages(book, -book.occupied_pages)
+        self.node_count -= 1
+
+    def add(self, other):
+        """
+        Adds every count of other to this one, for books moved over from another book.
+        """
+        self.node_count += other.node_count
+        self.occupied_pages += other.occupied_pages
+        self.single_child_count += other.single_child_count
+        self.collision_count += other.collision_count
+        for level in range(len(other.level_counts)):
+            self.count_leaf(level, other.level_counts[level])
+
+    @property
+    def leaf_count(self):
+        return sum(self.level_counts)
+
+    @property
+    def average_fan_out(self):
+        """
+        Average number of occupied pages per book.
+        """
+        return self.occupied_pages / self.node_count if self.node_count > 0 else 0.0
+
+    @property
+    def depth_histogram(self):
+        """
+        Copy of level_counts without the empty deepest levels: entry d is the number of transactions d levels
+        below the top book.
+        """
+        end = len(self.level_counts)
+        while end > self.root_level and self.level_counts[end - 1] == 0:
+            end -= 1
+        return self.level_counts[self.root_level:end]
+
+    @property
+    def bytes_used(self):
+        """
+        Estimated bytes of the books and of the (transaction, amount) tuples on their pages. The transactions and
+        amounts themselves belong to the caller and are not counted.
+        """
+        return self.node_count * self.book_bytes + self.leaf_count * BookStats.LEAF_BYTES
 
 
 class ProcessingBook:
 
     LEGAL_CHARACTERS = "abcdefghijklmnopqrstuvwxyz0123456789"
+    PAGE_INDEXES = _page_index_table(LEGAL_CHARACTERS)
+    ILLEGAL_PAGE = 255
 
-    def __init__(self, level=0):
+    def __init__(self, level=0, book_stats=None):
+        """
+        :param book_stats: the BookStats of the book this one is nested in, None for a new top-level book.
+        """
         self.pages = ArrayR(len(ProcessingBook.LEGAL_CHARACTERS))
         self.level = level  
         self.error_count = 0
         self.transaction_count = 0
+        # Bit p is set when page p is not None
+        self.page_bits = 0
+        self.book_stats = BookStats(level) if book_stats is None else book_stats
+        self.book_stats.add_book()
+
+    @property
+    def occupied_pages(self):
+        return self.page_bits.bit_count()
+
+    def only_page(self):
+        """
+        The index of the highest occupied page, the only one when occupied_pages is 1.
+        :complexity: O(1), a single bit operation.
+        """
+        return self.page_bits.bit_length() - 1
+
+    def set_page(self, page, value):
+        """
+        Puts value (None, a (transaction, amount) pair or a nested book) on page, keeping page_bits and the
+        stats up to date.
+        :complexity: O(1)
+        """
+        self.pages[page] = value
+        bit = 1 << page
+        if value is None:
+            if self.page_bits & bit:
+                self.book_stats.count_pages(self, -1)
+                self.page_bits ^= bit
+        elif not self.page_bits & bit:
+            self.book_stats.count_pages(self, 1)
+            self.page_bits |= bit
     
     def page_index(self, character):
         """
         You may find this method helpful. It takes a character and returns the index of the relevant page.
-        Time complexity of this method is O(1), because it always only checks 36 characters.
+        Time complexity of this method is O(1), it is a single lookup in PAGE_INDEXES.
+        :raises ValueError: if the character is not one of LEGAL_CHARACTERS.
         """
-        return ProcessingBook.LEGAL_CHARACTERS.index(character)
-    
+        code = ord(character)
+        if code < len(ProcessingBook.PAGE_INDEXES):
+            index = ProcessingBook.PAGE_INDEXES[code]
+            if index != ProcessingBook.ILLEGAL_PAGE:
+                return index
+        raise ValueError(f"{character!r} is not a legal signature character")
+
+    @staticmethod
+    def page_codes(signature):
+        """
+        The character codes of a signature, so that the page at every level is PAGE_INDEXES[codes[level]].
+        :raises ValueError: if the signature has characters that cannot be legal.
+        :complexity: O(n) where n is len(signature), done once per operation in C.
+        """
+        return signature.encode("latin-1")
+
+    @staticmethod
+    def page_key(signature):
+        """
+        Sort key that orders signatures the way the book stores them, by page index rather than by character code.
+        :complexity: O(n) where n is len(signature), done in C.
+        """
+        return ProcessingBook.page_codes(signature).translate(ProcessingBook.PAGE_INDEXES)
+
+    @staticmethod
+    def checked_page(index, character_code):
+        if index == ProcessingBook.ILLEGAL_PAGE:
+            raise ValueError(f"{chr(character_code)!r} is not a legal signature character")
+        return index
+
     def __setitem__(self, transaction, amount):
         """
-        :complexity: Best case is O(1), where n is len(transaction_signature), Best case happens when the page is empty, thereby
-        no collisions will occur. In this case, there is no recursive call to create a new nested book. The length of the signature
-        is also a constant of 36, therefore it runs in O(1) time. The other operations also run in O(1) time.
+        Walks down to the page the transaction belongs to, then walks the same path a second time to update
+        the counts of every book on it, as the recursive version did on its way back up.
+
+        :complexity: Best case is O(n), where n is len(transaction_signature), Best case happens when the page is empty, thereby
+        no collisions will occur and no nested book is created. The signature is translated to page codes once,
+        which is O(n), but with the length fixed at 36 this is effectively constant.
 
-        Worst case is also O(n), where n is len(transaction_signature), Worst case happens when the page is not empty, and
-        the method has to created multiple nested books to handle collisions. In this case, there is multiple recursive calls
-        and the method has to run in O(n) time.
+        Worst case is also O(n), where n is len(transaction_signature), Worst case happens when the transaction shares a
+        long prefix with a stored one, and the method has to walk or create a chain of nested books for the shared
+        characters. The loops are iterative, so there is no recursion however deep the book gets.
 
+        The whole signature, and where it leaves the one it collides with, are checked before anything is changed,
+        so a signature that cannot be stored leaves the book as it was.
+        :raises ValueError: if the signature has characters that are not legal, or it is a prefix of a stored
+        signature or the other way round, as the two could not be told apart on any page.
         """
-        
-        char = transaction.signature[self.level]
-        page_idx = self.page_index(char)
-        
-        current_page = self.pages[page_idx]
-        
-        if current_page is None:
-            self.pages[page_idx] = (transaction, amount)
-            self.transaction_count += 1
-            
-        elif isinstance(current_page, tuple):
-            stored_transaction, stored_amount = current_page
-            
-            if stored_transaction.signature == transaction.signature:
-                if stored_amount == amount:
-                    return
-                else:
-                    self.error_count += 1
-                    return
+        signature = transaction.signature
+        codes = ProcessingBook.page_codes(signature)
+        page_indexes = ProcessingBook.PAGE_INDEXES
+        pages = codes.translate(page_indexes)
+        if ProcessingBook.ILLEGAL_PAGE in pages:
+            ProcessingBook.checked_page_key(signature)
+
+        book = self
+        while True:
+            if book.level == len(pages):
+                raise ValueError(f"{signature!r} cannot be stored, as it is a prefix of stored signatures")
+            page_idx = pages[book.level]
+            current_page = book.pages[page_idx]
+            if isinstance(current_page, ProcessingBook):
+                book = current_page
             else:
-                nested_book = ProcessingBook(level=self.level + 1)
-                
-                nested_book[stored_transaction] = stored_amount
-                
-                nested_book[transaction] = amount
-                
-                self.pages[page_idx] = nested_book
-
-                self.transaction_count += 1
-                
-        elif isinstance(current_page, ProcessingBook):
-            old_error_count = current_page.error_count
-            old_count = current_page.transaction_count
-
-            current_page[transaction] = amount
-            
-            self.error_count += current_page.error_count - old_error_count
-            self.transaction_count += current_page.transaction_count - old_count
+                break
+
+        book_stats = self.book_stats
+        if current_page is None:
+            self.update_counts(codes, book, 1, 0)
+            book.set_page(page_idx, (transaction, amount))
+            book_stats.count_leaf(book.level, 1)
+            return
+
+        stored_transaction, stored_amount = current_page
+        if stored_transaction.signature == signature:
+            if stored_amount != amount:
+                self.update_counts(codes, book, 0, 1)
+            return
+
+        # Collision: find where the two signatures differ, then nest one book per shared character down to it
+        stored_codes = ProcessingBook.page_codes(stored_transaction.signature)
+        branch_level = book.level + 1
+        shared_length = min(len(codes), len(stored_codes))
+        while branch_level < shared_length and stored_codes[branch_level] == codes[branch_level]:
+            branch_level += 1
+        if branch_level == shared_length:
+            raise ValueError(
+                f"{signature!r} cannot be stored with {stored_transaction.signature!r}, as one is a prefix of the other"
+            )
+
+        self.update_counts(codes, book, 1, 0)
+        book_stats.collision_count += 1
+        book_stats.count_leaf(book.level, -1)
+        level = book.level + 1
+        nested_book = ProcessingBook(level, book_stats)
+        book.pages[page_idx] = nested_book
+        while level < branch_level:
+            # A new book with a single page: its bit and its place in the stats are set directly
+            child_book = ProcessingBook(level + 1, book_stats)
+            chain_page = pages[level]
+            nested_book.pages[chain_page] = child_book
+            nested_book.page_bits = 1 << chain_page
+            nested_book.transaction_count = 2
+            book_stats.occupied_pages += 1
+            book_stats.single_child_count += 1
+            nested_book = child_book
+            level += 1
+
+        nested_book.set_page(page_indexes[stored_codes[level]], current_page)
+        nested_book.set_page(pages[level], (transaction, amount))
+        nested_book.transaction_count = 2
+        book_stats.count_leaf(level, 2)
+
+    def update_counts(self, codes, last_book, added, errors):
+        """
+        Adds added to the transaction count and errors to the error count of every book from this one down
+        to last_book, following the page codes of a signature.
+        :complexity: O(d) where d is the number of books on the path.
+        """
+        book = self
+        while True:
+            book.transaction_count += added
+            book.error_count += errors
+            if book is last_book:
+                return
+            book = book.pages[ProcessingBook.PAGE_INDEXES[codes[book.level]]]
 
     def __getitem__(self, transaction):
         """
-        :complexity: Best case is O(1), where n is the len(transaction.signature). Best case happens when the transaction is 
-        found at the top level, and therefore the function does not have to perform any recursive calls, 
-        all other operations in the method run in O(1) time.
+        :complexity: Best case is O(n), where n is the len(transaction.signature). Best case happens when the transaction is 
+        found at the top level, and therefore the loop only runs once; the signature is translated to page codes
+        once, which is O(n), and with the length fixed at 36 this is effectively constant.
 
         Worst case is O(n), where n is the len(transaction.signature), Worst case happens when the transaction is at the very end,
-        and therefore the function has to perform multiple recursive calls to retrieve the item, this runs in O(n) time. 
+        and therefore the loop has to walk down one nested book per character. 
         """
-        if self.level >= len(transaction.signature):
-            raise KeyError("Transaction not found")
-        
-        char = transaction.signature[self.level]
-        page_idx = self.page_index(char)
-        
-        current_page = self.pages[page_idx]
-        
-        if current_page is None:
-            raise KeyError("Transaction not found")
-            
-        elif isinstance(current_page, tuple):
-            stored_transaction, stored_amount = current_page
-            
-            if stored_transaction.signature == transaction.signature:
-                return stored_amount
-            else:
-                raise KeyError("Transaction not found")
-                
-        elif isinstance(current_page, ProcessingBook):
-            return current_page[transaction]
-        
+        signature = transaction.signature
+        codes = ProcessingBook.page_codes(signature)
+        page_indexes = ProcessingBook.PAGE_INDEXES
+        length = len(codes)
+
+        book = self
+        while book.level < length:
+            page_idx = page_indexes[codes[book.level]]
+            if page_idx == ProcessingBook.ILLEGAL_PAGE:
+                ProcessingBook.checked_page(page_idx, codes[book.level])
+            current_page = book.pages[page_idx]
+
+            if current_page is None:
+                break
+            elif isinstance(current_page, tuple):
+                stored_transaction, stored_amount = current_page
+                if stored_transaction.signature == signature:
+                    return stored_amount
+                break
+            book = current_page
+
         raise KeyError("Transaction not found")
     
     def __delitem__(self, transaction):
         """
-        :complexity: Best case is O(1), where n is len(transaction.signature), Best case happens when the transaction to be deleted
-        is at the very top level, and therefore the function does not have to perform any recursive calls, the rest of the operations
-        run in O(1) time.
+        Walks down to the transaction, noting the first nested book on the way that holds only two transactions.
+        Once the transaction is removed, that book and every book below it hold a single transaction, so they
+        all collapse at once: the remaining transaction is found by following the only occupied page of each
+        of them, which page_bits gives without a scan, and it takes that book's place.
+
+        :complexity: Best case is O(n), where n is len(transaction.signature), Best case happens when the transaction to be
+        deleted is at the very top level; the signature is translated to page codes once, which with the length
+        fixed at 36 is effectively constant.
 
-        Worst case is O(n), where n is len(transaction.signature), Worst case happens when the transaction to be deleted is deep in the nested books or
-        at the very end. Therefore, the function has to perform multiple recursive calls to retrieve and delete the item. This runs in
-        O(n) time.
+        Worst case is O(n), where n is len(transaction.signature), Worst case happens when the transaction to be deleted is
+        deep in the nested books, and the path is walked again to update the counts and to collapse. The loops
+        are iterative, so there is no recursion however deep the book gets.
         """
-        if self.level >= len(transaction.signature):
+        signature = transaction.signature
+        codes = ProcessingBook.page_codes(signature)
+        collapse_parent = None
+        collapse_page = 0
+
+        book = self
+        while True:
+            if book.level >= len(codes):
+                raise KeyError("Transaction not found")
+            page_idx = ProcessingBook.checked_page(ProcessingBook.PAGE_INDEXES[codes[book.level]], codes[book.level])
+            current_page = book.pages[page_idx]
+            if current_page is None:
+                raise KeyError("Transaction not found")
+            if isinstance(current_page, tuple):
+                break
+            if collapse_parent is None and current_page.transaction_count == 2:
+                collapse_parent = book
+                collapse_page = page_idx
+            book = current_page
+
+        if current_page[0].signature != signature:
             raise KeyError("Transaction not found")
-        
-        char = transaction.signature[self.level]
-        page_idx = self.page_index(char)
-        
-        current_page = self.pages[page_idx]
-        
+
+        book_stats = self.book_stats
+        self.update_counts(codes, book, -1, 0)
+        book.set_page(page_idx, None)
+        book_stats.count_leaf(book.level, -1)
+        if collapse_parent is None:
+            return
+
+        collapsing_book = collapse_parent.pages[collapse_page]
+        while True:
+            book_stats.remove_book(collapsing_book)
+            remaining = collapsing_book.pages[collapsing_book.only_page()]
+            if isinstance(remaining, tuple):
+                break
+            collapsing_book = remaining
+        collapse_parent.pages[collapse_page] = remaining
+        book_stats.count_leaf(collapsing_book.level, -1)
+        book_stats.count_leaf(collapse_parent.level, 1)
+
+    @staticmethod
+    def checked_page_key(signature):
+        """
+        page_key of a signature or prefix given by the caller.
+        :raises ValueError: if it has characters that are not legal.
+        """
+        page_key = ProcessingBook.page_key(signature)
+        if ProcessingBook.ILLEGAL_PAGE in page_key:
+            raise ValueError(f"{signature!r} has characters that are not legal signature characters")
+        return page_key
+
+    def prefix_page(self, prefix):
+        """
+        The page holding every transaction whose signature starts with prefix: a nested book, a stored pair
+        that may or may not start with prefix, or None when there are none.
+        :raises ValueError: if the prefix has characters that are not legal.
+        :complexity: O(p) where p is len(prefix), one book per character.
+        """
+        codes = ProcessingBook.checked_page_key(prefix)
+        book = self
+        while book.level < len(codes):
+            current_page = book.pages[codes[book.level]]
+            if current_page is None or isinstance(current_page, tuple):
+                return current_page
+            book = current_page
+        return book
+
+    def count_prefix(self, prefix):
+        """
+        Number of stored transactions whose signature starts with prefix, read off the transaction_count of the
+        book that holds them.
+        :raises ValueError: if the prefix has characters that are not legal.
+        :complexity: O(p) where p is len(prefix).
+        """
+        current_page = self.prefix_page(prefix)
         if current_page is None:
-            raise KeyError("Transaction not found")
-            
-        elif isinstance(current_page, tuple):
-            stored_transaction, stored_amount = current_page
-            
-            if stored_transaction.signature == transaction.signature:
-                self.pages[page_idx] = None
-                self.transaction_count -= 1
+            return 0
+        if isinstance(current_page, tuple):
+            return 1 if current_page[0].signature.startswith(prefix) else 0
+        return current_page.transaction_count
+
+    def iter_prefix(self, prefix):
+        """
+        Generator over the (transaction, amount) pairs whose signature starts with prefix, in signature order.
+        :raises ValueError: if the prefix has characters that are not legal.
+        :complexity: O(p) to find the first pair, where p is len(prefix), then as items() on the book holding them.
+        """
+        current_page = self.prefix_page(prefix)
+        if current_page is None:
+            return
+        if isinstance(current_page, tuple):
+            if current_page[0].signature.startswith(prefix):
+                yield current_page
+            return
+        yield from current_page.items()
+
+    def range(self, lo=None, hi=None):
+        """
+        Generator over the (transaction, amount) pairs with lo <= signature < hi, in signature order, where
+        signatures compare the way the book orders them (by page, so "z" comes before "0").
+        A bound of None leaves that side open. Only the books on the paths of lo and hi are looked at page by
+        page; books between them are iterated whole and books outside them are never entered.
+
+        :raises ValueError: if a bound has characters that are not legal.
+        :complexity: O(n x P + k), where n is the length of the signatures, P the number of pages and k the
+        number of books and pairs in the range.
+        """
+        lo_key = None if lo is None else ProcessingBook.checked_page_key(lo)
+        hi_key = None if hi is None else ProcessingBook.checked_page_key(hi)
+        if lo_key is not None and hi_key is not None and not lo_key < hi_key:
+            return
+        yield from self.range_pages(self, b"", lo_key, hi_key)
+
+    def range_pages(self, book, path, lo_key, hi_key):
+        """
+        Generator behind range. Every signature under book starts with the page key path. lo_key and hi_key
+        are the bounds that path is still on, None once every signature under book is past them.
+        """
+        first_page = 0
+        last_page = len(ProcessingBook.LEGAL_CHARACTERS) - 1
+        if lo_key is not None and book.level < len(lo_key):
+            first_page = lo_key[book.level]
+        if hi_key is not None and book.level < len(hi_key):
+            last_page = hi_key[book.level]
+
+        for page in range(first_page, last_page + 1):
+            current_page = book.pages[page]
+            if current_page is None:
+                continue
+
+            if isinstance(current_page, tuple):
+                page_key = ProcessingBook.page_key(current_page[0].signature)
+                if (lo_key is None or lo_key <= page_key) and (hi_key is None or page_key < hi_key):
+                    yield current_page
+                continue
+
+            child_path = self.child_path(path, page, current_page)
+            child_lo_key = ProcessingBook.bound_after(child_path, lo_key, True)
+            child_hi_key = ProcessingBook.bound_after(child_path, hi_key, False)
+            if child_lo_key is False or child_hi_key is False:
+                continue
+            if child_lo_key is None and child_hi_key is None:
+                yield from current_page.items()
             else:
-                raise KeyError("Transaction not found")
-                
-        elif isinstance(current_page, ProcessingBook):
-
-            old_count = current_page.transaction_count
-            current_page.__delitem__(transaction)
-
-            self.transaction_count -= (old_count - current_page.transaction_count)
-            
-            if current_page.transaction_count == 1:
-                for i in range(len(current_page.pages)):
-                    if current_page.pages[i] is not None:
-                        if isinstance(current_page.pages[i], tuple):
-                            self.pages[page_idx] = current_page.pages[i]
-                            break
-            elif current_page.transaction_count == 0:
-                self.pages[page_idx] = None
-    
+                yield from self.range_pages(current_page, child_path, child_lo_key, child_hi_key)
+
+    def child_path(self, path, page, nested_book):
+        """
+        Page key prefix shared by every signature in nested_book, which sits on the given page under path.
+        """
+        return path + bytes((page,))
+
+    @staticmethod
+    def bound_after(path, bound, is_lower):
+        """
+        What a range bound means for every signature starting with path: None if all of them are on the right
+        side of it, False if none of them are, and the bound itself if it still has to be checked below.
+        """
+        if bound is None:
+            return None
+        bound_prefix = bound[:len(path)]
+        if path == bound_prefix:
+            if len(path) < len(bound):
+                return bound
+            # Every signature starts with the bound, so it is at or after it
+            return None if is_lower else False
+        if (path > bound_prefix) == is_lower:
+            return None
+        return False
+
+    def bulk_load(self, pairs):
+        """
+        Stores every (transaction, amount) pair of pairs.
+        The pairs are heap sorted by signature, then the nested books are built in a single pass as the pairs
+        come off the heap: a transaction's level is the longest prefix it shares with its neighbours, so every
+        book is created once and filled left to right, without walking down from the top for each transaction.
+        Loading an empty book gives the same book, counts and errors as storing the pairs one at a time.
+        A book that is not empty gets the pairs built into a new book, which is then merged in.
+
+        :raises ValueError: if a signature has characters that are not legal.
+        :complexity: O(N log N + N x n) where N is the number of pairs and n the length of the signatures,
+        for the sort and for comparing neighbouring signatures.
+        """
+        heap = ArrayMinHeap.heapify(ProcessingBook.bulk_entries(pairs))
+        if heap.is_empty():
+            return
+
+        if self.transaction_count > 0:
+            book = ProcessingBook(self.level)
+            book.build_sorted(heap)
+            self.merge(book)
+        else:
+            self.build_sorted(heap)
+
+    @staticmethod
+    def bulk_entries(pairs):
+        """
+        Generator over the (page key, position, transaction, amount) heap entries of bulk_load.
+        The position keeps equal signatures in input order and stops transactions being compared.
+        """
+        position = 0
+        for transaction, amount in pairs:
+            yield (ProcessingBook.checked_page_key(transaction.signature), position, transaction, amount)
+            position += 1
+
+    def build_sorted(self, heap):
+        """
+        Fills this empty book from a heap of (page key, position, transaction, amount) entries.
+        Equal signatures keep the first amount and count an error for every different amount after it.
+        """
+        # book is the deepest open book, the books above it wait on parents
+        parents = ArrayDeque()
+        book = self
+        book_stats = self.book_stats
+        shared_with_previous = 0
+        entry = heap.get_min()
+        while entry is not None:
+            page_key, _, transaction, amount = entry
+            errors = 0
+            entry = heap.get_min() if len(heap) > 0 else None
+            while entry is not None and entry[0] == page_key:
+                if entry[3] != amount:
+                    errors += 1
+                entry = heap.get_min() if len(heap) > 0 else None
+
+            shared_with_next = 0
+            if entry is not None:
+                next_key = entry[0]
+                if len(next_key) == len(page_key):
+                    # Same as shared_prefix_length, inlined as it runs once per transaction
+                    difference = int.from_bytes(page_key, "big") ^ int.from_bytes(next_key, "big")
+                    shared_with_next = len(page_key) - (difference.bit_length() + 7) // 8
+                else:
+                    shared_with_next = ProcessingBook.shared_prefix_length(page_key, next_key)
+            level = max(shared_with_previous, shared_with_next, self.level)
+
+            # Books deeper than the shared prefix only hold transactions before this one
+            while book.level > shared_with_previous and book is not self:
+                book = ProcessingBook.close_built_book(book, parents)
+            if book.level < level:
+                # The same nested books storing the transactions one at a time would create on a collision
+                book_stats.collision_count += 1
+            while book.level < level:
+                nested_book = ProcessingBook(book.level + 1, book_stats)
+                book.set_page(page_key[book.level], nested_book)
+                parents.append(book)
+                book = nested_book
+
+            book.set_page(page_key[level], (transaction, amount))
+            book_stats.count_leaf(level, 1)
+            book.transaction_count += 1
+            book.error_count += errors
+            shared_with_previous = shared_with_next
+
+        while book is not self:
+            book = ProcessingBook.close_built_book(book, parents)
+
+    @staticmethod
+    def close_built_book(book, parents):
+        """
+        Closes the deepest book of a bulk load: adds its counts to its parent's and returns the parent.
+        """
+        parent = parents.pop()
+        parent.transaction_count += book.transaction_count
+        parent.error_count += book.error_count
+        return parent
+
+    @staticmethod
+    def shared_prefix_length(first, second):
+        """
+        Length of the common prefix of two page keys.
+        :complexity: O(n) where n is the length of the shorter of the two.
+        """
+        length = min(len(first), len(second))
+        if len(first) == len(second):
+            # The highest differing bit of the two keys read as big-endian numbers falls in the first differing byte
+            difference = int.from_bytes(first, "big") ^ int.from_bytes(second, "big")
+            return length - (difference.bit_length() + 7) // 8
+        for index in range(length):
+            if first[index] != second[index]:
+                return index
+        return length
+
+    def merge(self, other_book):
+        """
+        Moves every transaction of other_book into this book. Where both books hold the same signature this
+        book keeps its amount, and counts one error if other_book's amount is different. other_book's own
+        errors are added to this book's.
+        Pages that only other_book uses are moved over whole, and books on the same page are merged page by
+        page, so no transaction is looked up from the top. other_book is left empty.
+
+        :raises ValueError: if the books are not on the same level.
+        :complexity: O(B x P) where B is the number of books in other_book and P the number of pages, as they all
+        join this book's stats, plus O(n) for every transaction stored against a book on the other side.
+        """
+        if other_book.level != self.level:
+            raise ValueError("Only books on the same level can be merged")
+        if other_book is self:
+            return
+
+        # other_book's books join this book's stats before any of them is moved or merged
+        self.book_stats.add(other_book.book_stats)
+        other_book.share_stats(self.book_stats)
+        self.merge_pages(other_book)
+        other_book.clear()
+
+    def clear(self):
+        """
+        Empties this book, leaving it with stats of its own.
+        """
+        self.pages = ArrayR(len(ProcessingBook.LEGAL_CHARACTERS))
+        self.transaction_count = 0
+        self.error_count = 0
+        self.page_bits = 0
+        self.book_stats = BookStats(self.level)
+        self.book_stats.add_book()
+
+    def share_stats(self, book_stats):
+        """
+        Points this book and every book nested in it to book_stats.
+        :complexity: O(B x P), where B is the number of books and P the number of pages.
+        """
+        books = ArrayDeque()
+        books.append(self)
+        while len(books) > 0:
+            book = books.pop()
+            book.book_stats = book_stats
+            for page in range(len(book.pages)):
+                if isinstance(book.pages[page], ProcessingBook):
+                    books.append(book.pages[page])
+
+    def merge_pages(self, other_book):
+        """
+        Merges the pages of other_book into this book and returns the number of conflicting amounts found.
+        """
+        # other_book itself is dropped, and every transaction on its pages that is not moved over as it is will
+        # be stored again, so it is taken out of the stats first
+        book_stats = self.book_stats
+        book_stats.remove_book(other_book)
+        conflicts = 0
+        for page in range(len(ProcessingBook.LEGAL_CHARACTERS)):
+            theirs = other_book.pages[page]
+            if theirs is None:
+                continue
+            ours = self.pages[page]
+
+            if ours is None:
+                self.set_page(page, theirs)
+                self.transaction_count += 1 if isinstance(theirs, tuple) else theirs.transaction_count
+                continue
+
+            if isinstance(theirs, tuple):
+                book_stats.count_leaf(other_book.level, -1)
+            if isinstance(ours, tuple) and isinstance(theirs, tuple):
+                if ours[0].signature == theirs[0].signature:
+                    if ours[1] != theirs[1]:
+                        conflicts += 1
+                    continue
+                self[theirs[0]] = theirs[1]
+
+            elif isinstance(ours, tuple):
+                # Ours has to win a conflict, so it goes in first and their book is merged into it
+                book_stats.count_leaf(self.level, -1)
+                book_stats.collision_count += 1
+                nested_book = ProcessingBook(self.level + 1, book_stats)
+                nested_book[ours[0]] = ours[1]
+                conflicts += nested_book.merge_pages(theirs)
+                self.pages[page] = nested_book
+                self.transaction_count += nested_book.transaction_count - 1
+
+            else:
+                old_count = ours.transaction_count
+                old_error_count = ours.error_count
+                if isinstance(theirs, tuple):
+                    ours[theirs[0]] = theirs[1]
+                    conflicts += ours.error_count - old_error_count
+                else:
+                    conflicts += ours.merge_pages(theirs)
+                self.transaction_count += ours.transaction_count - old_count
+
+        self.error_count += other_book.error_count + conflicts
+        return conflicts
+
+    def stats(self):
+        """
+        BookStats of the whole book this one belongs to: node count, leaf count, depth histogram, single-child
+        books, average fan-out, bytes used and collisions. The counts are kept up to date as the book changes,
+        so this copies them without walking the book.
+        :complexity: O(L) where L is the number of levels in use.
+        """
+        return self.book_stats.copy(type(self).book_bytes())
+
+    @classmethod
+    def book_bytes(cls):
+        """
+        Estimated bytes of one book of this class: the object, its attributes and its pages, measured once.
+        """
+        if "measured_book_bytes" not in cls.__dict__:
+            book = cls()
+            cls.measured_book_bytes = (
+                sys.getsizeof(book) + sys.getsizeof(book.__dict__) + sys.getsizeof(book.pages)
+                + sys.getsizeof(book.pages.__dict__) + sys.getsizeof(book.pages.array)
+                + ctypes.sizeof(book.pages.array)
+            )
+        return cls.measured_book_bytes
+
     def get_error_count(self):
         """
         Returns the number of errors encountered while storing transactions.
@@ -163,7 +774,62 @@ class ProcessingBook:
         """
         return ProcessingBookIterator(self)
 
+    def items(self):
+        """
+        Generator over the stored (transaction, amount) pairs in signature order.
+        Same walk as ProcessingBookIterator, but with all of its state in local variables, which makes it the
+        faster way to go through a whole book.
+        :complexity: O(B x P) over the whole iteration, where B is the number of books and P the number of pages.
+        """
+        page_count = len(ProcessingBook.LEGAL_CHARACTERS)
+        parent_books = ArrayDeque()
+        parent_pages = array('i')
+        book = self
+        page = 0
+
+        while True:
+            pages = book.pages
+            while page < page_count:
+                current_page = pages[page]
+                page += 1
+                if current_page is None:
+                    continue
+                if isinstance(current_page, tuple):
+                    yield current_page
+                else:
+                    parent_books.append(book)
+                    parent_pages.append(page)
+                    book = current_page
+                    page = 0
+                    pages = book.pages
+
+            if len(parent_books) == 0:
+                return
+            book = parent_books.pop()
+            page = parent_pages.pop()
+
+    def items_into(self, buffer, start=0):
+        """
+        Copies the stored (transaction, amount) pairs in signature order into buffer, from position start on,
+        and returns how many were copied.
+        :raises ValueError: if buffer does not have len(self) positions from start on.
+        :complexity: O(B x P), where B is the number of books and P the number of pages.
+        """
+        if start < 0 or len(buffer) - start < self.transaction_count:
+            raise ValueError(f"Buffer needs {self.transaction_count} positions from {start}")
+
+        position = start
+        for item in self.items():
+            buffer[position] = item
+            position += 1
+        return position - start
+
 class ProcessingBookIterator:
+    """
+    Iterates a ProcessingBook in signature order, returning the stored (transaction, amount) pairs.
+    The books above the current one are kept on an explicit stack, so a deep book needs no recursion and
+    no iterator object per nested book. ProcessingBook.items() is the generator version of the same walk.
+    """
 
     
     def __init__(self, processing_book):
@@ -171,8 +837,10 @@ class ProcessingBookIterator:
         :complexity: Best and Worst case is O(1), All operations in this method run in O(1) time as they are assignments.
         """
         self.processing_book = processing_book
+        self.book = processing_book
         self.current_page = 0
-        self.nested_iterator = None
+        self.parent_books = ArrayDeque()
+        self.parent_pages = array('i')
     
     def __iter__(self):
         """
@@ -182,48 +850,116 @@ class ProcessingBookIterator:
     
     def __next__(self):
         """
-        :complexity: Best case is O(1), this is the case when the page contains a direct transaction with no nested books, for example
-        "a...", "b...". Therefore, the method does not have to perform any recursive calls to access the nested books, The rest of the operations
-        in the method run in O(1) time.
-
-        Worst case is O(n), where n is len(self.processing_book.pages), Worst case happens when the prefix of the transactions are similar,
-        for example "aaaaaab","aaaaaaac", therefore the method has to perform multiple recursive calls to access the nested books, this runs
-        in O(n) time.
-        """
-        if self.nested_iterator is not None:
-            try:
-                return next(self.nested_iterator)
-            except StopIteration:
-                self.nested_iterator = None
-        
-        while self.current_page < len(self.processing_book.pages):
-            page = self.processing_book.pages[self.current_page]
-            
-            if page is not None:
-                if isinstance(page, tuple):
-                    transaction, amount = page
-                    self.current_page += 1
-                    return (transaction, amount)
-                    
-                elif isinstance(page, ProcessingBook):
-                    self.nested_iterator = iter(page)
-                    self.current_page += 1
-                    try:
-                        return next(self.nested_iterator)
-                    except StopIteration:
-                        self.nested_iterator = None
-                        continue
-            
-            self.current_page += 1
-        
-        raise StopIteration
+        :complexity: Best case is O(1), this is the case when the next page of the current book holds a transaction,
+        for example "a...", "b...". The stored pair is returned as it is, without building a new tuple.
+
+        Worst case is O(n x P), where n is the depth of the book and P is len(self.processing_book.pages), Worst case happens
+        when the rest of the current book and of every book above it is empty, or when the next transaction sits under a chain
+        of nested books, for example "aaaaaab", "aaaaaaac". The books are walked with a loop, never with recursive calls.
+        """
+        page_count = len(ProcessingBook.LEGAL_CHARACTERS)
+        book = self.book
+        page = self.current_page
+
+        while True:
+            pages = book.pages
+            while page < page_count:
+                current_page = pages[page]
+                page += 1
+                if current_page is None:
+                    continue
+                if isinstance(current_page, tuple):
+                    self.book = book
+                    self.current_page = page
+                    return current_page
+
+                self.parent_books.append(book)
+                self.parent_pages.append(page)
+                book = current_page
+                page = 0
+                pages = book.pages
+
+            if len(self.parent_books) == 0:
+                self.book = book
+                self.current_page = page
+                raise StopIteration
+            book = self.parent_books.pop()
+            page = self.parent_pages.pop()
     
-    def sample(self, required_size):
+    def sample(self, required_size, seed=None):
+        """
+        Returns an ArrayR of required_size (transaction, amount) pairs drawn uniformly at random, without
+        replacement, from the book, in no particular order. Passing a seed makes the sample reproducible.
+
+        Distinct ranks are drawn with Floyd's algorithm, and the pair of each rank is found by walking down
+        from the root, skipping whole pages by their transaction_count, so the book is never iterated.
+
+        :raises ValueError: if required_size is negative or larger than the number of stored transactions.
+        :complexity: Best and worst case is O(k x d x P), where k is required_size, d is the depth of the book and
+        P is the number of pages, as every draw walks one path and looks at up to P pages on each level.
+        Drawing the k distinct ranks is O(k), assuming the rank table has few collisions.
+        """
+        book = self.processing_book
+        size = len(book)
+        if required_size < 0 or required_size > size:
+            raise ValueError(f"Cannot sample {required_size} transactions from a book of {size}")
+
+        rng = random.Random(seed)
+        chosen = RankTable()
+        result = ArrayR(required_size)
+        position = 0
+        for upper in range(size - required_size, size):
+            rank = rng.randint(0, upper)
+            if rank in chosen:
+                rank = upper
+            chosen[rank] = True
+            result[position] = ProcessingBookIterator.select(book, rank)
+            position += 1
+        return result
+
+    @staticmethod
+    def select(book, rank):
+        """
+        The pair with the given rank in signature order, found by descending through the page counts.
+        :complexity: O(d x P), where d is the depth of the book and P the number of pages.
+        """
+        page_count = len(ProcessingBook.LEGAL_CHARACTERS)
+        while True:
+            pages = book.pages
+            for page in range(page_count):
+                current_page = pages[page]
+                if current_page is None:
+                    continue
+                if isinstance(current_page, tuple):
+                    if rank == 0:
+                        return current_page
+                    rank -= 1
+                elif rank < current_page.transaction_count:
+                    book = current_page
+                    break
+                else:
+                    rank -= current_page.transaction_count
+            else:
+                raise IndexError("Rank is outside the book")
+
+
+class RankTable(LinearProbeTable):
+    """
+    LinearProbeTable keyed on integer ranks, used by ProcessingBookIterator.sample to remember drawn ranks.
+    Uses SignatureKeyTable's longer list of table sizes, as the default one cannot hold more than about 786k
+    ranks, fewer than a large book can be asked to sample.
+    """
+
+    TABLE_SIZES = SignatureKeyTable.TABLE_SIZES
+
+    def __init__(self):
+        LinearProbeTable.__init__(self, RankTable.TABLE_SIZES)
+
+    def hash(self, key):
         """
-        1054 Only - 1008/2085 welcome to attempt if you're up for a challenge, but no marks are allocated.
-        Analyse your time complexity of this method.
+        :complexity: O(1)
         """
-        pass
+        return key % self.table_size
 
 if __name__ == "__main__":
     # Write tests for your code here...
@@ -1,23 +1,372 @@
+import asyncio
+import pickle
+import sys
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+from data_structures.array_deque import ArrayDeque
+from data_structures.array_min_heap import ArrayMinHeap
+from data_structures.hash_table_linear_probing import LinearProbeTable
+from data_structures.linked_queue import LinkedQueue
 from data_structures.linked_stack import LinkedStack
+from data_structures.referential_array import ArrayR
+
+
+LEGAL_CHARACTERS = "abcdefghijklmnopqrstuvwxyz0123456789"
+SIGNATURE_LENGTH = 36
+SIGNATURE_MODULUS = 36 ** SIGNATURE_LENGTH
+
+# Lookup tables for the batch signing path. They are built on first use by _build_signing_tables().
+# _CHARACTER_VALUES maps an ASCII code to the value Transaction.sign gives that character,
+# _PAIR_VALUES maps two such characters read as one native-endian 16-bit word to value(first) * 31 + value(second),
+# and _BASE36_TRIPLES maps every integer below 36 ** 3 to its three-character base 36 spelling.
+_CHARACTER_VALUES = None
+_PAIR_VALUES = None
+_BASE36_TRIPLES = None
+
+
+def _character_value(code):
+    """
+    Value of a single character in the signature polynomial, identical to the branches in Transaction.sign.
+    """
+    if ord('a') <= code <= ord('z'):
+        return code - ord('a')
+    elif ord('0') <= code <= ord('9'):
+        return code - ord('0') + 26
+    return code % 36
+
+
+def _build_signing_tables():
+    """
+    Builds the lookup tables used by _fast_signature.
+    _PAIR_VALUES is assigned last as it is the one _fast_signature checks, so a thread that sees it set also sees
+    the other tables. Two threads building the tables at once just build identical tables.
+    :complexity: O(1), the tables always hold 128, 128 * 256 and 36 ** 3 entries.
+    """
+    global _CHARACTER_VALUES, _PAIR_VALUES, _BASE36_TRIPLES
+
+    values = bytearray(128)
+    for code in range(128):
+        values[code] = _character_value(code)
+
+    if sys.byteorder == "little":
+        pair_values = tuple(
+            values[word & 0x7F] * 31 + values[(word >> 8) & 0x7F] for word in range(1 << 15)
+        )
+    else:
+        pair_values = tuple(
+            values[(word >> 8) & 0x7F] * 31 + values[word & 0x7F] for word in range(1 << 15)
+        )
+
+    _CHARACTER_VALUES = bytes(values)
+    _BASE36_TRIPLES = tuple(
+        LEGAL_CHARACTERS[triple // 1296] + LEGAL_CHARACTERS[(triple // 36) % 36] + LEGAL_CHARACTERS[triple % 36]
+        for triple in range(36 ** 3)
+    )
+    _PAIR_VALUES = pair_values
+
+
+def _fast_signature(transaction_data):
+    """
+    Computes the same signature as Transaction.sign for an ASCII string of transaction data.
+    Characters are consumed two at a time through _PAIR_VALUES and the base 36 digits are produced
+    three at a time through _BASE36_TRIPLES, so both loops do a fraction of the Python-level work of the
+    scalar path.
+
+    :complexity: O(n), where n = len(transaction_data). The polynomial takes n / 2 iterations and the
+    base 36 conversion a fixed number of divisions.
+    :pre: transaction_data.isascii()
+    """
+    if _PAIR_VALUES is None:
+        _build_signing_tables()
+
+    raw = transaction_data.encode("ascii")
+    if len(raw) % 2 == 1:
+        hash_value = _CHARACTER_VALUES[raw[0]]
+        raw = raw[1:]
+    else:
+        hash_value = 0
+
+    pair_values = _PAIR_VALUES
+    for word in memoryview(raw).cast("H"):
+        hash_value = hash_value * 961 + pair_values[word]
+    hash_value %= SIGNATURE_MODULUS
+
+    # Split into four numbers of nine base 36 digits, then each of those into three triples.
+    high, low = divmod(hash_value, 36 ** 18)
+    first, second = divmod(high, 36 ** 9)
+    third, fourth = divmod(low, 36 ** 9)
+
+    triples = _BASE36_TRIPLES
+    first, first_low = divmod(first, 46656)
+    first_high, first_mid = divmod(first, 46656)
+    second, second_low = divmod(second, 46656)
+    second_high, second_mid = divmod(second, 46656)
+    third, third_low = divmod(third, 46656)
+    third_high, third_mid = divmod(third, 46656)
+    fourth, fourth_low = divmod(fourth, 46656)
+    fourth_high, fourth_mid = divmod(fourth, 46656)
+
+    return "".join((
+        triples[first_high], triples[first_mid], triples[first_low],
+        triples[second_high], triples[second_mid], triples[second_low],
+        triples[third_high], triples[third_mid], triples[third_low],
+        triples[fourth_high], triples[fourth_mid], triples[fourth_low],
+    ))
+
+
+def sign_many(transactions):
+    """
+    Signs every transaction in an array of transactions in one call.
+    The signatures are identical to the ones Transaction.sign produces, and like Transaction.sign this skips
+    transactions that are already signed and goes through Transaction.signature_cache when one is set.
+    Transactions whose data is not plain ASCII fall back to Transaction.sign.
+
+    :complexity: Best and worst case is O(N x n), where N = len(transactions) and n is the length of the
+    longest transaction data string. Every transaction has to be signed, and signing one is O(n) like the
+    scalar path, only with a smaller constant.
+    """
+    cache = Transaction.signature_cache
+    for i in range(len(transactions)):
+        transaction = transactions[i]
+        key = transaction.signature_key()
+        if transaction.is_signed_for(key):
+            continue
+
+        signature = None if cache is None else cache.get(key)
+        if signature is None:
+            transaction_data = str(transaction.timestamp) + transaction.from_user + transaction.to_user
+            if not transaction_data.isascii():
+                transaction.sign()
+                continue
+            signature = _fast_signature(transaction_data)
+            if cache is not None:
+                cache.put(key, signature)
+
+        transaction.record_signature(key, signature)
+
+
+class SignatureKeyTable(LinearProbeTable):
+    """
+    LinearProbeTable keyed on (timestamp, from_user, to_user) tuples instead of strings.
+    The default LinearProbeTable sizes stop at 1572869, so past about 786k keys it could not grow any further;
+    this longer list lets it hold up to MAX_LENGTH keys.
+    """
+
+    TABLE_SIZES = (
+        5, 13, 29, 53, 97, 193, 389, 769, 1543, 3079, 6151, 12289, 24593, 49157, 98317, 196613, 393241,
+        786433, 1572869, 3145739, 6291469, 12582917, 25165843, 50331653, 100663319,
+    )
+    # The table grows once it is more than half full, and cannot grow past the last size
+    MAX_LENGTH = TABLE_SIZES[-1] // 2
+
+    def __init__(self):
+        LinearProbeTable.__init__(self, SignatureKeyTable.TABLE_SIZES)
+
+    def hash(self, key):
+        """
+        :complexity: O(K) where K is the total length of the key's fields.
+        """
+        return hash(key) % self.table_size
+
+
+class SignatureCacheEntry:
+    """
+    Node of the recency list kept by SignatureCache. Linked both ways so an entry can be moved to the
+    front of the list, or unlinked from the back, in O(1).
+    """
+    __slots__ = ("key", "signature", "newer", "older")
+
+    def __init__(self, key, signature):
+        self.key = key
+        self.signature = signature
+        self.newer = None
+        self.older = None
+
+
+class SignatureCache:
+    """
+    Bounded least-recently-used cache of signatures, keyed on (timestamp, from_user, to_user).
+    Set Transaction.signature_cache to an instance to share it between every Transaction.sign and sign_many call.
+    Counts hits, misses and evictions. get and put hold a lock, so one cache can be shared by signing threads.
+    """
+
+    DEFAULT_CAPACITY = 65536
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """
+        :raises ValueError: if capacity is not positive, or more than SignatureKeyTable.MAX_LENGTH.
+        :complexity: Best and worst case is O(1).
+        """
+        if capacity < 1:
+            raise ValueError("Cache capacity must be positive")
+        if capacity > SignatureKeyTable.MAX_LENGTH:
+            raise ValueError(f"Cache capacity cannot be more than {SignatureKeyTable.MAX_LENGTH}")
+
+        self.capacity = capacity
+        self.entries = SignatureKeyTable()
+        self.newest = None
+        self.oldest = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached signature for key and marks it as most recently used, or None if it is not cached.
+        :complexity: Best and worst case is O(K) where K is the length of the key, assuming the table has few collisions.
+        """
+        with self.lock:
+            return self.get_unlocked(key)
+
+    def get_unlocked(self, key):
+        try:
+            entry = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if entry is not self.newest:
+            self.unlink(entry)
+            self.link_newest(entry)
+        return entry.signature
+
+    def put(self, key, signature):
+        """
+        Caches the signature for key, evicting the least recently used entry if the cache is full.
+        :complexity: Best and worst case is O(K) where K is the length of the key, assuming the table has few collisions.
+        """
+        with self.lock:
+            self.put_unlocked(key, signature)
+
+    def put_unlocked(self, key, signature):
+        try:
+            entry = self.entries[key]
+        except KeyError:
+            if len(self.entries) >= self.capacity:
+                oldest = self.oldest
+                self.unlink(oldest)
+                del self.entries[oldest.key]
+                self.evictions += 1
+
+            entry = SignatureCacheEntry(key, signature)
+            self.entries[key] = entry
+            self.link_newest(entry)
+            return
+
+        entry.signature = signature
+        if entry is not self.newest:
+            self.unlink(entry)
+            self.link_newest(entry)
+
+    def link_newest(self, entry):
+        entry.older = self.newest
+        entry.newer = None
+        if self.newest is not None:
+            self.newest.newer = entry
+        self.newest = entry
+        if self.oldest is None:
+            self.oldest = entry
+
+    def unlink(self, entry):
+        if entry.newer is not None:
+            entry.newer.older = entry.older
+        else:
+            self.newest = entry.older
+        if entry.older is not None:
+            entry.older.newer = entry.newer
+        else:
+            self.oldest = entry.newer
+        entry.newer = None
+        entry.older = None
+
+    def hit_rate(self):
+        """
+        Fraction of lookups that were hits, 0.0 before the first lookup.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def clear(self):
+        """
+        Drops every entry. The counters are kept.
+        """
+        with self.lock:
+            self.entries = SignatureKeyTable()
+            self.newest = None
+            self.oldest = None
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
 
 class Transaction:
+
+    # Fixed attributes instead of a per-instance __dict__, which matters with millions of transactions.
+    __slots__ = ("timestamp", "from_user", "to_user", "signature", "signed_state")
+
+    # Shared SignatureCache consulted by sign and sign_many, None to disable caching.
+    signature_cache = None
+
     def __init__(self, timestamp, from_user, to_user):
         self.timestamp = timestamp
         self.from_user = from_user
         self.to_user = to_user
         self.signature = None
+        # (timestamp, from_user, to_user, signature) as of the last time this transaction was signed.
+        self.signed_state = None
+
+    def signature_key(self):
+        """
+        The fields the signature is computed from, used as the key of the signature cache.
+        """
+        return (self.timestamp, self.from_user, self.to_user)
+
+    def is_signed_for(self, key):
+        """
+        True if the current signature was computed by sign for exactly these fields and has not been
+        overwritten since.
+        """
+        return self.signature is not None and self.signed_state == key + (self.signature,)
+
+    def record_signature(self, key, signature):
+        """
+        Stores a signature computed for the fields in key.
+        """
+        self.signature = signature
+        self.signed_state = key + (signature,)
     
     def sign(self):
         """
-        :complexity: Best case is O(n), where n = len(str(timestamp)) + len(from_user) + len(to_user), The function has to
+        Signs the transaction. Does nothing if the transaction was already signed and none of its fields have
+        changed since, and reuses the signature from Transaction.signature_cache when one is set.
+
+        :complexity: Best case is O(1), when the transaction was already signed with the same fields, so the
+        signature is kept as it is.
+
+        Worst case is O(n), where n = len(str(timestamp)) + len(from_user) + len(to_user), The function has to
         concantenate the string and iterate through the string of n characters to assign an ascii_value which both run in O(n) time.
-        In addition, the for loop that generates the signature runs in O(1) time.Regardless of the len(transaction_data), 
-        there is no early-termination path since every character has to be processed.
-        
-        Worst case is also O(n), where n = len(str(timestamp)) + len(from_user) + len(to_user), this is the case as the 
-        per-character loop dominates the runtime, the other operations are constant and therefore run in O(1) time.
+        In addition, the for loop that generates the signature runs in O(1) time. The per-character loop dominates the runtime,
+        the other operations are constant and therefore run in O(1) time.
 
         """
+        key = self.signature_key()
+        if self.is_signed_for(key):
+            return
+
+        cache = Transaction.signature_cache
+        if cache is not None:
+            signature = cache.get(key)
+            if signature is not None:
+                self.record_signature(key, signature)
+                return
 
         transaction_data = str(self.timestamp) + self.from_user + self.to_user
         
@@ -47,12 +396,24 @@ class Transaction:
             signature = LEGAL_CHARACTERS[temp % 36] + signature
             temp = temp // 36
         
-        self.signature = signature
+        if cache is not None:
+            cache.put(key, signature)
+        self.record_signature(key, signature)
 
 
 class ProcessingLine:
-    def __init__(self, critical_transaction):
+
+    LINKED_STORAGE = "linked"
+    BUFFER_STORAGE = "buffer"
+    DEFAULT_ASYNC_BATCH_SIZE = 1024
+
+    def __init__(self, critical_transaction, storage=LINKED_STORAGE):
         """
+        :param storage: LINKED_STORAGE keeps the transactions in two LinkedStacks. BUFFER_STORAGE keeps them in two
+        ArrayDeques, which store one reference per transaction in a contiguous array and let the iterator read the
+        before-critical transactions front to back without reversing them first.
+        :raises ValueError: if storage is not one of the two modes.
+
         :complexity: Best case is O(1), where the input size is critical_transaction, This happens when there are
         minimal initializations to be made. This function creates two LinkedStacks instances which takes O(1) time,
         and the rest of the operations run in O(1) time.
@@ -64,11 +425,22 @@ class ProcessingLine:
         self.critical_transaction = critical_transaction
         self.critical_timestamp = critical_transaction.timestamp
 
-        self.before_stack = LinkedStack()
-        self.after_stack = LinkedStack()
+        self.storage = storage
+        if storage == ProcessingLine.LINKED_STORAGE:
+            self.before_stack = LinkedStack()
+            self.after_stack = LinkedStack()
+        elif storage == ProcessingLine.BUFFER_STORAGE:
+            self.before_buffer = ArrayDeque()
+            self.after_buffer = ArrayDeque()
+        else:
+            raise ValueError(f"Unknown storage mode {storage!r}")
 
         self.is_locked = False
         self.iterator_created = False
+        self.parallel_signing = False
+        self.timestamp_order = False
+        self.async_batch_size = ProcessingLine.DEFAULT_ASYNC_BATCH_SIZE
+        self.async_executor = None
 
 
     def add_transaction(self, transaction):
@@ -83,19 +455,156 @@ class ProcessingLine:
         if self.is_locked:
             raise RuntimeError("Cannot add transactions - line is locked for processing")
         
-        if transaction.timestamp <= self.critical_timestamp:
+        if self.storage == ProcessingLine.BUFFER_STORAGE:
+            if transaction.timestamp <= self.critical_timestamp:
+                self.before_buffer.append(transaction)
+            else:
+                self.after_buffer.append(transaction)
+        elif transaction.timestamp <= self.critical_timestamp:
             self.before_stack.push(transaction)
         else:
             self.after_stack.push(transaction)
     
-    def __iter__(self):
+    def add_transactions(self, transactions):
+        """
+        Adds every transaction in an iterable, with the same lock check and the same partition against the
+        critical timestamp as add_transaction. The lock is checked once for the whole batch, and in buffer
+        storage, when the number of transactions is known, they are first counted on each side of the critical
+        timestamp so that each buffer is grown once, by exactly the number of transactions it gets.
+        Returns the number of transactions added.
+
+        :raises RuntimeError: if the line is locked. Nothing is added in that case.
+        :complexity: Best and worst case is O(n), where n is the number of transactions, as each one is compared
+        with the critical timestamp and stored once.
+        """
+        if self.is_locked:
+            raise RuntimeError("Cannot add transactions - line is locked for processing")
+
+        critical_timestamp = self.critical_timestamp
+        if self.storage == ProcessingLine.BUFFER_STORAGE:
+            try:
+                incoming = len(transactions)
+            except TypeError:
+                incoming = 0
+            if incoming > 0:
+                incoming_before = sum(1 for transaction in transactions if transaction.timestamp <= critical_timestamp)
+                self.before_buffer.reserve(len(self.before_buffer) + incoming_before)
+                self.after_buffer.reserve(len(self.after_buffer) + incoming - incoming_before)
+            add_before = self.before_buffer.append
+            add_after = self.after_buffer.append
+        else:
+            add_before = self.before_stack.push
+            add_after = self.after_stack.push
+
+        count = 0
+        for transaction in transactions:
+            if transaction.timestamp <= critical_timestamp:
+                add_before(transaction)
+            else:
+                add_after(transaction)
+            count += 1
+        return count
+
+    def enable_parallel_signing(self, workers=None, prefetch_depth=4, chunk_size=4096):
+        """
+        Makes __iter__ sign transactions ahead of the consumer in a pool of worker processes.
+        The order transactions are returned in is unchanged.
+
+        :param workers: number of worker processes, defaults to the number of CPUs.
+        :param prefetch_depth: number of chunks that may be signed ahead of the consumer.
+        :param chunk_size: number of transactions sent to a worker at once.
+        :raises RuntimeError: if the line has already been iterated.
+        :raises ValueError: if prefetch_depth or chunk_size is not positive.
+        """
+        if self.iterator_created:
+            raise RuntimeError("Iterator already created - cannot change how the line is processed")
+        if prefetch_depth < 1 or chunk_size < 1:
+            raise ValueError("prefetch_depth and chunk_size must be positive")
+
+        self.parallel_workers = workers
+        self.parallel_prefetch_depth = prefetch_depth
+        self.parallel_chunk_size = chunk_size
+        self.parallel_signing = True
+
+    def enable_timestamp_order(self, run_size=None, spill_directory=None):
+        """
+        Makes __iter__ return the before-critical transactions and the after-critical transactions each in
+        ascending timestamp order, with the critical transaction in between. Transactions with equal timestamps
+        keep the order they were added in. Can be combined with parallel signing.
+
+        :param run_size: None to order each phase with an in-memory heap. Otherwise at most run_size transactions
+        are held at once: each phase is cut into sorted runs of run_size that are written to temporary files and
+        merged back as a stream. Transactions read back from disk are new, unsigned Transaction objects.
+        :param spill_directory: where the run files go, the system temporary directory when None.
+        :raises RuntimeError: if the line has already been iterated.
+        :raises ValueError: if run_size is not positive.
+        """
+        if self.iterator_created:
+            raise RuntimeError("Iterator already created - cannot change how the line is processed")
+        if run_size is not None and run_size < 1:
+            raise ValueError("run_size must be positive")
+
+        self.timestamp_run_size = run_size
+        self.timestamp_spill_directory = spill_directory
+        self.timestamp_order = True
+
+    def processing_order(self):
+        """
+        A new iterator whose next_unsigned takes the transactions off this line in processing order, honouring
+        enable_timestamp_order. Used by __iter__ and by iterators that sign in their own way.
+        """
+        if self.timestamp_order:
+            return TimestampOrderedProcessingLineIterator(
+                self, self.timestamp_run_size, self.timestamp_spill_directory
+            )
+        return ProcessingLineIterator(self)
+
+    def enable_async_signing(self, batch_size=DEFAULT_ASYNC_BATCH_SIZE, executor=None):
+        """
+        Configures the async iterator returned by __aiter__.
+
+        :param batch_size: number of transactions taken off the line and signed per executor call.
+        :param executor: thread pool to sign in, the event loop's default executor when None. It has to be a thread
+        pool, since the batch is taken off the line inside the executor call.
+        :raises RuntimeError: if the line has already been iterated.
+        :raises ValueError: if batch_size is not positive.
+        """
+        if self.iterator_created:
+            raise RuntimeError("Iterator already created - cannot change how the line is processed")
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+
+        self.async_batch_size = batch_size
+        self.async_executor = executor
+
+    def start_processing(self):
+        """
+        Locks the line for processing and returns processing_order(). Every way of draining the line goes through
+        here, so a line can only ever be processed once.
+        :raises RuntimeError: if the line has already been processed.
+        """
         if self.iterator_created:
             raise RuntimeError("Iterator already created - cannot process line multiple times")
         
         self.is_locked = True
         self.iterator_created = True
-        
-        return ProcessingLineIterator(self)
+        return self.processing_order()
+
+    def __iter__(self):
+        order = self.start_processing()
+        if self.parallel_signing:
+            return ParallelProcessingLineIterator(
+                self, self.parallel_workers, self.parallel_prefetch_depth, self.parallel_chunk_size, order
+            )
+        return order
+
+    def __aiter__(self):
+        """
+        Async counterpart of __iter__, with the same single-iteration and locking rules.
+        :raises RuntimeError: if the line has already been processed.
+        """
+        order = self.start_processing()
+        return AsyncProcessingLineIterator(self, order, self.async_batch_size, self.async_executor)
     
 class ProcessingLineIterator:
     
@@ -107,6 +616,26 @@ class ProcessingLineIterator:
         return self
     
     def __next__(self):
+        transaction = self.next_unsigned()
+        if transaction is None:
+            raise StopIteration
+
+        transaction.sign()
+        return transaction
+
+    def next_unsigned(self):
+        """
+        Returns the next transaction in processing order without signing it, or None once the line is exhausted.
+        Processing order is the before-critical transactions in the order they were added, then the critical
+        transaction, then the after-critical transactions, most recently added first.
+
+        :complexity: Best case is O(1), for every call in buffer storage and every call after the first one in linked
+        storage. Worst case is O(n), where n is the number of before-critical transactions, on the first call in linked
+        storage which reverses the before stack.
+        """
+        if self.processing_line.storage == ProcessingLine.BUFFER_STORAGE:
+            return self.next_unsigned_from_buffers()
+
         if self.phase == "before":
             if not hasattr(self, 'before_temp_stack'):
                 self.before_temp_stack = LinkedStack()
@@ -115,29 +644,416 @@ class ProcessingLineIterator:
                     self.before_temp_stack.push(self.processing_line.before_stack.pop())
             
             if not self.before_temp_stack.is_empty():
-                transaction = self.before_temp_stack.pop()
-                transaction.sign()  
-                return transaction
+                return self.before_temp_stack.pop()
             else:
                 self.phase = "critical"
-                return self.__next__()  
+                return self.next_unsigned()
         
         elif self.phase == "critical":
             self.phase = "after"
-            self.processing_line.critical_transaction.sign()  
             return self.processing_line.critical_transaction
         
         elif self.phase == "after":
             if not self.processing_line.after_stack.is_empty():
-                transaction = self.processing_line.after_stack.pop()
-                transaction.sign()  
-                return transaction
+                return self.processing_line.after_stack.pop()
             else:
                 self.phase = "done"
-                return self.__next__() 
+                return self.next_unsigned()
         
         else: 
-            raise StopIteration
+            return None
+
+    def next_unsigned_from_buffers(self):
+        """
+        next_unsigned for a line in buffer storage. The before buffer is served from the front and the after
+        buffer popped from the rear, which gives the same order as the linked stacks without any copying.
+        Each slot is cleared as it is read, so the line drops its references as it is consumed.
+
+        :complexity: Best and worst case is O(1).
+        """
+        if self.phase == "before":
+            if not self.processing_line.before_buffer.is_empty():
+                return self.processing_line.before_buffer.serve()
+            self.phase = "critical"
+
+        if self.phase == "critical":
+            self.phase = "after"
+            return self.processing_line.critical_transaction
+
+        if self.phase == "after":
+            if not self.processing_line.after_buffer.is_empty():
+                return self.processing_line.after_buffer.pop()
+            self.phase = "done"
+
+        return None
+
+
+class TimestampOrderedProcessingLineIterator(ProcessingLineIterator):
+    """
+    Iterator returned by ProcessingLine.__iter__ once timestamp order has been enabled.
+    Each phase is ordered on (timestamp, insertion sequence) with a min-heap, so ties keep the order the
+    transactions were added in and transactions can be returned as soon as the heap is built, in O(n) time,
+    instead of after a full sort. With a run_size, each phase is cut into sorted runs that are spilled to
+    temporary files and merged back through a heap holding one entry per run (an external merge sort).
+    """
+
+    def __init__(self, processing_line, run_size=None, spill_directory=None):
+        ProcessingLineIterator.__init__(self, processing_line)
+        self.run_size = run_size
+        self.spill_directory = spill_directory
+        # Heap being drained for the current phase, None before the phase starts.
+        self.merge_heap = None
+        # Open run files of the current phase, by run index, in external mode.
+        self.run_files = None
+
+    def next_unsigned(self):
+        """
+        :complexity: Best case is O(log n), where n is the number of transactions in the phase (or the number of
+        runs in external mode), to take the smallest entry off the heap. Worst case is O(n) on the first call of a
+        phase, which builds the heap (O(n log r) with runs of size r in external mode).
+        """
+        if self.phase == "before":
+            if self.merge_heap is None:
+                self.start_phase(self.drain_before())
+            transaction = self.next_from_heap()
+            if transaction is not None:
+                return transaction
+            self.phase = "critical"
+
+        if self.phase == "critical":
+            self.phase = "after"
+            self.merge_heap = None
+            return self.processing_line.critical_transaction
+
+        if self.phase == "after":
+            if self.merge_heap is None:
+                self.start_phase(self.drain_after())
+            transaction = self.next_from_heap()
+            if transaction is not None:
+                return transaction
+            self.phase = "done"
+
+        return None
+
+    def drain_before(self):
+        """
+        Generator taking the before-critical transactions off the line as (sequence, transaction) pairs, where
+        sequence increases in the order the transactions were added.
+        """
+        line = self.processing_line
+        if line.storage == ProcessingLine.BUFFER_STORAGE:
+            sequence = 0
+            while not line.before_buffer.is_empty():
+                yield (sequence, line.before_buffer.serve())
+                sequence += 1
+        else:
+            sequence = 0
+            while not line.before_stack.is_empty():
+                sequence -= 1
+                yield (sequence, line.before_stack.pop())
+
+    def drain_after(self):
+        """
+        Same as drain_before, for the after-critical transactions.
+        """
+        line = self.processing_line
+        if line.storage == ProcessingLine.BUFFER_STORAGE:
+            sequence = 0
+            while not line.after_buffer.is_empty():
+                yield (sequence, line.after_buffer.serve())
+                sequence += 1
+        else:
+            sequence = 0
+            while not line.after_stack.is_empty():
+                sequence -= 1
+                yield (sequence, line.after_stack.pop())
+
+    def start_phase(self, entries):
+        """
+        Builds the heap for one phase out of its (sequence, transaction) pairs.
+        In memory, the heap holds (timestamp, sequence, transaction) for every transaction. In external mode the
+        pairs are written out run_size at a time as sorted runs, and the heap holds the first record of each run.
+        """
+        if self.run_size is None:
+            self.merge_heap = ArrayMinHeap.heapify(
+                (transaction.timestamp, sequence, transaction) for sequence, transaction in entries
+            )
+            return
+
+        self.run_files = ArrayDeque()
+        run = ArrayMinHeap()
+        for sequence, transaction in entries:
+            run.add((transaction.timestamp, sequence, transaction.from_user, transaction.to_user))
+            if len(run) == self.run_size:
+                self.spill_run(run)
+        if not run.is_empty():
+            self.spill_run(run)
+
+        self.merge_heap = ArrayMinHeap()
+        for run_index in range(len(self.run_files)):
+            self.advance_run(run_index)
+
+    def spill_run(self, run):
+        """
+        Writes the records of a run heap to a new temporary file in ascending order, emptying the heap.
+        """
+        run_file = tempfile.TemporaryFile(dir=self.spill_directory)
+        while not run.is_empty():
+            pickle.dump(run.get_min(), run_file, pickle.HIGHEST_PROTOCOL)
+        run_file.seek(0)
+        self.run_files.append(run_file)
+
+    def advance_run(self, run_index):
+        """
+        Moves the next record of a run into the merge heap, closing (and so deleting) the run file at its end.
+        """
+        run_file = self.run_files[run_index]
+        try:
+            timestamp, sequence, from_user, to_user = pickle.load(run_file)
+        except EOFError:
+            run_file.close()
+            return
+        self.merge_heap.add((timestamp, sequence, run_index, from_user, to_user))
+
+    def next_from_heap(self):
+        """
+        The next transaction of the current phase, or None once the phase is exhausted.
+        """
+        if self.merge_heap.is_empty():
+            return None
+        if self.run_size is None:
+            return self.merge_heap.get_min()[2]
+
+        timestamp, _, run_index, from_user, to_user = self.merge_heap.get_min()
+        self.advance_run(run_index)
+        return Transaction(timestamp, from_user, to_user)
+
+
+def take_unsigned(order, limit):
+    """
+    Takes up to limit transactions from an iterator's next_unsigned and returns them in an ArrayR, which is
+    shorter than limit only when the line is exhausted.
+    :complexity: O(limit)
+    """
+    chunk = ArrayR(limit)
+    count = 0
+    while count < limit:
+        transaction = order.next_unsigned()
+        if transaction is None:
+            break
+        chunk[count] = transaction
+        count += 1
+
+    if count == limit:
+        return chunk
+
+    trimmed = ArrayR(count)
+    for i in range(count):
+        trimmed[i] = chunk[i]
+    return trimmed
+
+
+def _take_and_sign(order, limit):
+    """
+    Executor-side half of AsyncProcessingLineIterator: takes the next batch off the line and signs it.
+    """
+    batch = take_unsigned(order, limit)
+    sign_many(batch)
+    return batch
+
+
+class AsyncProcessingLineIterator:
+    """
+    Async iterator returned by ProcessingLine.__aiter__.
+    Transactions are taken off the line and signed batch_size at a time in an executor, so the event loop is
+    free while a batch is signed. While the consumer works through one batch the next one is prepared, and
+    nothing more: a consumer that stops pulling stops the line being drained.
+    """
+
+    def __init__(self, processing_line, order, batch_size, executor=None):
+        self.processing_line = processing_line
+        self.order = order
+        self.batch_size = batch_size
+        self.executor = executor
+
+        self.current_batch = None
+        self.current_position = 0
+        self.pending = None
+        self.exhausted = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        """
+        :complexity: Best case is O(1), when the current batch has transactions left. Worst case is O(b), where b
+        is the batch size, to start preparing the next batch. Signing happens in the executor and is not counted.
+        """
+        if self.current_batch is None or self.current_position == len(self.current_batch):
+            if self.exhausted:
+                raise StopAsyncIteration
+
+            if self.pending is None:
+                self.pending = self.submit_batch()
+            self.current_batch = await self.pending
+            self.current_position = 0
+            self.pending = None
+
+            if len(self.current_batch) < self.batch_size:
+                self.exhausted = True
+            else:
+                self.pending = self.submit_batch()
+
+            if len(self.current_batch) == 0:
+                raise StopAsyncIteration
+
+        transaction = self.current_batch[self.current_position]
+        self.current_position += 1
+        return transaction
+
+    def submit_batch(self):
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.executor, _take_and_sign, self.order, self.batch_size)
+
+
+def record_worker_signature(transaction, signature):
+    """
+    Stores a signature computed by _sign_chunk in a worker process, adding it to the signature cache, or signs
+    the transaction locally if the worker skipped it.
+    """
+    if signature is None:
+        transaction.sign()
+        return
+
+    key = transaction.signature_key()
+    if Transaction.signature_cache is not None:
+        Transaction.signature_cache.put(key, signature)
+    transaction.record_signature(key, signature)
+
+
+def _sign_chunk(chunk_data):
+    """
+    Worker-side half of ParallelProcessingLineIterator. Takes a tuple of transaction data strings and returns
+    a tuple with the signature of each one. Entries that are None (data that is not plain ASCII) are returned
+    as None and signed by the consumer instead.
+    """
+    return tuple(None if data is None else _fast_signature(data) for data in chunk_data)
+
+
+class ParallelProcessingLineIterator(ProcessingLineIterator):
+    """
+    Iterator returned by ProcessingLine.__iter__ once parallel signing has been enabled.
+    Transactions are taken off the line in the usual processing order, grouped into chunks and signed in a
+    pool of worker processes. Up to prefetch_depth chunks are in flight ahead of the consumer, and chunks are
+    consumed in the order they were submitted, so the order of the transactions returned is unchanged.
+
+    The worker pool is shut down once the line is exhausted, by close(), on leaving a with block, or at the
+    latest when the iterator is garbage collected, so a consumer that stops early does not leak the workers.
+
+        with iter(line) as transactions:
+            first = next(transactions)
+    """
+
+    def __init__(self, processing_line, workers, prefetch_depth, chunk_size, source=None):
+        """
+        :param source: iterator whose next_unsigned gives the order to process transactions in, this iterator's
+        own next_unsigned when None.
+        """
+        ProcessingLineIterator.__init__(self, processing_line)
+        self.source = self if source is None else source
+        self.workers = workers
+        self.prefetch_depth = prefetch_depth
+        self.chunk_size = chunk_size
+
+        self.executor = None
+        self.finalizer = None
+        self.pending = LinkedQueue()
+        self.current_chunk = None
+        self.current_signatures = None
+        self.current_position = 0
+        self.source_exhausted = False
+
+    def __next__(self):
+        """
+        :complexity: Best case is O(1), when the current chunk still has signed transactions left. Worst case is
+        O(d x c), where d is the prefetch depth and c the chunk size, when the pipeline has to be refilled.
+        Waiting on the worker pool is not counted.
+        """
+        if self.current_chunk is None or self.current_position == len(self.current_chunk):
+            self.fill_pipeline()
+            if self.pending.is_empty():
+                self.close()
+                raise StopIteration
+
+            self.current_chunk, future = self.pending.serve()
+            self.current_signatures = future.result()
+            self.current_position = 0
+            self.fill_pipeline()
+
+        transaction = self.current_chunk[self.current_position]
+        signature = self.current_signatures[self.current_position]
+        self.current_position += 1
+
+        record_worker_signature(transaction, signature)
+        return transaction
+
+    def fill_pipeline(self):
+        """
+        Submits chunks to the worker pool until prefetch_depth chunks are pending or the line is exhausted.
+        :complexity: O(d x c), where d is the prefetch depth and c the chunk size.
+        """
+        while not self.source_exhausted and len(self.pending) < self.prefetch_depth:
+            chunk = self.take_chunk()
+            if len(chunk) == 0:
+                self.source_exhausted = True
+                break
+
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+                # Must not refer to self, or the iterator would never be collected
+                self.finalizer = weakref.finalize(self, self.executor.shutdown, wait=False, cancel_futures=True)
+
+            chunk_data = tuple(self.transaction_data(chunk[i]) for i in range(len(chunk)))
+            self.pending.append((chunk, self.executor.submit(_sign_chunk, chunk_data)))
+
+    def take_chunk(self):
+        """
+        Takes up to chunk_size unsigned transactions off the line, in processing order.
+        :complexity: O(c), where c is the chunk size.
+        """
+        return take_unsigned(self.source, self.chunk_size)
+
+    @staticmethod
+    def transaction_data(transaction):
+        """
+        The string a worker signs for this transaction, or None if it has to be signed locally. Transactions
+        that are already signed, or whose signature is cached, are signed locally as that costs nothing.
+        """
+        key = transaction.signature_key()
+        if transaction.is_signed_for(key):
+            return None
+        if Transaction.signature_cache is not None and key in Transaction.signature_cache:
+            return None
+
+        transaction_data = str(transaction.timestamp) + transaction.from_user + transaction.to_user
+        return transaction_data if transaction_data.isascii() else None
+
+    def close(self):
+        """
+        Shuts the worker pool down. Called automatically once the line is exhausted, and can be called early
+        by a consumer that stops iterating. Calling it again does nothing.
+        """
+        if self.executor is not None:
+            self.finalizer.detach()
+            self.finalizer = None
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 
 if __name__ == "__main__":
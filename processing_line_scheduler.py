@@ -0,0 +1,255 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from data_structures import ArrayDeque, ArrayMinHeap, ArrayR, LinkedQueue
+from processing_line import (
+    ParallelProcessingLineIterator, _sign_chunk, record_worker_signature, sign_many, take_unsigned,
+)
+
+
+class LineMetrics:
+    """
+    What the scheduler measured for one line. Times are time.perf_counter() values.
+        queued: when the scheduler started and the line became ready
+        first_dispatch: when its first batch was sent to the pool
+        finished: when its last transaction was handed to the consumer
+        transactions, batches: how much of it has been drained
+        batch_seconds: total time its batches spent in the pool, waiting included
+    """
+
+    def __init__(self, line_id, critical_timestamp):
+        self.line_id = line_id
+        self.critical_timestamp = critical_timestamp
+        self.queued = None
+        self.first_dispatch = None
+        self.finished = None
+        self.transactions = 0
+        self.batches = 0
+        self.batch_seconds = 0.0
+
+    def queue_wait(self):
+        """
+        Seconds between the line becoming ready and its first batch being dispatched.
+        """
+        if self.queued is None or self.first_dispatch is None:
+            return None
+        return self.first_dispatch - self.queued
+
+    def latency(self):
+        """
+        Seconds between the line becoming ready and it being fully drained, None while it is not.
+        """
+        if self.queued is None or self.finished is None:
+            return None
+        return self.finished - self.queued
+
+    def __str__(self):
+        latency = self.latency()
+        latency_text = "running" if latency is None else f"{latency * 1000:.1f} ms"
+        return (
+            f"<LineMetrics line={self.line_id} critical={self.critical_timestamp} "
+            f"transactions={self.transactions} batches={self.batches} latency={latency_text}>"
+        )
+
+
+class LineState:
+    """
+    Scheduling state of one line: its processing-order iterator and its metrics.
+    """
+
+    def __init__(self, line_id, line):
+        self.line_id = line_id
+        self.line = line
+        self.order = None
+        self.metrics = LineMetrics(line_id, line.critical_timestamp)
+
+
+class ProcessingLineScheduler:
+    """
+    Drains many ProcessingLines at once and hands their signed transactions out through an async iterator.
+
+    Each line is drained in batches of batch_size transactions. A batch is taken off its line in processing
+    order and signed in a thread pool (sign_many) or a process pool (workers sign the transaction data and
+    the signatures are copied back). Up to workers batches are in flight at once, at most one per line, so
+    every line's transactions come out in that line's own order. Which ready line goes next is decided by
+    the policy:
+        ROUND_ROBIN: lines take turns, one batch each
+        PRIORITY: the ready line with the smallest critical timestamp goes first
+
+        async for transaction in ProcessingLineScheduler(lines):
+            ...
+
+    The scheduler can only be iterated once. Per-line metrics are in line_metrics() and the queue depth
+    (ready lines waiting for a pool slot) is sampled every time a batch is dispatched.
+
+    sign_many holds the GIL while it signs, so with threads (the default) batches of different lines take
+    turns rather than being signed in parallel; threads only keep the event loop free while a batch is signed.
+    Use use_processes=True to sign on several CPUs.
+
+    Closing the iterator early does not wait for the batches still in the pool: they are cancelled if they
+    have not started, and left to finish in the background otherwise, so the event loop is never blocked.
+    """
+
+    ROUND_ROBIN = "round_robin"
+    PRIORITY = "priority"
+    DEFAULT_BATCH_SIZE = 1024
+
+    def __init__(self, lines=(), policy=ROUND_ROBIN, workers=4, batch_size=DEFAULT_BATCH_SIZE, use_processes=False):
+        """
+        :raises ValueError: if the policy is unknown, or workers or batch_size is not positive.
+        """
+        if policy not in (ProcessingLineScheduler.ROUND_ROBIN, ProcessingLineScheduler.PRIORITY):
+            raise ValueError(f"Unknown scheduling policy {policy!r}")
+        if workers < 1 or batch_size < 1:
+            raise ValueError("workers and batch_size must be positive")
+
+        self.policy = policy
+        self.workers = workers
+        self.batch_size = batch_size
+        self.use_processes = use_processes
+
+        self.states = ArrayDeque()
+        self.ready = self.make_ready_queue()
+        self.started = False
+
+        self.in_flight = 0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.max_queue_depth = 0
+
+        for line in lines:
+            self.add_line(line)
+
+    def add_line(self, line):
+        """
+        Adds a line to be drained. Returns the id its metrics are reported under.
+        :raises RuntimeError: if the scheduler has already started or the line has already been processed.
+        """
+        if self.started:
+            raise RuntimeError("Cannot add lines - scheduler has already started")
+        if line.iterator_created:
+            raise RuntimeError("Line has already been processed")
+
+        line_id = len(self.states)
+        self.states.append(LineState(line_id, line))
+        return line_id
+
+    def line_metrics(self):
+        """
+        An ArrayR with the LineMetrics of every line, by line id.
+        """
+        metrics = ArrayR(len(self.states))
+        for line_id in range(len(self.states)):
+            metrics[line_id] = self.states[line_id].metrics
+        return metrics
+
+    def queue_depth(self):
+        """
+        Number of ready lines waiting for a pool slot right now.
+        """
+        return len(self.ready)
+
+    def average_queue_depth(self):
+        return self.depth_total / self.depth_samples if self.depth_samples > 0 else 0.0
+
+    def __aiter__(self):
+        if self.started:
+            raise RuntimeError("Scheduler already started - cannot drain the lines twice")
+        self.started = True
+        return self.drain()
+
+    def make_ready_queue(self):
+        if self.policy == ProcessingLineScheduler.PRIORITY:
+            return ArrayMinHeap()
+        return LinkedQueue()
+
+    def push_ready(self, state):
+        if self.policy == ProcessingLineScheduler.PRIORITY:
+            self.ready.add((state.line.critical_timestamp, state.line_id, state))
+        else:
+            self.ready.append(state)
+
+    def pop_ready(self):
+        if self.policy == ProcessingLineScheduler.PRIORITY:
+            return self.ready.get_min()[2]
+        return self.ready.serve()
+
+    async def drain(self):
+        """
+        Async generator behind __aiter__.
+        """
+        loop = asyncio.get_running_loop()
+        if self.use_processes:
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.workers)
+        completed = asyncio.Queue()
+
+        now = time.perf_counter()
+        for line_id in range(len(self.states)):
+            state = self.states[line_id]
+            state.order = state.line.start_processing()
+            state.metrics.queued = now
+            self.push_ready(state)
+
+        try:
+            while not self.ready.is_empty() or self.in_flight > 0:
+                while self.in_flight < self.workers and not self.ready.is_empty():
+                    self.dispatch(loop, executor, completed)
+
+                state, batch, signatures, dispatched, error = await completed.get()
+                self.in_flight -= 1
+                if error is not None:
+                    raise error
+                state.metrics.batch_seconds += time.perf_counter() - dispatched
+
+                if len(batch) == self.batch_size:
+                    self.push_ready(state)
+
+                for i in range(len(batch)):
+                    transaction = batch[i]
+                    if signatures is not None:
+                        record_worker_signature(transaction, signatures[i])
+                    yield transaction
+
+                state.metrics.transactions += len(batch)
+                if len(batch) < self.batch_size:
+                    state.metrics.finished = time.perf_counter()
+        finally:
+            # Runs on the event loop thread, so it must not wait for the batches in flight
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def dispatch(self, loop, executor, completed):
+        """
+        Takes the next batch off the next ready line and sends it to the pool. When it is done the
+        (state, batch, signatures, dispatch time, error) record is put on the completed queue.
+        """
+        self.depth_samples += 1
+        self.depth_total += len(self.ready)
+        self.max_queue_depth = max(self.max_queue_depth, len(self.ready))
+
+        state = self.pop_ready()
+        batch = take_unsigned(state.order, self.batch_size)
+        dispatched = time.perf_counter()
+        if state.metrics.first_dispatch is None:
+            state.metrics.first_dispatch = dispatched
+        state.metrics.batches += 1
+        self.in_flight += 1
+
+        if self.use_processes:
+            chunk_data = tuple(
+                ParallelProcessingLineIterator.transaction_data(batch[i]) for i in range(len(batch))
+            )
+            future = loop.run_in_executor(executor, _sign_chunk, chunk_data)
+        else:
+            future = loop.run_in_executor(executor, sign_many, batch)
+
+        def on_done(done):
+            if done.cancelled():
+                return
+            error = done.exception()
+            signatures = done.result() if self.use_processes and error is None else None
+            completed.put_nowait((state, batch, signatures, dispatched, error))
+
+        future.add_done_callback(on_done)
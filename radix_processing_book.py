@@ -0,0 +1,220 @@
+from processing_book import ProcessingBook
+
+
+class RadixProcessingBook(ProcessingBook):
+    """
+    Path-compressed (PATRICIA) ProcessingBook.
+
+    A nested book only exists where stored signatures actually diverge. Its level is the position of the
+    character it branches on, which can be many characters below its parent's level, and its prefix holds
+    the signature characters before that position, which every transaction below it shares. Two transactions
+    whose signatures share 35 characters therefore need one nested book instead of 35.
+
+    A nested book is removed as soon as a delete leaves it with a single page, so there is always fewer
+    nested books than transactions, whatever the signatures look like. The pages, error_count,
+    transaction_count, occupied_pages and book_stats attributes mean the same as in ProcessingBook, and
+    iteration is inherited.
+    """
+
+    def __init__(self, level=0, prefix="", book_stats=None):
+        """
+        :complexity: Best and worst case is O(1), the number of pages is fixed.
+        """
+        ProcessingBook.__init__(self, level, book_stats)
+        self.prefix = prefix
+
+    @staticmethod
+    def branch_level(first, second, start, end):
+        """
+        The first position between start and end at which the signatures differ, end if they agree on all of them.
+        :complexity: O(end - start)
+        """
+        for level in range(start, end):
+            if first[level] != second[level]:
+                return level
+        return end
+
+    def branch(self, level, signature, first, second_character, second):
+        """
+        A new nested book branching at level, holding first (the page for signature[level]) and second.
+        """
+        book = RadixProcessingBook(level, signature[:level], self.book_stats)
+        book.set_page(book.page_index(signature[level]), first)
+        book.set_page(book.page_index(second_character), second)
+        self.book_stats.collision_count += 1
+        book.transaction_count = 2
+        return book
+
+    def __setitem__(self, transaction, amount):
+        """
+        :complexity: Best case is O(1), when the transaction's page in this book is empty. Worst case is O(n),
+        where n is len(transaction.signature), when the transaction shares a long prefix with stored ones and
+        the shared characters have to be compared. At most one nested book is created.
+        """
+        signature = transaction.signature
+        page_idx = self.page_index(signature[self.level])
+        current_page = self.pages[page_idx]
+
+        if current_page is None:
+            self.set_page(page_idx, (transaction, amount))
+            self.book_stats.count_leaf(self.level, 1)
+            self.transaction_count += 1
+
+        elif isinstance(current_page, tuple):
+            stored_transaction, stored_amount = current_page
+            stored_signature = stored_transaction.signature
+
+            if stored_signature == signature:
+                if stored_amount != amount:
+                    self.error_count += 1
+                return
+
+            level = self.branch_level(
+                stored_signature, signature, self.level + 1, min(len(stored_signature), len(signature))
+            )
+            self.pages[page_idx] = self.branch(
+                level, stored_signature, current_page, signature[level], (transaction, amount)
+            )
+            self.book_stats.count_leaf(self.level, -1)
+            self.book_stats.count_leaf(level, 2)
+            self.transaction_count += 1
+
+        else:
+            level = self.branch_level(current_page.prefix, signature, self.level + 1, current_page.level)
+            if level < current_page.level:
+                # The transaction leaves the nested book's shared prefix: branch above it
+                nested_book = self.branch(
+                    level, current_page.prefix, current_page, signature[level], (transaction, amount)
+                )
+                nested_book.transaction_count = current_page.transaction_count + 1
+                nested_book.error_count = current_page.error_count
+                self.pages[page_idx] = nested_book
+                self.book_stats.count_leaf(level, 1)
+                self.transaction_count += 1
+                return
+
+            old_error_count = current_page.error_count
+            old_count = current_page.transaction_count
+
+            current_page[transaction] = amount
+
+            self.error_count += current_page.error_count - old_error_count
+            self.transaction_count += current_page.transaction_count - old_count
+
+    def __getitem__(self, transaction):
+        """
+        :complexity: Best case is O(n), where n is len(transaction.signature), when the transaction is on this
+        book's pages; the signatures are compared once at the end. Worst case is O(n) too, as a path never has
+        more nested books than the signature has characters.
+        """
+        signature = transaction.signature
+        book = self
+        while book.level < len(signature):
+            current_page = book.pages[book.page_index(signature[book.level])]
+            if current_page is None:
+                break
+            if isinstance(current_page, tuple):
+                if current_page[0].signature == signature:
+                    return current_page[1]
+                break
+            book = current_page
+
+        raise KeyError("Transaction not found")
+
+    def __delitem__(self, transaction):
+        """
+        :complexity: Best case is O(n), where n is len(transaction.signature), when the transaction is on this
+        book's pages. Worst case is O(n) too: a nested book left with a single page is replaced by it, and
+        page_bits gives that page without a scan.
+        """
+        signature = transaction.signature
+        if self.level >= len(signature):
+            raise KeyError("Transaction not found")
+
+        page_idx = self.page_index(signature[self.level])
+        current_page = self.pages[page_idx]
+
+        if current_page is None:
+            raise KeyError("Transaction not found")
+
+        elif isinstance(current_page, tuple):
+            if current_page[0].signature != signature:
+                raise KeyError("Transaction not found")
+            self.set_page(page_idx, None)
+            self.book_stats.count_leaf(self.level, -1)
+            self.transaction_count -= 1
+
+        else:
+            old_count = current_page.transaction_count
+            current_page.__delitem__(transaction)
+            self.transaction_count -= old_count - current_page.transaction_count
+
+            if current_page.occupied_pages == 1:
+                remaining = current_page.pages[current_page.only_page()]
+                self.pages[page_idx] = remaining
+                if isinstance(remaining, tuple):
+                    self.book_stats.count_leaf(current_page.level, -1)
+                    self.book_stats.count_leaf(self.level, 1)
+                self.book_stats.remove_book(current_page)
+
+    def prefix_page(self, prefix):
+        """
+        As ProcessingBook.prefix_page, but the characters a nested book skips have to be checked against its prefix.
+        :raises ValueError: if the prefix has characters that are not legal.
+        :complexity: O(p) where p is len(prefix).
+        """
+        codes = ProcessingBook.checked_page_key(prefix)
+        book = self
+        while book.level < len(codes):
+            current_page = book.pages[codes[book.level]]
+            if current_page is None or isinstance(current_page, tuple):
+                return current_page
+            if current_page.prefix[:len(prefix)] != prefix[:current_page.level]:
+                return None
+            book = current_page
+        return book
+
+    def child_path(self, path, page, nested_book):
+        return ProcessingBook.page_key(nested_book.prefix)
+
+    def bulk_load(self, pairs):
+        """
+        Stores every (transaction, amount) pair of pairs one at a time. The single pass build of ProcessingBook
+        relies on every level having its own book, which a path-compressed book does not.
+        :complexity: O(N x n) where N is the number of pairs and n the length of the signatures.
+        """
+        for transaction, amount in pairs:
+            self[transaction] = amount
+
+    def merge(self, other_book):
+        """
+        Moves every transaction of other_book into this book, with the same rules as ProcessingBook.merge.
+        Each transaction is stored from the top, as nested books on the two sides can branch on different levels.
+        :raises ValueError: if the books are not on the same level.
+        :complexity: O(N x n) where N is len(other_book) and n the length of the signatures.
+        """
+        if other_book.level != self.level:
+            raise ValueError("Only books on the same level can be merged")
+        if other_book is self:
+            return
+
+        for transaction, amount in other_book.items():
+            self[transaction] = amount
+        self.error_count += other_book.error_count
+        other_book.clear()
+
+
+if __name__ == "__main__":
+    from processing_line import Transaction
+
+    book = RadixProcessingBook()
+    for signature, amount in (("abc123", 10), ("0bbzzz", 20), ("abcxyz", 30)):
+        transaction = Transaction(0, "sender", "receiver")
+        transaction.signature = signature
+        book[transaction] = amount
+
+    # "abc123" and "abcxyz" branch on their fourth character, without books for "b" and "c"
+    nested_book = book.pages[book.page_index("a")]
+    print(nested_book.level, nested_book.prefix)
+    for transaction, amount in book:
+        print(transaction.signature, amount)
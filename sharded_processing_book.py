@@ -0,0 +1,339 @@
+import multiprocessing
+
+from data_structures import ArrayDeque, ArrayMinHeap, ArrayR
+from processing_book import ProcessingBook
+from processing_line import Transaction
+
+# Requests sent to a shard worker. SET carries no reply, every other request gets an (OK, value) or
+# (FAILED, exception) reply.
+SET = 0
+GET = 1
+DELETE = 2
+COUNTS = 3
+ITEMS = 4
+STOP = 5
+
+OK = 0
+FAILED = 1
+
+
+def transaction_record(transaction):
+    """
+    The fields of a transaction as a tuple, which is much cheaper to send through a pipe than the object.
+    """
+    return (transaction.timestamp, transaction.from_user, transaction.to_user, transaction.signature)
+
+
+def record_transaction(record):
+    """
+    A new Transaction, signature included, from a transaction_record.
+    """
+    timestamp, from_user, to_user, signature = record
+    transaction = Transaction(timestamp, from_user, to_user)
+    transaction.signature = signature
+    return transaction
+
+
+def serve_shard(connection):
+    """
+    Main loop of a shard worker process: holds one ProcessingBook and runs the requests read from connection
+    in the order they arrive, until STOP.
+    Requests carry batches, so one message stores, finds or removes many transactions.
+    SET has no reply to carry an error, so the first store that fails is kept, the rest of the stores are still
+    made, and the next request with a reply is answered with (FAILED, exception) instead of being run.
+    """
+    book = ProcessingBook()
+    failure = None
+    while True:
+        operation, batch = connection.recv()
+        if operation == SET:
+            for record, amount in batch:
+                try:
+                    book[record_transaction(record)] = amount
+                except Exception as exception:
+                    if failure is None:
+                        failure = exception
+            continue
+        if operation == STOP:
+            connection.close()
+            return
+        if failure is not None:
+            connection.send((FAILED, failure))
+            failure = None
+            continue
+
+        try:
+            if operation == GET:
+                result = tuple(shard_lookup(book, record) for record in batch)
+            elif operation == DELETE:
+                for record in batch:
+                    del book[record_transaction(record)]
+                result = None
+            elif operation == COUNTS:
+                result = (len(book), book.get_error_count())
+            else:
+                result = tuple((transaction_record(transaction), amount) for transaction, amount in book.items())
+        except Exception as exception:
+            connection.send((FAILED, exception))
+        else:
+            connection.send((OK, result))
+
+
+def shard_lookup(book, record):
+    """
+    (True, amount) if the transaction of record is in book, (False, None) otherwise.
+    """
+    try:
+        return (True, book[record_transaction(record)])
+    except KeyError:
+        return (False, None)
+
+
+class ShardedProcessingBook:
+    """
+    ProcessingBook spread over worker processes, each holding the transactions of its shard in a ProcessingBook
+    of its own, so the book is not limited by one process's memory and the shards store in parallel.
+
+    A transaction's shard is given by the page of its signature character at shard_level, so all requests for
+    one transaction go to the same worker, through the same pipe, in the order they were made. Stores are
+    batched: they are buffered per shard and sent batch_size at a time, and any other request to a shard first
+    sends its buffered stores. get_many looks up a whole batch of transactions with one request per shard.
+
+    Transactions handed back by iteration are new Transaction objects with their signature set, as they come
+    from another process. Call close() (or use the book as a context manager) to stop the workers.
+
+        with ShardedProcessingBook(shard_count=4) as book:
+            book[transaction] = amount
+            total = len(book)
+    """
+
+    DEFAULT_SHARD_COUNT = 4
+    DEFAULT_BATCH_SIZE = 1024
+
+    def __init__(self, shard_count=DEFAULT_SHARD_COUNT, shard_level=0, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        :raises ValueError: if shard_count is not between 1 and the number of pages, shard_level is negative
+        or batch_size is below 1.
+        :complexity: O(s), where s is shard_count, plus starting s processes.
+        """
+        if not 1 <= shard_count <= len(ProcessingBook.LEGAL_CHARACTERS):
+            raise ValueError(f"shard_count must be between 1 and {len(ProcessingBook.LEGAL_CHARACTERS)}")
+        if shard_level < 0:
+            raise ValueError("shard_level cannot be negative")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        self.shard_count = shard_count
+        self.shard_level = shard_level
+        self.batch_size = batch_size
+        self.connections = ArrayR(shard_count)
+        self.workers = ArrayR(shard_count)
+        self.pending_sets = ArrayR(shard_count)
+        for shard in range(shard_count):
+            connection, worker_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=serve_shard, args=(worker_connection,), daemon=True)
+            worker.start()
+            worker_connection.close()
+            self.connections[shard] = connection
+            self.workers[shard] = worker
+            self.pending_sets[shard] = ArrayDeque()
+        self.closed = False
+
+    page_index = ProcessingBook.page_index
+
+    def shard_index(self, signature):
+        """
+        The shard of a signature, from the page of its character at shard_level (its last character if it is shorter).
+        :complexity: O(1)
+        """
+        return self.page_index(signature[min(self.shard_level, len(signature) - 1)]) % self.shard_count
+
+    def request(self, shard, operation, batch):
+        """
+        Sends the buffered stores of shard, then a request, and returns the worker's reply.
+        :raises: the exception the request raised in the worker.
+        """
+        self.flush(shard)
+        self.connections[shard].send((operation, batch))
+        status, result = self.connections[shard].recv()
+        if status == FAILED:
+            raise result
+        return result
+
+    def flush(self, shard):
+        """
+        Sends the stores buffered for shard as one batch.
+        :complexity: O(b), where b is the number of buffered stores.
+        """
+        pending = self.pending_sets[shard]
+        if len(pending) > 0:
+            self.connections[shard].send((SET, tuple(pending[i] for i in range(len(pending)))))
+            self.pending_sets[shard] = ArrayDeque()
+
+    def flush_all(self):
+        for shard in range(self.shard_count):
+            self.flush(shard)
+
+    def __setitem__(self, transaction, amount):
+        """
+        Buffers the store for the transaction's shard; the shard gets it with the next batch.
+        Signatures are checked here, as an error in the worker could not be reported to anyone.
+        :raises ValueError: if the signature has characters that are not legal.
+        :complexity: O(n), where n is len(transaction.signature), plus O(b) to send a full batch of b stores.
+        """
+        ProcessingBook.checked_page_key(transaction.signature)
+        shard = self.shard_index(transaction.signature)
+        pending = self.pending_sets[shard]
+        pending.append((transaction_record(transaction), amount))
+        if len(pending) >= self.batch_size:
+            self.flush(shard)
+
+    def __getitem__(self, transaction):
+        """
+        :raises KeyError: if the transaction is not in the book.
+        :complexity: As ProcessingBook.__getitem__ in the worker, plus one round trip to it.
+        """
+        found, amount = self.request(
+            self.shard_index(transaction.signature), GET, (transaction_record(transaction),)
+        )[0]
+        if not found:
+            raise KeyError("Transaction not found")
+        return amount
+
+    def get_many(self, transactions, default=None):
+        """
+        The amounts of every transaction of transactions, in an ArrayR in the same order, default for the ones
+        that are not in the book. Every shard is sent one request with all of its transactions, and all the
+        requests are sent before any reply is read, so the shards look up in parallel.
+        :complexity: O(N) plus one round trip per shard, where N is len(transactions).
+        """
+        batches = ArrayR(self.shard_count)
+        positions = ArrayR(self.shard_count)
+        for shard in range(self.shard_count):
+            batches[shard] = ArrayDeque()
+            positions[shard] = ArrayDeque()
+        for position in range(len(transactions)):
+            transaction = transactions[position]
+            shard = self.shard_index(transaction.signature)
+            batches[shard].append(transaction_record(transaction))
+            positions[shard].append(position)
+
+        for shard in range(self.shard_count):
+            self.flush(shard)
+            batch = batches[shard]
+            self.connections[shard].send((GET, tuple(batch[i] for i in range(len(batch)))))
+
+        amounts = ArrayR(len(transactions))
+        failure = None
+        for shard in range(self.shard_count):
+            status, result = self.connections[shard].recv()
+            if status == FAILED:
+                failure = result
+                continue
+            for i in range(len(result)):
+                found, amount = result[i]
+                amounts[positions[shard][i]] = amount if found else default
+        if failure is not None:
+            raise failure
+        return amounts
+
+    def __delitem__(self, transaction):
+        """
+        :raises KeyError: if the transaction is not in the book.
+        :complexity: As ProcessingBook.__delitem__ in the worker, plus one round trip to it.
+        """
+        self.request(self.shard_index(transaction.signature), DELETE, (transaction_record(transaction),))
+
+    def counts(self):
+        """
+        The total (transaction count, error count) over every shard, once every buffered store has been made.
+        :complexity: O(s) plus one round trip per shard, where s is the number of shards.
+        """
+        shard_counts = self.request_all(COUNTS)
+        transaction_count = 0
+        error_count = 0
+        for shard in range(self.shard_count):
+            transaction_count += shard_counts[shard][0]
+            error_count += shard_counts[shard][1]
+        return (transaction_count, error_count)
+
+    def request_all(self, operation):
+        """
+        Sends a request with no batch to every shard, after its buffered stores, and returns an ArrayR with
+        every shard's reply. Every reply is read before a failure is raised, so none is left in a pipe to be
+        mistaken for the reply to a later request.
+        :raises: the exception the request raised in the first shard that failed.
+        :complexity: O(s) plus one round trip per shard, where s is the number of shards.
+        """
+        self.flush_all()
+        for shard in range(self.shard_count):
+            self.connections[shard].send((operation, None))
+        results = ArrayR(self.shard_count)
+        failure = None
+        for shard in range(self.shard_count):
+            status, result = self.connections[shard].recv()
+            if status == FAILED:
+                if failure is None:
+                    failure = result
+                continue
+            results[shard] = result
+        if failure is not None:
+            raise failure
+        return results
+
+    def __len__(self):
+        return self.counts()[0]
+
+    def get_error_count(self):
+        """
+        Returns the number of errors encountered while storing transactions.
+        """
+        return self.counts()[1]
+
+    def __iter__(self):
+        return self.items()
+
+    def items(self):
+        """
+        Generator over the (transaction, amount) pairs in signature order, as they were when iteration started.
+        Every shard sends its pairs in signature order, and they are merged with a heap holding one entry per shard.
+        :complexity: O(N log s) plus the transfer of every pair, where N is the number of transactions and s the
+        number of shards.
+        """
+        shard_items = self.request_all(ITEMS)
+
+        heap = ArrayMinHeap()
+        for shard in range(self.shard_count):
+            if len(shard_items[shard]) > 0:
+                heap.add((ProcessingBook.page_key(shard_items[shard][0][0][3]), shard, 0))
+
+        while not heap.is_empty():
+            _, shard, position = heap.peek()
+            record, amount = shard_items[shard][position]
+            yield (record_transaction(record), amount)
+            position += 1
+            if position < len(shard_items[shard]):
+                heap.replace_min((ProcessingBook.page_key(shard_items[shard][position][0][3]), shard, position))
+            else:
+                heap.get_min()
+
+    def close(self):
+        """
+        Stops the workers; the transactions they hold are lost. Calling it again does nothing.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        for shard in range(self.shard_count):
+            try:
+                self.connections[shard].send((STOP, None))
+            except OSError:
+                pass
+            self.workers[shard].join()
+            self.connections[shard].close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
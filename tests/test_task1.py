@@ -1,11 +1,19 @@
 from unittest import TestCase
+import asyncio
+import gc
+import os
+import tempfile
 import ast
 import inspect
 
 from tests.helper import CollectionsFinder
 
 
-from processing_line import ProcessingLine, Transaction
+from processing_line import ProcessingLine, SignatureCache, SignatureKeyTable, Transaction, sign_many
+from data_structures import ArrayDeque, ArrayR
+from transaction_batch import TransactionBatch
+from transaction_loader import TransactionLoader
+from processing_line_scheduler import ProcessingLineScheduler
 
 
 class TestTask1Setup(TestCase):
@@ -43,8 +51,299 @@ class TestTask1(TestTask1Setup):
                 self.fail("Iterator returned more transactions than expected.")
         
         self.assertEqual(counter, 3, "Line iterator should've returned exactly 3 transactions.")
+
+    def test_sign_many_matches_sign(self):
+        """
+        #name(Batch signing gives the same signatures as sign)
+        """
+        transactions = ArrayR.from_list([
+            Transaction(50, "alice", "bob"),
+            Transaction(100, "bob", "dave"),
+            Transaction(1234567, "Dave_9", "frank"),
+            Transaction(7, "", "x"),
+            Transaction(120, "zoë", "frank"),
+        ])
+        sign_many(transactions)
+
+        for transaction in transactions:
+            expected = Transaction(transaction.timestamp, transaction.from_user, transaction.to_user)
+            expected.sign()
+            self.assertEqual(transaction.signature, expected.signature)
     
 
+    def test_parallel_signing_keeps_order(self):
+        """
+        #name(Parallel signing returns transactions in the usual order)
+        """
+        def build_line():
+            critical = Transaction(100, "bob", "dave")
+            line = ProcessingLine(critical)
+            for timestamp in (120, 50, 180, 100, 10, 150, 99, 300):
+                line.add_transaction(Transaction(timestamp, "user" + str(timestamp), "zoë" if timestamp % 2 else "carol"))
+            return line
+
+        expected = [(t.timestamp, t.from_user, t.signature) for t in build_line()]
+
+        line = build_line()
+        line.enable_parallel_signing(workers=2, prefetch_depth=2, chunk_size=3)
+        actual = [(t.timestamp, t.from_user, t.signature) for t in line]
+
+        self.assertEqual(actual, expected)
+        self.assertRaises(RuntimeError, line.add_transaction, Transaction(1, "a", "b"))
+
+    def test_parallel_signing_stopped_early(self):
+        """
+        #name(Parallel signing shuts its workers down when the consumer stops early)
+        """
+        def build_line():
+            line = ProcessingLine(Transaction(100, "bob", "dave"))
+            for timestamp in range(200):
+                line.add_transaction(Transaction(timestamp, "alice", "carol"))
+            line.enable_parallel_signing(workers=2, prefetch_depth=2, chunk_size=3)
+            return line
+
+        with iter(build_line()) as transactions:
+            next(transactions)
+            executor = transactions.executor
+            self.assertIsNotNone(executor)
+        self.assertIsNone(transactions.executor)
+        self.assertRaises(RuntimeError, executor.submit, abs, 1)
+
+        transactions = iter(build_line())
+        next(transactions)
+        finalizer = transactions.finalizer
+        del transactions
+        gc.collect()
+        self.assertFalse(finalizer.alive, "The worker pool should be shut down with the iterator.")
+
+    def test_buffer_storage_keeps_order(self):
+        """
+        #name(Buffer storage returns transactions in the same order as linked storage)
+        """
+        critical = Transaction(100, "bob", "dave")
+        timestamps = (120, 50, 180, 100, 10, 150, 99, 300)
+        transactions = [Transaction(timestamp, "alice", "bob") for timestamp in timestamps]
+
+        linked_line = ProcessingLine(critical)
+        buffer_line = ProcessingLine(critical, storage=ProcessingLine.BUFFER_STORAGE)
+        for transaction in transactions:
+            linked_line.add_transaction(transaction)
+            buffer_line.add_transaction(transaction)
+
+        self.assertEqual(list(buffer_line), list(linked_line))
+        self.assertEqual(len(buffer_line.before_buffer), 0)
+        self.assertEqual(len(buffer_line.after_buffer), 0)
+        self.assertRaises(ValueError, ProcessingLine, critical, "array")
+
+    def test_signature_cache_capacity_limit(self):
+        """
+        #name(Signature cache capacity is bounded by what its table can hold)
+        """
+        # The default LinearProbeTable sizes could not hold more than 786433 keys
+        self.assertGreater(SignatureKeyTable.MAX_LENGTH, 786433)
+        self.assertEqual(SignatureCache(SignatureKeyTable.MAX_LENGTH).capacity, SignatureKeyTable.MAX_LENGTH)
+        self.assertRaises(ValueError, SignatureCache, SignatureKeyTable.MAX_LENGTH + 1)
+        self.assertRaises(ValueError, SignatureCache, 0)
+
+    def test_signature_cache_and_memoisation(self):
+        """
+        #name(Signatures are cached with LRU eviction and not recomputed for unchanged transactions)
+        """
+        cache = SignatureCache(capacity=2)
+        Transaction.signature_cache = cache
+        self.addCleanup(setattr, Transaction, "signature_cache", None)
+
+        first = Transaction(1, "alice", "bob")
+        first.sign()
+        signature = first.signature
+        first.sign()
+        self.assertIs(first.signature, signature)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        replay = Transaction(1, "alice", "bob")
+        replay.sign()
+        self.assertEqual(replay.signature, signature)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        Transaction(2, "alice", "bob").sign()
+        Transaction(3, "alice", "bob").sign()
+        self.assertEqual(cache.evictions, 1)
+        self.assertNotIn((1, "alice", "bob"), cache)
+        self.assertEqual(len(cache), 2)
+
+        first.to_user = "carol"
+        first.sign()
+        expected = Transaction(1, "alice", "carol")
+        Transaction.signature_cache = None
+        expected.sign()
+        self.assertEqual(first.signature, expected.signature)
+
+    def test_transaction_batch_views(self):
+        """
+        #name(TransactionBatch views can be processed like transactions)
+        """
+        batch = TransactionBatch()
+        for timestamp in (100, 120, 50):
+            batch.append(timestamp, "alice", "bob")
+        self.assertEqual(len(batch.user_names), 2)
+
+        line = ProcessingLine(batch[0])
+        line.add_transaction(batch[1])
+        line.add_transaction(batch[2])
+        self.assertEqual([view.timestamp for view in line], [50, 100, 120])
+
+        expected = Transaction(50, "alice", "bob")
+        expected.sign()
+        self.assertEqual(batch[2].signature, expected.signature)
+
+        batch[2].to_user = "carol"
+        self.assertIsNone(batch[2].signature)
+        self.assertRaises(ValueError, setattr, batch[0], "signature", "xxxab")
+
+    def test_loader_streams_into_line(self):
+        """
+        #name(Transactions stream from JSONL and CSV files into a line)
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        jsonl_path = os.path.join(directory.name, "transactions.jsonl")
+        csv_path = os.path.join(directory.name, "transactions.csv")
+        with open(jsonl_path, "w") as handle:
+            handle.write('{"timestamp": 120, "from": "dave", "to": "frank"}\n\n')
+            handle.write('{"timestamp": 50, "from_user": "alice", "to_user": "bob"}\n')
+        with open(csv_path, "w") as handle:
+            handle.write("timestamp,from,to\n120,dave,frank\n50,alice,\"bob, jr\"\n")
+
+        for path, use_mmap in ((jsonl_path, False), (jsonl_path, True), (csv_path, False), (csv_path, True)):
+            line = ProcessingLine(Transaction(100, "bob", "dave"))
+            loader = TransactionLoader(path, chunk_size=1, use_mmap=use_mmap)
+            stats = loader.load_into(line)
+
+            self.assertEqual(stats.records, 2)
+            self.assertEqual([(t.timestamp, t.from_user) for t in line], [(50, "alice"), (100, "bob"), (120, "dave")])
+
+    def test_add_transactions_bulk(self):
+        """
+        #name(Bulk add partitions like add_transaction and respects the lock)
+        """
+        critical = Transaction(100, "bob", "dave")
+        transactions = [Transaction(timestamp, "alice", "bob") for timestamp in (120, 50, 180, 100, 10)]
+
+        for storage in (ProcessingLine.LINKED_STORAGE, ProcessingLine.BUFFER_STORAGE):
+            single = ProcessingLine(critical, storage=storage)
+            for transaction in transactions:
+                single.add_transaction(transaction)
+            bulk = ProcessingLine(critical, storage=storage)
+            self.assertEqual(bulk.add_transactions(ArrayR.from_list(transactions)), 5)
+            self.assertEqual(bulk.add_transactions(iter([])), 0)
+
+            self.assertEqual(list(bulk), list(single))
+            self.assertRaises(RuntimeError, bulk.add_transactions, transactions)
+
+        # Each buffer is grown by the number of transactions it gets, not by the whole batch
+        buffered = ProcessingLine(critical, storage=ProcessingLine.BUFFER_STORAGE)
+        buffered.add_transactions([Transaction(timestamp, "alice", "bob") for timestamp in range(70, 110)])
+        self.assertEqual((len(buffered.before_buffer), len(buffered.after_buffer)), (31, 9))
+        self.assertEqual(buffered.before_buffer.capacity(), 31)
+        self.assertEqual(buffered.after_buffer.capacity(), ArrayDeque.MIN_CAPACITY)
+
+    def test_timestamp_order(self):
+        """
+        #name(Timestamp order mode sorts each phase and keeps ties in insertion order)
+        """
+        timestamps = (120, 50, 180, 100, 10, 150, 50, 300, 120)
+        expected = [(10, 4), (50, 1), (50, 6), (100, 3), (100, -1), (120, 0), (120, 8), (150, 5), (180, 2), (300, 7)]
+
+        for storage in (ProcessingLine.LINKED_STORAGE, ProcessingLine.BUFFER_STORAGE):
+            for run_size in (None, 2):
+                line = ProcessingLine(Transaction(100, "critical", "x"), storage=storage)
+                for position, timestamp in enumerate(timestamps):
+                    line.add_transaction(Transaction(timestamp, str(position), "x"))
+                line.enable_timestamp_order(run_size=run_size)
+
+                actual = [(t.timestamp, -1 if t.from_user == "critical" else int(t.from_user)) for t in line]
+                self.assertEqual(actual, expected)
+                self.assertIsNotNone(line.critical_transaction.signature)
+
+    def test_scheduler_drains_every_line_in_order(self):
+        """
+        #name(Scheduler drains many lines and keeps each line's order)
+        """
+        async def drain(scheduler):
+            return [transaction async for transaction in scheduler]
+
+        for policy, use_processes in ((ProcessingLineScheduler.ROUND_ROBIN, False), (ProcessingLineScheduler.PRIORITY, True)):
+            lines = []
+            expected = []
+            for critical_timestamp in (300, 100, 200):
+                line = ProcessingLine(Transaction(critical_timestamp, "line" + str(critical_timestamp), "x"))
+                line.add_transactions([Transaction(critical_timestamp + offset, "u", "x") for offset in (5, -5, 1, -1, 7)])
+                lines.append(line)
+                expected.append([critical_timestamp - 5, critical_timestamp - 1, critical_timestamp,
+                                 critical_timestamp + 7, critical_timestamp + 1, critical_timestamp + 5])
+
+            scheduler = ProcessingLineScheduler(lines, policy=policy, workers=2, batch_size=2, use_processes=use_processes)
+            drained = asyncio.run(drain(scheduler))
+
+            self.assertEqual(len(drained), 18)
+            self.assertTrue(all(transaction.signature is not None for transaction in drained))
+            for line_expected in expected:
+                line_timestamps = [t.timestamp for t in drained if line_expected[0] <= t.timestamp <= line_expected[3]]
+                self.assertEqual(line_timestamps, line_expected)
+            for metrics in scheduler.line_metrics():
+                self.assertEqual(metrics.transactions, 6)
+                self.assertIsNotNone(metrics.latency())
+            self.assertRaises(RuntimeError, iter, lines[0])
+
+    def test_scheduler_closed_early(self):
+        """
+        #name(Scheduler can be closed while batches are still being signed)
+        """
+        async def first_then_close(scheduler):
+            transactions = scheduler.__aiter__()
+            first = await transactions.__anext__()
+            await transactions.aclose()
+            return first
+
+        lines = []
+        for critical_timestamp in (300, 100, 200):
+            line = ProcessingLine(Transaction(critical_timestamp, "line", "x"))
+            line.add_transactions([Transaction(critical_timestamp + offset, "u", "x") for offset in range(-50, 50)])
+            lines.append(line)
+        scheduler = ProcessingLineScheduler(lines, workers=2, batch_size=10)
+        first = asyncio.run(first_then_close(scheduler))
+
+        self.assertIsNotNone(first.signature)
+        self.assertLess(sum(metrics.transactions for metrics in scheduler.line_metrics()), 300)
+
+    def test_async_iteration(self):
+        """
+        #name(ProcessingLine can be drained with async for)
+        """
+        async def drain(line):
+            return [transaction async for transaction in line]
+
+        for storage in (ProcessingLine.LINKED_STORAGE, ProcessingLine.BUFFER_STORAGE):
+            critical = Transaction(100, "alice", "bob")
+            line = ProcessingLine(critical, storage=storage)
+            line.add_transactions([Transaction(timestamp, "carol", "dave") for timestamp in (90, 95, 110, 99, 105)])
+            line.enable_async_signing(batch_size=2)
+
+            drained = asyncio.run(drain(line))
+            self.assertEqual([t.timestamp for t in drained], [90, 95, 99, 100, 105, 110])
+            for transaction in drained:
+                expected = Transaction(transaction.timestamp, transaction.from_user, transaction.to_user)
+                expected.sign()
+                self.assertEqual(transaction.signature, expected.signature)
+
+            self.assertRaises(RuntimeError, line.__aiter__)
+            self.assertRaises(RuntimeError, iter, line)
+            self.assertRaises(RuntimeError, line.add_transaction, Transaction(1, "a", "b"))
+
+        line = ProcessingLine(Transaction(1, "a", "b"))
+        self.assertRaises(ValueError, line.enable_async_signing, 0)
+
+
 class TestTask1Approach(TestTask1Setup):
     def test_python_built_ins_not_used(self):
         """
@@ -52,7 +351,10 @@ class TestTask1Approach(TestTask1Setup):
         #hurdle
         """
         import processing_line
-        modules = [processing_line]
+        import transaction_batch
+        import transaction_loader
+        import processing_line_scheduler
+        modules = [processing_line, transaction_batch, transaction_loader, processing_line_scheduler]
 
         for f in modules:
             # Get the source code
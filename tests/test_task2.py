@@ -1,15 +1,32 @@
 from unittest import TestCase
 import ast
 import inspect
+import os
+import tempfile
+import threading
 
 from tests.helper import CollectionsFinder
 
 from processing_line import Transaction
-from processing_book import ProcessingBook
+from processing_book import ProcessingBook, RankTable
+from flat_processing_book import FlatProcessingBook
+from radix_processing_book import RadixProcessingBook
+from book_snapshot import MappedProcessingBook, save_book
+from concurrent_processing_book import ConcurrentProcessingBook
+from sharded_processing_book import ShardedProcessingBook
 
 from data_structures import ArrayR
 
 
+class IncomparableAmount:
+    """
+    Amount that cannot be compared with a stored one, so storing it over a stored transaction fails.
+    """
+
+    def __ne__(self, other):
+        raise ArithmeticError("Amounts cannot be compared")
+
+
 class TestTask2Setup(TestCase):
     pass
 
@@ -26,7 +43,534 @@ class TestTask2(TestTask2Setup):
 
         book[transaction] = 100
         self.assertEqual(book[transaction], 100)
-    
+
+    def test_flat_book_matches_book(self):
+        """
+        #name(FlatProcessingBook stores, finds, deletes and iterates like ProcessingBook)
+        """
+        book = ProcessingBook()
+        flat = FlatProcessingBook()
+        transactions = []
+        for i, signature in enumerate(("abc123", "0bbzzz", "abcxyz", "abcxya", "zzzzzz", "abc123")):
+            transaction = Transaction(i, "sender", "receiver")
+            transaction.signature = signature
+            transactions.append(transaction)
+            book[transaction] = i
+            flat[transaction] = i
+
+        self.assertEqual(len(flat), 5)
+        self.assertEqual(flat.get_error_count(), 1)
+        self.assertEqual([(t.signature, a) for t, a in flat], [(t.signature, a) for t, a in book])
+
+        for transaction in (transactions[0], transactions[3], transactions[1]):
+            del book[transaction]
+            del flat[transaction]
+            self.assertEqual([(t.signature, a) for t, a in flat], [(t.signature, a) for t, a in book])
+            self.assertRaises(KeyError, flat.__getitem__, transaction)
+            self.assertRaises(KeyError, flat.__delitem__, transaction)
+
+        self.assertEqual(len(flat), 2)
+        self.assertEqual(flat[transactions[2]], 2)
+        # Every nested node collapsed back into the root
+        self.assertEqual(len(flat.free_nodes), len(flat.node_counts) - 1)
+
+    def test_illegal_store_leaves_flat_book_unchanged(self):
+        """
+        #name(FlatProcessingBook rejects an illegal signature without changing the book)
+        """
+        flat = FlatProcessingBook()
+        stored = Transaction(1, "sender", "receiver")
+        stored.signature = "abc123"
+        flat[stored] = 10
+
+        for signature in ("ab!xyz", "abc12!", "!bc123"):
+            illegal = Transaction(2, "sender", "receiver")
+            illegal.signature = signature
+            self.assertRaises(ValueError, flat.__setitem__, illegal, 20)
+            self.assertEqual(len(flat), 1)
+            self.assertEqual([(t.signature, a) for t, a in flat], [("abc123", 10)])
+            self.assertEqual(flat[stored], 10)
+
+        # A prefix of the stored signature, or one it is a prefix of, is rejected before the counts change
+        sibling = Transaction(3, "sender", "receiver")
+        sibling.signature = "abd123"
+        flat[sibling] = 30
+        for signature in ("abc1234", "abc12", "ab", "abd1234"):
+            prefixed = Transaction(2, "sender", "receiver")
+            prefixed.signature = signature
+            self.assertRaises(ValueError, flat.__setitem__, prefixed, 20)
+            self.assertEqual(len(flat), 2)
+            self.assertEqual([(t.signature, a) for t, a in flat], [("abc123", 10), ("abd123", 30)])
+            self.assertEqual((flat[stored], flat[sibling]), (10, 30))
+
+        del flat[stored]
+        del flat[sibling]
+        self.assertEqual(len(flat), 0)
+        self.assertEqual([(t.signature, a) for t, a in flat], [])
+
+    def test_radix_book_compresses_shared_prefixes(self):
+        """
+        #name(RadixProcessingBook only branches where signatures diverge)
+        """
+        book = RadixProcessingBook()
+        first = Transaction(1, "sender", "receiver")
+        first.signature = "a" * 35 + "b"
+        second = Transaction(2, "sender", "receiver")
+        second.signature = "a" * 35 + "c"
+        third = Transaction(3, "sender", "receiver")
+        third.signature = "a" * 10 + "z" * 26
+
+        book[first] = 10
+        book[second] = 20
+        nested_book = book.pages[book.page_index("a")]
+        self.assertEqual(nested_book.level, 35)
+        self.assertEqual(nested_book.prefix, "a" * 35)
+
+        book[third] = 30
+        book[second] = 25
+        self.assertEqual(book.get_error_count(), 1)
+        self.assertEqual(len(book), 3)
+        self.assertEqual(book.pages[book.page_index("a")].level, 10)
+        self.assertEqual([(t.signature, a) for t, a in book], [(first.signature, 10), (second.signature, 20), (third.signature, 30)])
+
+        del book[first]
+        del book[third]
+        self.assertEqual(book.pages[book.page_index("a")], (second, 20))
+        self.assertEqual(len(book), 1)
+        self.assertRaises(KeyError, book.__getitem__, first)
+
+    def test_radix_book_counts_nested_transactions(self):
+        """
+        #name(RadixProcessingBook nested books count the transactions below them)
+        """
+        book = RadixProcessingBook()
+        signatures = ("a" * 35 + "b", "a" * 35 + "c", "a" * 10 + "z" * 26)
+        for i in range(len(signatures)):
+            transaction = Transaction(i, "sender", "receiver")
+            transaction.signature = signatures[i]
+            book[transaction] = i
+            self.assertEqual(len(book), i + 1)
+
+        nested_book = book.pages[book.page_index("a")]
+        self.assertEqual(len(nested_book), 3)
+        self.assertEqual(len(nested_book.pages[nested_book.page_index("a")]), 2)
+
+    def test_page_index_table_and_deep_books(self):
+        """
+        #name(page_index is a table lookup and deep books keep their counts)
+        """
+        book = ProcessingBook()
+        for index, character in enumerate(ProcessingBook.LEGAL_CHARACTERS):
+            self.assertEqual(book.page_index(character), index)
+        for character in ("A", "-", " ", "\u00e9", "\u4e2d"):
+            self.assertRaises(ValueError, book.page_index, character)
+
+        transactions = []
+        for i, last in enumerate("abc"):
+            transaction = Transaction(i, "sender", "receiver")
+            transaction.signature = "z" * 35 + last
+            transactions.append(transaction)
+            book[transaction] = i
+        book[transactions[0]] = 99
+
+        self.assertEqual(len(book), 3)
+        self.assertEqual(book.get_error_count(), 1)
+        nested_book = book
+        for level in range(35):
+            nested_book = nested_book.pages[nested_book.page_index("z")]
+            self.assertEqual((nested_book.level, len(nested_book), nested_book.get_error_count()), (level + 1, 3, 1))
+        for i, transaction in enumerate(transactions):
+            self.assertEqual(book[transaction], i)
+
+        illegal = Transaction(3, "sender", "receiver")
+        illegal.signature = "z" * 35 + "!"
+        self.assertRaises(ValueError, book.__getitem__, illegal)
+
+    def test_illegal_store_leaves_book_unchanged(self):
+        """
+        #name(ProcessingBook rejects an illegal signature without changing the book)
+        """
+        book = ProcessingBook()
+        stored = Transaction(1, "sender", "receiver")
+        stored.signature = "abc123"
+        book[stored] = 10
+        stats = book.stats()
+
+        for signature in ("abc!xy", "abc12!", "!bc123", "abc12\u4e2d"):
+            illegal = Transaction(2, "sender", "receiver")
+            illegal.signature = signature
+            self.assertRaises(ValueError, book.__setitem__, illegal, 20)
+            self.assertEqual(len(book), 1)
+            self.assertEqual([(t.signature, a) for t, a in book], [("abc123", 10)])
+            self.assertIsInstance(book.pages[book.page_index("a")], tuple)
+            self.assertEqual((book.stats().node_count, book.stats().leaf_count), (stats.node_count, stats.leaf_count))
+
+        # A prefix of the stored signature, or one it is a prefix of, could never be told apart from it
+        sibling = Transaction(3, "sender", "receiver")
+        sibling.signature = "abd123"
+        book[sibling] = 30
+        stats = book.stats()
+        for signature in ("abc1234", "abc12", "ab", "abd1234"):
+            prefixed = Transaction(2, "sender", "receiver")
+            prefixed.signature = signature
+            self.assertRaises(ValueError, book.__setitem__, prefixed, 20)
+            self.assertEqual(len(book), 2)
+            self.assertEqual([(t.signature, a) for t, a in book], [("abc123", 10), ("abd123", 30)])
+            self.assertEqual(book[stored], 10)
+            self.assertEqual(book[sibling], 30)
+            self.assertEqual((book.stats().node_count, book.stats().leaf_count), (stats.node_count, stats.leaf_count))
+
+    def test_iteration_without_recursion(self):
+        """
+        #name(ProcessingBook iterates deep books in signature order)
+        """
+        book = ProcessingBook()
+        signatures = ("z" * 35 + "b", "0" * 36, "z" * 35 + "a", "a" * 20 + "b" * 16, "z" * 20 + "9" * 16)
+        for i, signature in enumerate(signatures):
+            transaction = Transaction(i, "sender", "receiver")
+            transaction.signature = signature
+            book[transaction] = i
+
+        expected = [(signature, signatures.index(signature)) for signature in sorted(
+            signatures, key=lambda signature: [ProcessingBook.LEGAL_CHARACTERS.index(c) for c in signature]
+        )]
+        self.assertEqual([(t.signature, a) for t, a in book], expected)
+        self.assertEqual([(t.signature, a) for t, a in book.items()], expected)
+
+        buffer = ArrayR(len(book) + 1)
+        self.assertEqual(book.items_into(buffer, 1), len(book))
+        self.assertIsNone(buffer[0])
+        self.assertEqual([(buffer[i][0].signature, buffer[i][1]) for i in range(1, len(buffer))], expected)
+        self.assertRaises(ValueError, book.items_into, ArrayR(len(book) - 1))
+
+        iterator = iter(book)
+        self.assertIs(next(iterator), book.pages[book.page_index("a")])
+        self.assertEqual(len([pair for pair in iterator]), len(book) - 1)
+        self.assertRaises(StopIteration, next, iterator)
+
+    def test_sample(self):
+        """
+        #name(ProcessingBookIterator.sample draws distinct stored transactions)
+        """
+        book = ProcessingBook()
+        legal = ProcessingBook.LEGAL_CHARACTERS
+        for i in range(200):
+            transaction = Transaction(i, "sender", "receiver")
+            transaction.signature = "aaa" + legal[i % 36] + legal[i // 36] + "z"
+            book[transaction] = i
+
+        sample = iter(book).sample(50, seed=2085)
+        self.assertIsInstance(sample, ArrayR)
+        amounts = [sample[i][1] for i in range(len(sample))]
+        self.assertEqual(len(set(amounts)), 50)
+        for transaction, amount in sample:
+            self.assertEqual(book[transaction], amount)
+
+        again = iter(book).sample(50, seed=2085)
+        self.assertEqual([again[i][1] for i in range(len(again))], amounts)
+
+        everything = iter(book).sample(200)
+        self.assertEqual(sorted(everything[i][1] for i in range(200)), list(range(200)))
+        self.assertEqual(len(iter(book).sample(0)), 0)
+        self.assertRaises(ValueError, iter(book).sample, 201)
+        # The rank table can grow past the 786433 keys the default table sizes allow
+        self.assertGreater(RankTable.TABLE_SIZES[-1] // 2, 786433)
+
+    def test_bulk_load_and_merge(self):
+        """
+        #name(bulk_load and merge build the same book as storing one at a time)
+        """
+        signatures = ("abc123", "0bbzzz", "abcxyz", "abcxya", "abc123", "zzzzzz", "abcxyz", "a00000")
+        pairs = []
+        for i, signature in enumerate(signatures):
+            transaction = Transaction(i, "sender", "receiver")
+            transaction.signature = signature
+            pairs.append((transaction, 10 if signature == "abcxyz" else i))
+
+        one_at_a_time = ProcessingBook()
+        for transaction, amount in pairs:
+            one_at_a_time[transaction] = amount
+        loaded = ProcessingBook()
+        loaded.bulk_load(pairs)
+
+        self.assertEqual(len(loaded), len(one_at_a_time))
+        self.assertEqual(loaded.get_error_count(), one_at_a_time.get_error_count())
+        self.assertEqual([(t, a) for t, a in loaded], [(t, a) for t, a in one_at_a_time])
+        self.assertEqual(len(loaded.pages[loaded.page_index("a")]), 4)
+
+        book = ProcessingBook()
+        book.bulk_load(pairs[:3])
+        other = ProcessingBook()
+        other.bulk_load(pairs[3:])
+        book.merge(other)
+        self.assertEqual(len(other), 0)
+        self.assertEqual([(t.signature, a) for t, a in book], [(t.signature, a) for t, a in one_at_a_time])
+        # abc123 is stored with 0 here and 4 in the other book, the two abcxyz agree on 10
+        self.assertEqual(book.get_error_count(), 1)
+
+        illegal = Transaction(0, "sender", "receiver")
+        illegal.signature = "ABC"
+        self.assertRaises(ValueError, ProcessingBook().bulk_load, [(illegal, 1)])
+
+    def test_prefix_queries(self):
+        """
+        #name(count_prefix, iter_prefix and range answer prefix queries)
+        """
+        signatures = ("abc123", "abcxyz", "abd000", "ab0aaa", "bzzzzz", "0aaaaa", "abcxya")
+        for book in (ProcessingBook(), RadixProcessingBook()):
+            for i, signature in enumerate(signatures):
+                transaction = Transaction(i, "sender", "receiver")
+                transaction.signature = signature
+                book[transaction] = i
+
+            self.assertEqual(book.count_prefix(""), 7)
+            self.assertEqual(book.count_prefix("ab"), 5)
+            self.assertEqual(book.count_prefix("abc"), 3)
+            self.assertEqual(book.count_prefix("abcx"), 2)
+            self.assertEqual(book.count_prefix("bz"), 1)
+            self.assertEqual(book.count_prefix("bx"), 0)
+            self.assertEqual(book.count_prefix("abc123"), 1)
+            self.assertRaises(ValueError, book.count_prefix, "A")
+
+            self.assertEqual([t.signature for t, _ in book.iter_prefix("abc")], ["abcxya", "abcxyz", "abc123"])
+            self.assertEqual([t.signature for t, _ in book.iter_prefix("c")], [])
+
+            # Pages are ordered a..z then 0..9
+            self.assertEqual([t.signature for t, _ in book.range("abcxyz", "ab0")], ["abcxyz", "abc123", "abd000"])
+            self.assertEqual([t.signature for t, _ in book.range("b")], ["bzzzzz", "0aaaaa"])
+            self.assertEqual([t.signature for t, _ in book.range(hi="abc1")], ["abcxya", "abcxyz"])
+            self.assertEqual([t.signature for t, _ in book.range("b", "a")], [])
+
+    def test_concurrent_book_from_threads(self):
+        """
+        #name(ConcurrentProcessingBook keeps consistent counts with several writer threads)
+        """
+        legal = ProcessingBook.LEGAL_CHARACTERS
+        transactions = []
+        for i in range(2000):
+            transaction = Transaction(i, "sender", "receiver")
+            transaction.signature = "ab" + legal[i % 36] + legal[(i // 36) % 36] + legal[i % 7] + legal[(i * 31) % 36]
+            transactions.append(transaction)
+
+        for stripe_level in (0, 2):
+            book = ConcurrentProcessingBook(stripe_level)
+            expected = ProcessingBook()
+            for i, transaction in enumerate(transactions):
+                expected[transaction] = i
+                expected[transaction] = -i
+
+            def write(first):
+                for i in range(first, len(transactions), 4):
+                    book[transactions[i]] = i
+                for i in range(first, len(transactions), 4):
+                    book[transactions[i]] = -i
+
+            threads = [threading.Thread(target=write, args=(first,)) for first in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(len(book), len(expected))
+            self.assertEqual(book.get_error_count(), expected.get_error_count())
+            self.assertEqual([(t.signature, a) for t, a in book], [(t.signature, a) for t, a in expected])
+
+            del book[transactions[5]]
+            self.assertRaises(KeyError, book.__getitem__, transactions[5])
+            self.assertEqual(book[transactions[6]], expected[transactions[6]])
+            self.assertEqual(len(book), len(expected) - 1)
+
+    def test_sharded_book_across_processes(self):
+        """
+        #name(ShardedProcessingBook stores, finds, deletes and counts across worker processes)
+        """
+        book = ProcessingBook()
+        transactions = []
+        for i, signature in enumerate(("abc123", "0bbzzz", "abcxyz", "abcxya", "zzzzzz", "abc123", "mmm000")):
+            transaction = Transaction(i, "sender", "receiver")
+            transaction.signature = signature
+            transactions.append(transaction)
+            book[transaction] = i
+
+        with ShardedProcessingBook(shard_count=3, batch_size=2) as sharded:
+            for i, transaction in enumerate(transactions):
+                sharded[transaction] = i
+
+            self.assertEqual(len(sharded), len(book))
+            self.assertEqual(sharded.get_error_count(), 1)
+            self.assertEqual(sharded[transactions[2]], 2)
+            self.assertEqual(
+                [(t.timestamp, t.signature, a) for t, a in sharded], [(t.timestamp, t.signature, a) for t, a in book]
+            )
+
+            del sharded[transactions[3]]
+            self.assertRaises(KeyError, sharded.__getitem__, transactions[3])
+            self.assertRaises(KeyError, sharded.__delitem__, transactions[3])
+            amounts = sharded.get_many(transactions, default=-1)
+            self.assertEqual([amounts[i] for i in range(len(amounts))], [0, 1, 2, -1, 4, 0, 6])
+            self.assertEqual(len(sharded), len(book) - 1)
+
+            illegal = Transaction(0, "sender", "receiver")
+            illegal.signature = "abc!"
+            self.assertRaises(ValueError, sharded.__setitem__, illegal, 1)
+
+        with ShardedProcessingBook(shard_count=1) as sharded:
+            first = Transaction(1, "sender", "receiver")
+            first.signature = "abc"
+            second = Transaction(2, "sender", "receiver")
+            second.signature = "xyz"
+            sharded[first] = 10
+            sharded[first] = IncomparableAmount()
+            sharded[second] = 20
+            # The failed store is reported on the next request with a reply, and the worker carries on
+            self.assertRaises(ArithmeticError, len, sharded)
+            self.assertEqual(len(sharded), 2)
+            self.assertEqual(sharded[first], 10)
+
+        with ShardedProcessingBook(shard_count=2, batch_size=1) as sharded:
+            stored = ProcessingBook()
+            for i, signature in enumerate(("abc", "bxx", "cxx")):
+                transaction = Transaction(i, "sender", "receiver")
+                transaction.signature = signature
+                sharded[transaction] = i
+                stored[transaction] = i
+            first = next(transaction for transaction, _ in stored)
+            sharded[first] = IncomparableAmount()
+            # Only one shard fails; the replies of the others must not be left behind for later requests
+            self.assertRaises(ArithmeticError, len, sharded)
+            self.assertEqual(len(sharded), 3)
+            for transaction, amount in stored:
+                self.assertEqual(sharded[transaction], amount)
+            sharded[first] = IncomparableAmount()
+            self.assertRaises(ArithmeticError, list, sharded)
+            self.assertEqual([(t.signature, a) for t, a in sharded], [(t.signature, a) for t, a in stored])
+
+    def test_stats(self):
+        """
+        #name(ProcessingBook.stats follows the shape of the book as it changes)
+        """
+        for book_class in (ProcessingBook, RadixProcessingBook):
+            book = book_class()
+            transactions = []
+            for i, signature in enumerate(("abc123", "0bbzzz", "abcxyz", "abcxya", "zzzzzz")):
+                transaction = Transaction(i, "sender", "receiver")
+                transaction.signature = signature
+                transactions.append(transaction)
+                book[transaction] = i
+
+            stats = book.stats()
+            self.assertEqual(stats.leaf_count, 5)
+            self.assertEqual(stats.collision_count, 2)
+            self.assertGreater(stats.bytes_used, 0)
+            if book_class is ProcessingBook:
+                # "abc" and "abcxy" chains: books on levels 1 to 5, of which 1, 2 and 4 hold a single book
+                self.assertEqual(stats.node_count, 6)
+                self.assertEqual(list(stats.depth_histogram), [2, 0, 0, 1, 0, 2])
+                self.assertEqual(stats.single_child_count, 3)
+            else:
+                self.assertEqual(stats.node_count, 3)
+                self.assertEqual(list(stats.depth_histogram), [2, 0, 0, 1, 0, 2])
+                self.assertEqual(stats.single_child_count, 0)
+            self.assertAlmostEqual(stats.average_fan_out, stats.occupied_pages / stats.node_count)
+
+            del book[transactions[3]]
+            del book[transactions[0]]
+            stats = book.stats()
+            self.assertEqual(stats.node_count, 1)
+            self.assertEqual(list(stats.depth_histogram), [3])
+            self.assertEqual(stats.occupied_pages, 3)
+            self.assertEqual(stats.collision_count, 2)
+
+            other = book_class()
+            other.bulk_load(((transactions[0], 10),))
+            book.merge(other)
+            self.assertEqual(book.stats().leaf_count, 4)
+            self.assertEqual(other.stats().node_count, 1)
+            self.assertEqual(other.stats().leaf_count, 0)
+
+    def test_page_bits_follow_churn(self):
+        """
+        #name(Occupied-page bitmaps stay in step with the pages through inserts and deletes)
+        """
+        legal = ProcessingBook.LEGAL_CHARACTERS
+        transactions = []
+        for i in range(200):
+            transaction = Transaction(i, "sender", "receiver")
+            transaction.signature = "ab" * (i % 3) + legal[i % 36] + legal[(i * 7) % 36] + "zz"
+            transactions.append(transaction)
+
+        for book in (ProcessingBook(), RadixProcessingBook(), FlatProcessingBook()):
+            for turn in range(3):
+                for i, transaction in enumerate(transactions):
+                    if (i + turn) % 3 != 0:
+                        book[transaction] = i
+                for i, transaction in enumerate(transactions):
+                    if (i + turn) % 2 == 0:
+                        try:
+                            del book[transaction]
+                        except KeyError:
+                            pass
+
+            if isinstance(book, FlatProcessingBook):
+                for node in range(len(book.node_counts)):
+                    start = node * FlatProcessingBook.PAGE_COUNT
+                    occupied = [page for page in range(FlatProcessingBook.PAGE_COUNT) if book.slots[start + page] != 0]
+                    self.assertEqual(book.node_bits[node], sum(1 << page for page in occupied))
+            else:
+                books = [book]
+                while books:
+                    current = books.pop()
+                    occupied = [page for page in range(36) if current.pages[page] is not None]
+                    self.assertEqual(current.page_bits, sum(1 << page for page in occupied))
+                    books.extend(current.pages[page] for page in occupied if isinstance(current.pages[page], ProcessingBook))
+
+            # Deletes collapse every book they leave with a single transaction, as if the rest were stored afresh
+            expected = type(book)()
+            for transaction, amount in book:
+                expected[transaction] = amount
+            self.assertEqual(len(book), len(expected))
+            if not isinstance(book, FlatProcessingBook):
+                self.assertEqual(book.stats().node_count, expected.stats().node_count)
+
+    def test_snapshot_round_trip(self):
+        """
+        #name(A saved book can be opened memory-mapped and read lazily)
+        """
+        book = ProcessingBook()
+        transactions = []
+        for i, signature in enumerate(("abc123", "0bbzzz", "abcxyz", "abcxya", "abc123")):
+            transaction = Transaction(1000 + i, "sender" + str(i % 2), "receiver")
+            transaction.signature = signature
+            transactions.append(transaction)
+            book[transaction] = i * 1.5 if i == 1 else i
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "book.snapshot")
+            save_book(book, path)
+
+            with MappedProcessingBook(path) as mapped:
+                self.assertEqual(len(mapped), 4)
+                self.assertEqual(mapped.get_error_count(), 1)
+                self.assertEqual(mapped[transactions[1]], 1.5)
+                self.assertEqual(mapped[transactions[4]], 0)
+                missing = Transaction(0, "sender", "receiver")
+                missing.signature = "abczzz"
+                self.assertRaises(KeyError, mapped.__getitem__, missing)
+
+                pairs = [(t.timestamp, t.from_user, t.to_user, t.signature, a) for t, a in mapped]
+                self.assertEqual(pairs, [(t.timestamp, t.from_user, t.to_user, t.signature, a) for t, a in book])
+
+                loaded = mapped.to_book()
+                self.assertEqual(loaded.get_error_count(), 1)
+                self.assertEqual(loaded[transactions[2]], 2)
+
+            with open(path, "wb") as handle:
+                handle.write(b"not a snapshot")
+            self.assertRaises(ValueError, MappedProcessingBook, path)
+
+            unsupported = ProcessingBook()
+            unsupported[transactions[0]] = "ten"
+            self.assertRaises(ValueError, save_book, unsupported, path)
 
 
 class TestTask2Approach(TestTask2Setup):
@@ -36,7 +580,15 @@ class TestTask2Approach(TestTask2Setup):
         #hurdle
         """
         import processing_book
-        modules = [processing_book]
+        import flat_processing_book
+        import radix_processing_book
+        import book_snapshot
+        import concurrent_processing_book
+        import sharded_processing_book
+        modules = [
+            processing_book, flat_processing_book, radix_processing_book, book_snapshot, concurrent_processing_book,
+            sharded_processing_book,
+        ]
 
         for f in modules:
             # Get the source code
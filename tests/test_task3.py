@@ -1,6 +1,7 @@
 from unittest import TestCase
 import ast
 import inspect
+import multiprocessing
 
 from tests.helper import CollectionsFinder
 
@@ -8,6 +9,8 @@ from data_structures import ArrayR
 
 from processing_line import Transaction
 from fraud_detection import FraudDetection
+from incremental_fraud_detection import IncrementalFraudDetection
+from canonical_forms import KeyCountTable
 
 
 def to_array(lst):
@@ -46,6 +49,98 @@ class TestTask3(TestTask3Setup):
         self.assertGreater(blocks_response[0], 0, "Block size should be greater than 0.")
         self.assertGreaterEqual(blocks_response[1], 1, "Suspicion score for this example is 1, because there is only one transaction.")
 
+    def test_canonical_forms_match_transform_signature(self):
+        """
+        #name(Test batched canonical forms group transactions as transform_signature does)
+        """
+        signatures = ["aabbccd", "ccbbaad", "bbaaccd", "abcabcd", "cabcabd", "aabbcce", "dcbaabc", "aabbccd"]
+        transactions = []
+        for i in range(len(signatures)):
+            transaction = Transaction(i, "Alice", "Bob")
+            transaction.signature = signatures[i]
+            transactions.append(transaction)
+        fraud_detection = FraudDetection(to_array(transactions))
+        forms = fraud_detection.canonical_forms()
+
+        for block_size in range(1, len(signatures[0]) + 1):
+            keys = list(forms.keys(block_size))
+            transformed = [fraud_detection.transform_signature(signature, block_size) for signature in signatures]
+            for i in range(len(signatures)):
+                for j in range(len(signatures)):
+                    self.assertEqual(keys[i] == keys[j], transformed[i] == transformed[j],
+                                     f"Block size {block_size} groups {signatures[i]} and {signatures[j]} differently.")
+            self.assertEqual(forms.suspicion(block_size), fraud_detection.calculate_suspicion(block_size))
+
+        self.assertEqual(fraud_detection.detect_by_blocks(), (2, 8))
+
+        # A table sized for fewer keys than it counts grows as it goes
+        counts = KeyCountTable()
+        counts.count_all(key % 40 for key in range(1000))
+        self.assertEqual((len(counts), counts[7], counts.count_product), (40, 25, 25 ** 40))
+
+        transactions[0].signature = "aabbcc"
+        self.assertIsNone(FraudDetection(to_array(transactions)).canonical_forms(),
+                          "Signatures of different lengths cannot be batched.")
+
+    def test_parallel_detection_matches_serial(self):
+        """
+        #name(Scoring block sizes in parallel gives the serial answer)
+        """
+        cases = (
+            ("aabbccd", "ccbbaad", "bbaaccd", "abcabcd", "cabcabd", "aabbcce", "dcbaabc", "aabbccd"),
+            # Every block size scores 4, so the smallest one must win
+            ("abcdef", "fedcba", "abcdef", "fedcba"),
+            # Fewer block sizes than processes
+            ("ab", "ba", "ab"),
+            ("a", "b", "a"),
+            # Signatures of different lengths are not batched, and are scored in this process
+            ("abcd", "dcba", "abc"),
+        )
+        for signatures in cases:
+            transactions = []
+            for i in range(len(signatures)):
+                transaction = Transaction(i, "Alice", "Bob")
+                transaction.signature = signatures[i]
+                transactions.append(transaction)
+            fraud_detection = FraudDetection(to_array(transactions))
+            serial = fraud_detection.detect_by_blocks()
+            for process_count in (2, 4):
+                self.assertEqual(fraud_detection.detect_by_blocks(process_count=process_count), serial,
+                                 f"{process_count} processes disagree on {signatures}.")
+            if signatures[0] == "abcdef":
+                self.assertEqual(serial, (1, 4))
+
+        self.assertRaises(ValueError, FraudDetection(to_array([])).detect_by_blocks, 0)
+        self.assertEqual(len(multiprocessing.active_children()), 0, "The worker pool should be shut down.")
+
+    def test_incremental_detection_follows_stream(self):
+        """
+        #name(Test incremental detection agrees with detect_by_blocks as transactions come and go)
+        """
+        signatures = ["aabbccd", "ccbbaad", "bbaaccd", "abcabcd", "cabcabd", "aabbcce", "dcbaabc", "aabbccd"]
+        transactions = []
+        detection = IncrementalFraudDetection(signature_length=7)
+        self.assertEqual(detection.detect_by_blocks(), (1, 1))
+        for i in range(len(signatures)):
+            transaction = Transaction(i, "Alice", "Bob")
+            transaction.signature = signatures[i]
+            transactions.append(transaction)
+            detection.add(transaction)
+            self.assertEqual(detection.detect_by_blocks(), FraudDetection(to_array(transactions)).detect_by_blocks())
+        self.assertEqual(detection.suspicion(7), 2, "Only the two aabbccd transactions share a whole signature.")
+
+        for position in (0, 3, 0):
+            detection.remove(transactions.pop(position))
+            self.assertEqual(len(detection), len(transactions))
+            self.assertEqual(detection.detect_by_blocks(), FraudDetection(to_array(transactions)).detect_by_blocks())
+
+        stranger = Transaction(9, "Alice", "Bob")
+        stranger.signature = "zzzzzzz"
+        with self.assertRaises(KeyError):
+            detection.remove(stranger)
+        stranger.signature = "abc"
+        with self.assertRaises(ValueError):
+            detection.add(stranger)
 
 
 class TestTask3Approach(TestTask3Setup):
@@ -55,7 +150,9 @@ class TestTask3Approach(TestTask3Setup):
         #hurdle
         """
         import fraud_detection
-        modules = [fraud_detection]
+        import canonical_forms
+        import incremental_fraud_detection
+        modules = [fraud_detection, canonical_forms, incremental_fraud_detection]
 
         for f in modules:
             # Get the source code
@@ -0,0 +1,265 @@
+from array import array
+
+from data_structures import ArrayDeque, ArrayR, LinearProbeTable
+from processing_line import SIGNATURE_LENGTH, SignatureKeyTable, Transaction, _fast_signature
+
+
+class UserIdTable(LinearProbeTable):
+    """
+    LinearProbeTable from user name to interned user id. Uses the built-in string hash, and a longer
+    list of table sizes than the default so it can hold tens of millions of names.
+    """
+
+    TABLE_SIZES = SignatureKeyTable.TABLE_SIZES
+
+    def __init__(self):
+        LinearProbeTable.__init__(self, UserIdTable.TABLE_SIZES)
+
+    def hash(self, key):
+        """
+        :complexity: O(K) where K is the length of the key.
+        """
+        return hash(key) % self.table_size
+
+
+class TransactionBatch:
+    """
+    Columnar store for a large number of transactions.
+    Instead of one Python object per transaction, the batch keeps:
+        timestamps: array('q') of integer timestamps
+        from_ids, to_ids: array('l') of interned user ids, resolved through user_names
+        signatures: one bytearray with SIGNATURE_LENGTH ASCII bytes per transaction, all zero while unsigned
+
+    batch[i] returns a TransactionView, a two-field object that reads and writes row i and can be used
+    anywhere a Transaction is expected (ProcessingLine, ProcessingBook, FraudDetection, sign_many).
+    Signatures stored in a batch must be SIGNATURE_LENGTH ASCII characters long.
+    """
+
+    UNSIGNED = bytes(SIGNATURE_LENGTH)
+
+    def __init__(self):
+        """
+        :complexity: Best and worst case is O(1).
+        """
+        self.timestamps = array('q')
+        self.from_ids = array('l')
+        self.to_ids = array('l')
+        self.signatures = bytearray()
+
+        self.user_ids = UserIdTable()
+        self.user_names = ArrayDeque()
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        """
+        Copies an array of Transactions into a new batch, signatures included.
+        :complexity: O(N) where N = len(transactions), assuming interning is O(1).
+        """
+        batch = cls()
+        for i in range(len(transactions)):
+            transaction = transactions[i]
+            index = batch.append(transaction.timestamp, transaction.from_user, transaction.to_user)
+            if transaction.signature is not None:
+                batch.set_signature(index, transaction.signature)
+        return batch
+
+    def intern_user(self, name):
+        """
+        Returns the id of a user name, giving it the next free id the first time it is seen.
+        :complexity: O(K) where K is the length of the name, assuming the table has few collisions.
+        """
+        try:
+            return self.user_ids[name]
+        except KeyError:
+            user_id = len(self.user_names)
+            self.user_ids[name] = user_id
+            self.user_names.append(name)
+            return user_id
+
+    def append(self, timestamp, from_user, to_user):
+        """
+        Adds an unsigned transaction and returns its row index.
+        :complexity: O(K) where K is the length of the user names, amortised over the array growth.
+        """
+        self.timestamps.append(timestamp)
+        self.from_ids.append(self.intern_user(from_user))
+        self.to_ids.append(self.intern_user(to_user))
+        self.signatures += TransactionBatch.UNSIGNED
+        return len(self.timestamps) - 1
+
+    def get_signature(self, index):
+        """
+        The signature of row index, or None if it is unsigned.
+        :complexity: O(1), signatures have a fixed length.
+        """
+        start = index * SIGNATURE_LENGTH
+        if self.signatures[start] == 0:
+            return None
+        return self.signatures[start:start + SIGNATURE_LENGTH].decode("ascii")
+
+    def set_signature(self, index, signature):
+        """
+        Stores the signature of row index, or marks the row unsigned if signature is None.
+        :raises ValueError: if the signature is not SIGNATURE_LENGTH ASCII characters.
+        :complexity: O(1), signatures have a fixed length.
+        """
+        start = index * SIGNATURE_LENGTH
+        if signature is None:
+            self.signatures[start:start + SIGNATURE_LENGTH] = TransactionBatch.UNSIGNED
+            return
+        if len(signature) != SIGNATURE_LENGTH or not signature.isascii():
+            raise ValueError(f"Signatures in a TransactionBatch must be {SIGNATURE_LENGTH} ASCII characters")
+        self.signatures[start:start + SIGNATURE_LENGTH] = signature.encode("ascii")
+
+    def is_signed(self, index):
+        return self.signatures[index * SIGNATURE_LENGTH] != 0
+
+    def sign_all(self):
+        """
+        Signs every unsigned row, writing straight into the signature buffer.
+        Goes through Transaction.signature_cache when one is set, like sign_many.
+        :complexity: O(N x n) where N is the number of rows and n the length of the longest transaction data.
+        """
+        cache = Transaction.signature_cache
+        user_names = self.user_names
+        for index in range(len(self)):
+            if self.is_signed(index):
+                continue
+
+            key = (self.timestamps[index], user_names[self.from_ids[index]], user_names[self.to_ids[index]])
+            signature = None if cache is None else cache.get(key)
+            if signature is None:
+                signature = compute_signature(key)
+                if cache is not None:
+                    cache.put(key, signature)
+            self.set_signature(index, signature)
+
+    def to_array(self):
+        """
+        An ArrayR with a view of every row, for code that takes an array of transactions such as FraudDetection.
+        :complexity: O(N) where N is the number of rows.
+        """
+        views = ArrayR(len(self))
+        for index in range(len(self)):
+            views[index] = TransactionView(self, index)
+        return views
+
+    def __getitem__(self, index):
+        """
+        :raises IndexError: if index is out of bounds.
+        :complexity: O(1)
+        """
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("Out of bounds access in TransactionBatch.")
+        return TransactionView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield TransactionView(self, index)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+def compute_signature(key):
+    """
+    Signature of the (timestamp, from_user, to_user) fields in key, through the batch path when possible.
+    """
+    timestamp, from_user, to_user = key
+    transaction_data = str(timestamp) + from_user + to_user
+    if transaction_data.isascii():
+        return _fast_signature(transaction_data)
+
+    transaction = Transaction(timestamp, from_user, to_user)
+    transaction.sign()
+    return transaction.signature
+
+
+class TransactionView:
+    """
+    Transaction-like view of one row of a TransactionBatch. Holds nothing but the batch and the row index,
+    so it costs two references however many views are alive. Changing a field clears the row's signature.
+    """
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    @property
+    def timestamp(self):
+        return self.batch.timestamps[self.index]
+
+    @timestamp.setter
+    def timestamp(self, value):
+        self.batch.timestamps[self.index] = value
+        self.batch.set_signature(self.index, None)
+
+    @property
+    def from_user(self):
+        return self.batch.user_names[self.batch.from_ids[self.index]]
+
+    @from_user.setter
+    def from_user(self, value):
+        self.batch.from_ids[self.index] = self.batch.intern_user(value)
+        self.batch.set_signature(self.index, None)
+
+    @property
+    def to_user(self):
+        return self.batch.user_names[self.batch.to_ids[self.index]]
+
+    @to_user.setter
+    def to_user(self, value):
+        self.batch.to_ids[self.index] = self.batch.intern_user(value)
+        self.batch.set_signature(self.index, None)
+
+    @property
+    def signature(self):
+        return self.batch.get_signature(self.index)
+
+    @signature.setter
+    def signature(self, value):
+        self.batch.set_signature(self.index, value)
+
+    def signature_key(self):
+        return (self.timestamp, self.from_user, self.to_user)
+
+    def is_signed_for(self, key):
+        """
+        A signed row is always signed for its current fields, as changing a field clears the signature.
+        """
+        return self.batch.is_signed(self.index)
+
+    def record_signature(self, key, signature):
+        self.batch.set_signature(self.index, signature)
+
+    def sign(self):
+        """
+        Signs the row unless it is already signed.
+        :complexity: Best case is O(1) when the row is already signed. Worst case is O(n), where n is the
+        length of the transaction data.
+        """
+        if self.batch.is_signed(self.index):
+            return
+
+        key = self.signature_key()
+        cache = Transaction.signature_cache
+        signature = None if cache is None else cache.get(key)
+        if signature is None:
+            signature = compute_signature(key)
+            if cache is not None:
+                cache.put(key, signature)
+        self.batch.set_signature(self.index, signature)
+
+    def __eq__(self, other):
+        if not isinstance(other, TransactionView):
+            return NotImplemented
+        return self.batch is other.batch and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.batch), self.index))
+
+    def __repr__(self):
+        return f"TransactionView({self.timestamp}, {self.from_user!r}, {self.to_user!r})"
@@ -0,0 +1,179 @@
+import csv
+import json
+import mmap
+import os
+import time
+
+from data_structures import ArrayR
+from processing_line import Transaction
+
+
+class LoaderStats:
+    """
+    Throughput counters of a TransactionLoader.
+    """
+
+    def __init__(self):
+        self.records = 0
+        self.bytes_read = 0
+        self.started = None
+        self.finished = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def elapsed(self):
+        """
+        Seconds spent loading so far, or in total once loading has finished.
+        """
+        if self.started is None:
+            return 0.0
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    def records_per_second(self):
+        elapsed = self.elapsed()
+        return self.records / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.records} records, {self.bytes_read / 2**20:.1f} MiB in {self.elapsed():.2f}s "
+            f"({self.records_per_second():,.0f} records/s)"
+        )
+
+
+class TransactionLoader:
+    """
+    Streams (timestamp, from, to) records out of a JSONL or CSV file.
+    The file is read one line at a time, either through a buffered file object or a read-only memory map,
+    and transactions are handed out individually or in chunks of chunk_size. Nothing ever holds more than
+    one chunk, so memory use does not depend on the size of the file.
+
+    JSONL files hold one object per line with the keys "timestamp", "from" and "to" ("from_user" and
+    "to_user" are accepted too). CSV files hold the three columns in that order, with an optional header row.
+    """
+
+    JSONL = "jsonl"
+    CSV = "csv"
+    DEFAULT_CHUNK_SIZE = 65536
+
+    def __init__(self, path, file_format=None, chunk_size=DEFAULT_CHUNK_SIZE, use_mmap=False):
+        """
+        :param file_format: JSONL or CSV, worked out from the file extension when None.
+        :raises ValueError: if the format is unknown or chunk_size is not positive.
+        """
+        if file_format is None:
+            extension = os.path.splitext(path)[1].lower()
+            file_format = TransactionLoader.CSV if extension == ".csv" else TransactionLoader.JSONL
+        if file_format not in (TransactionLoader.JSONL, TransactionLoader.CSV):
+            raise ValueError(f"Unknown file format {file_format!r}")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+
+        self.path = path
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.use_mmap = use_mmap
+        self.stats = LoaderStats()
+
+    def lines(self):
+        """
+        Generator over the raw lines of the file, as bytes.
+        """
+        with open(self.path, "rb") as handle:
+            if self.use_mmap and os.fstat(handle.fileno()).st_size > 0:
+                with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    for line in iter(mapped.readline, b""):
+                        self.stats.bytes_read += len(line)
+                        yield line
+            else:
+                for line in handle:
+                    self.stats.bytes_read += len(line)
+                    yield line
+
+    def records(self):
+        """
+        Generator over the (timestamp, from_user, to_user) records of the file.
+        :raises ValueError: if a line cannot be parsed.
+        :complexity: O(B) over the whole file, where B is its size in bytes. Memory is O(longest line).
+        """
+        self.stats.start()
+        try:
+            if self.file_format == TransactionLoader.JSONL:
+                parse = self.parse_jsonl
+            else:
+                parse = self.parse_csv
+            for record in parse():
+                self.stats.records += 1
+                yield record
+        finally:
+            self.stats.stop()
+
+    def parse_jsonl(self):
+        for line_number, line in enumerate(self.lines(), 1):
+            if line.strip() == b"":
+                continue
+            try:
+                item = json.loads(line)
+                from_user = item["from"] if "from" in item else item["from_user"]
+                to_user = item["to"] if "to" in item else item["to_user"]
+                yield (int(item["timestamp"]), from_user, to_user)
+            except (KeyError, TypeError, ValueError) as error:
+                raise ValueError(f"{self.path}:{line_number}: invalid transaction record") from error
+
+    def parse_csv(self):
+        decoded = (line.decode("utf-8") for line in self.lines())
+        for row_number, row in enumerate(csv.reader(decoded), 1):
+            if len(row) == 0:
+                continue
+            if len(row) != 3:
+                raise ValueError(f"{self.path}:{row_number}: expected 3 columns, found {len(row)}")
+            try:
+                timestamp = int(row[0])
+            except ValueError as error:
+                if row_number == 1:
+                    # Header row
+                    continue
+                raise ValueError(f"{self.path}:{row_number}: invalid timestamp {row[0]!r}") from error
+            yield (timestamp, row[1], row[2])
+
+    def transactions(self):
+        """
+        Generator over the file as unsigned Transactions.
+        """
+        for timestamp, from_user, to_user in self.records():
+            yield Transaction(timestamp, from_user, to_user)
+
+    def chunks(self):
+        """
+        Generator over the file as ArrayRs of at most chunk_size Transactions.
+        The last chunk is shorter when the number of records is not a multiple of chunk_size.
+        """
+        chunk = ArrayR(self.chunk_size)
+        count = 0
+        for transaction in self.transactions():
+            chunk[count] = transaction
+            count += 1
+            if count == self.chunk_size:
+                yield chunk
+                chunk = ArrayR(self.chunk_size)
+                count = 0
+
+        if count > 0:
+            last = ArrayR(count)
+            for i in range(count):
+                last[i] = chunk[i]
+            yield last
+
+    def load_into(self, processing_line):
+        """
+        Adds every transaction in the file to a ProcessingLine and returns the loader's stats.
+        :raises RuntimeError: if the line is locked.
+        """
+        for chunk in self.chunks():
+            processing_line.add_transactions(chunk)
+        return self.stats